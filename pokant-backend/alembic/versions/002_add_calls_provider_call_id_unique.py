@@ -0,0 +1,76 @@
+"""add unique (customer_id, provider_call_id) on calls
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "002"
+down_revision = "001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    insp = inspect(conn)
+    if "calls" not in insp.get_table_names():
+        return
+
+    constraints = [c["name"] for c in insp.get_unique_constraints("calls")]
+    if "uq_calls_customer_provider_call_id" in constraints:
+        return
+
+    # Remove duplicates left by the old per-row existence check (keep the oldest row)
+    op.execute(
+        """
+        WITH ranked AS (
+            SELECT id,
+                   row_number() OVER (
+                       PARTITION BY customer_id, provider_call_id
+                       ORDER BY created_at, id
+                   ) AS rn
+            FROM calls
+            WHERE provider_call_id IS NOT NULL
+        )
+        DELETE FROM call_attributes
+        WHERE call_id IN (SELECT id FROM ranked WHERE rn > 1)
+        """
+    )
+    op.execute(
+        """
+        WITH ranked AS (
+            SELECT id,
+                   row_number() OVER (
+                       PARTITION BY customer_id, provider_call_id
+                       ORDER BY created_at, id
+                   ) AS rn
+            FROM calls
+            WHERE provider_call_id IS NOT NULL
+        )
+        DELETE FROM calls
+        WHERE id IN (SELECT id FROM ranked WHERE rn > 1)
+        """
+    )
+
+    op.create_unique_constraint(
+        "uq_calls_customer_provider_call_id",
+        "calls",
+        ["customer_id", "provider_call_id"],
+    )
+
+
+def downgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    insp = inspect(conn)
+    if "calls" not in insp.get_table_names():
+        return
+    constraints = [c["name"] for c in insp.get_unique_constraints("calls")]
+    if "uq_calls_customer_provider_call_id" in constraints:
+        op.drop_constraint("uq_calls_customer_provider_call_id", "calls", type_="unique")
@@ -0,0 +1,41 @@
+"""add customer ingest_watermark_at and ingest_watermark_call_id
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    from sqlalchemy import inspect
+    insp = inspect(conn)
+    if "customers" in insp.get_table_names():
+        cols = [c["name"] for c in insp.get_columns("customers")]
+        if "ingest_watermark_at" not in cols:
+            op.add_column("customers", sa.Column("ingest_watermark_at", sa.DateTime(), nullable=True))
+        if "ingest_watermark_call_id" not in cols:
+            op.add_column("customers", sa.Column("ingest_watermark_call_id", sa.String(255), nullable=True))
+
+
+def downgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    insp = inspect(conn)
+    if "customers" not in insp.get_table_names():
+        return
+    cols = [c["name"] for c in insp.get_columns("customers")]
+    if "ingest_watermark_call_id" in cols:
+        op.drop_column("customers", "ingest_watermark_call_id")
+    if "ingest_watermark_at" in cols:
+        op.drop_column("customers", "ingest_watermark_at")
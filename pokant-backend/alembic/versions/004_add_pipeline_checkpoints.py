@@ -0,0 +1,84 @@
+"""add calls.analysis_status and pipeline_stage_runs
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    from sqlalchemy import inspect
+    insp = inspect(conn)
+    tables = insp.get_table_names()
+
+    if "calls" in tables:
+        cols = [c["name"] for c in insp.get_columns("calls")]
+        if "analysis_status" not in cols:
+            op.add_column("calls", sa.Column("analysis_status", sa.String(20), nullable=True))
+
+            # Backfill checkpoints from what earlier runs already stored
+            op.execute(
+                """
+                UPDATE calls SET analysis_status = CASE
+                    WHEN outcome IS DISTINCT FROM 'failed' THEN 'skipped'
+                    WHEN EXISTS (
+                        SELECT 1 FROM call_attributes a
+                        WHERE a.call_id = calls.id AND a.embedding IS NOT NULL
+                    ) THEN 'embedded'
+                    WHEN EXISTS (
+                        SELECT 1 FROM call_attributes a WHERE a.call_id = calls.id
+                    ) THEN 'analyzed'
+                    ELSE 'pending'
+                END
+                """
+            )
+            op.create_index(
+                "ix_calls_customer_analysis_status",
+                "calls",
+                ["customer_id", "analysis_status"],
+            )
+
+    if "pipeline_stage_runs" not in tables:
+        op.create_table(
+            "pipeline_stage_runs",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("customer_id", UUID(as_uuid=True), sa.ForeignKey("customers.id"), nullable=False),
+            sa.Column("stage", sa.String(20), nullable=False),
+            sa.Column("status", sa.String(20)),
+            sa.Column("items_processed", sa.Integer()),
+            sa.Column("stats", JSONB()),
+            sa.Column("error", sa.Text()),
+            sa.Column("started_at", sa.DateTime()),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index(
+            "ix_pipeline_stage_runs_customer_id",
+            "pipeline_stage_runs",
+            ["customer_id"],
+        )
+
+
+def downgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    insp = inspect(conn)
+    tables = insp.get_table_names()
+    if "pipeline_stage_runs" in tables:
+        op.drop_table("pipeline_stage_runs")
+    if "calls" in tables:
+        cols = [c["name"] for c in insp.get_columns("calls")]
+        if "analysis_status" in cols:
+            op.drop_index("ix_calls_customer_analysis_status", table_name="calls")
+            op.drop_column("calls", "analysis_status")
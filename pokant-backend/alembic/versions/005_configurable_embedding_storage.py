@@ -0,0 +1,35 @@
+"""apply embedding storage settings to call_attributes.embedding
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "005"
+down_revision = "004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from app.config import get_settings
+    from app.utils.vector_index import convert_embedding_column
+
+    # No-op with the defaults (vector(1536)); later changes of the settings
+    # are applied with scripts/convert_embedding_storage.py
+    settings = get_settings()
+    convert_embedding_column(
+        op.get_bind(),
+        settings.embedding_dimensions,
+        settings.embedding_storage,
+    )
+
+
+def downgrade() -> None:
+    from app.utils.vector_index import convert_embedding_column
+
+    convert_embedding_column(op.get_bind(), 1536, "vector")
@@ -0,0 +1,58 @@
+"""denormalize customer_id onto call_attributes
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "006"
+down_revision = "005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    from sqlalchemy import inspect
+    insp = inspect(conn)
+    if "call_attributes" not in insp.get_table_names():
+        return
+
+    cols = [c["name"] for c in insp.get_columns("call_attributes")]
+    if "customer_id" not in cols:
+        op.add_column(
+            "call_attributes",
+            sa.Column("customer_id", UUID(as_uuid=True), sa.ForeignKey("customers.id"), nullable=True),
+        )
+        op.execute(
+            """
+            UPDATE call_attributes a
+            SET customer_id = c.customer_id
+            FROM calls c
+            WHERE c.id = a.call_id
+            """
+        )
+
+    indexes = [i["name"] for i in insp.get_indexes("call_attributes")]
+    if "ix_call_attributes_customer_id" not in indexes:
+        op.create_index("ix_call_attributes_customer_id", "call_attributes", ["customer_id"])
+
+
+def downgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    insp = inspect(conn)
+    if "call_attributes" not in insp.get_table_names():
+        return
+    indexes = [i["name"] for i in insp.get_indexes("call_attributes")]
+    if "ix_call_attributes_customer_id" in indexes:
+        op.drop_index("ix_call_attributes_customer_id", table_name="call_attributes")
+    cols = [c["name"] for c in insp.get_columns("call_attributes")]
+    if "customer_id" in cols:
+        op.drop_column("call_attributes", "customer_id")
@@ -0,0 +1,154 @@
+"""partition calls and call_attributes by month
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17
+
+Rebuilds both tables as range-partitioned tables (calls by created_at,
+call_attributes by the new call_created_at) and copies the existing rows
+into monthly partitions. The copy runs in the migration transaction, so
+plan a maintenance window for large tables.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "007"
+down_revision = "006"
+branch_labels = None
+depends_on = None
+
+
+CALL_INDEXES = [
+    ("ix_calls_customer_id", "calls", "customer_id"),
+    ("ix_calls_customer_analysis_status", "calls", "customer_id, analysis_status"),
+    ("ix_calls_created_at", "calls", "created_at"),
+    ("ix_calls_failure_category", "calls", "failure_category"),
+    ("ix_call_attributes_call_id", "call_attributes", "call_id"),
+    ("ix_call_attributes_customer_id", "call_attributes", "customer_id"),
+    ("ix_call_attributes_failure_pattern", "call_attributes", "failure_pattern"),
+]
+
+
+def _relkind(conn, table):
+    from sqlalchemy import text
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}
+    ).scalar()
+
+
+def _create_indexes():
+    from app.utils.vector_index import create_embedding_index
+
+    for name, table, columns in CALL_INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+    create_embedding_index(op.get_bind())
+
+
+def upgrade() -> None:
+    from app.utils.partitions import ensure_partitions
+
+    conn = op.get_bind()
+    if _relkind(conn, "calls") != "r" or _relkind(conn, "call_attributes") != "r":
+        # Fresh install (created partitioned by the models) or already migrated
+        return
+
+    op.execute("UPDATE calls SET created_at = now() WHERE created_at IS NULL")
+
+    op.execute(
+        """
+        CREATE TABLE calls_partitioned (LIKE calls INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE call_attributes_partitioned (
+            LIKE call_attributes INCLUDING DEFAULTS,
+            call_created_at timestamp NOT NULL
+        )
+        PARTITION BY RANGE (call_created_at)
+        """
+    )
+
+    # Same data, new tables: swap names before creating partitions so
+    # partitions get their final names
+    op.execute("ALTER TABLE calls RENAME TO calls_unpartitioned")
+    op.execute("ALTER TABLE call_attributes RENAME TO call_attributes_unpartitioned")
+    op.execute("ALTER TABLE calls_partitioned RENAME TO calls")
+    op.execute("ALTER TABLE call_attributes_partitioned RENAME TO call_attributes")
+
+    since = conn.exec_driver_sql("SELECT min(created_at) FROM calls_unpartitioned").scalar()
+    ensure_partitions(conn, since=since.date() if since else None)
+
+    op.execute("INSERT INTO calls SELECT * FROM calls_unpartitioned")
+    op.execute(
+        """
+        INSERT INTO call_attributes
+        SELECT a.*, c.created_at
+        FROM call_attributes_unpartitioned a
+        JOIN calls_unpartitioned c ON c.id = a.call_id
+        """
+    )
+
+    op.execute("DROP TABLE call_attributes_unpartitioned")
+    op.execute("DROP TABLE calls_unpartitioned")
+
+    op.execute("ALTER TABLE calls ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE calls ADD PRIMARY KEY (id, created_at)")
+    op.execute(
+        """
+        ALTER TABLE calls ADD CONSTRAINT uq_calls_customer_provider_call_id
+        UNIQUE (customer_id, provider_call_id, created_at)
+        """
+    )
+    op.execute("ALTER TABLE calls ADD FOREIGN KEY (customer_id) REFERENCES customers (id)")
+    op.execute("ALTER TABLE calls ADD FOREIGN KEY (test_id) REFERENCES ab_tests (id)")
+    op.execute("ALTER TABLE calls ADD FOREIGN KEY (variant_id) REFERENCES variants (id)")
+
+    op.execute("ALTER TABLE call_attributes ADD PRIMARY KEY (id, call_created_at)")
+    op.execute(
+        """
+        ALTER TABLE call_attributes ADD FOREIGN KEY (call_id, call_created_at)
+        REFERENCES calls (id, created_at)
+        """
+    )
+    op.execute("ALTER TABLE call_attributes ADD FOREIGN KEY (customer_id) REFERENCES customers (id)")
+
+    _create_indexes()
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if _relkind(conn, "calls") != "p":
+        return
+
+    op.execute("ALTER TABLE call_attributes RENAME TO call_attributes_partitioned")
+    op.execute("ALTER TABLE calls RENAME TO calls_partitioned")
+
+    op.execute("CREATE TABLE calls (LIKE calls_partitioned INCLUDING DEFAULTS)")
+    op.execute("CREATE TABLE call_attributes (LIKE call_attributes_partitioned INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO calls SELECT * FROM calls_partitioned")
+    op.execute("INSERT INTO call_attributes SELECT * FROM call_attributes_partitioned")
+
+    # Dropping the parents drops their partitions (and their index names)
+    op.execute("DROP TABLE call_attributes_partitioned")
+    op.execute("DROP TABLE calls_partitioned")
+
+    op.execute("ALTER TABLE call_attributes DROP COLUMN call_created_at")
+    op.execute("ALTER TABLE calls ADD PRIMARY KEY (id)")
+    op.execute(
+        """
+        ALTER TABLE calls ADD CONSTRAINT uq_calls_customer_provider_call_id
+        UNIQUE (customer_id, provider_call_id)
+        """
+    )
+    op.execute("ALTER TABLE calls ADD FOREIGN KEY (customer_id) REFERENCES customers (id)")
+    op.execute("ALTER TABLE calls ADD FOREIGN KEY (test_id) REFERENCES ab_tests (id)")
+    op.execute("ALTER TABLE calls ADD FOREIGN KEY (variant_id) REFERENCES variants (id)")
+
+    op.execute("ALTER TABLE call_attributes ADD PRIMARY KEY (id)")
+    op.execute("ALTER TABLE call_attributes ADD FOREIGN KEY (call_id) REFERENCES calls (id)")
+    op.execute("ALTER TABLE call_attributes ADD FOREIGN KEY (customer_id) REFERENCES customers (id)")
+
+    _create_indexes()
@@ -0,0 +1,112 @@
+"""slim calls.metadata, add calls.ended_reason and call_payload_archives
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17
+
+Moves full provider payloads out of calls.metadata into
+call_payload_archives and keeps only the projected fields on calls.
+Existing payloads are always archived before they are stripped, whatever
+ARCHIVE_RAW_CALL_PAYLOADS says (that setting only governs new ingests),
+so the migration never loses data and downgrade can restore it. The
+space of the old TOASTed payloads is reclaimed by the next
+VACUUM (FULL) of the calls partitions, which can't run in a migration.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "008"
+down_revision = "007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from app.services.call_ingestion import SLIM_METADATA_FIELDS
+
+    conn = op.get_bind()
+    from sqlalchemy import inspect
+    insp = inspect(conn)
+    tables = insp.get_table_names()
+
+    if "call_payload_archives" not in tables:
+        op.create_table(
+            "call_payload_archives",
+            sa.Column("call_id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("customer_id", UUID(as_uuid=True), sa.ForeignKey("customers.id"), nullable=False),
+            sa.Column("provider_call_id", sa.String(255)),
+            sa.Column("payload", JSONB(), nullable=False),
+            sa.Column("archived_at", sa.DateTime()),
+        )
+        op.create_index(
+            "ix_call_payload_archives_customer_id",
+            "call_payload_archives",
+            ["customer_id"],
+        )
+        # lz4 TOAST compression where the server supports it (PG 14+ built with lz4)
+        savepoint = conn.begin_nested()
+        try:
+            conn.exec_driver_sql(
+                "ALTER TABLE call_payload_archives ALTER COLUMN payload SET COMPRESSION lz4"
+            )
+            savepoint.commit()
+        except Exception:  # noqa: BLE001
+            savepoint.rollback()
+
+    if "calls" not in tables:
+        return
+
+    cols = [c["name"] for c in insp.get_columns("calls")]
+    if "ended_reason" in cols:
+        return
+
+    op.add_column("calls", sa.Column("ended_reason", sa.String(100), nullable=True))
+
+    # Archive before stripping, unconditionally: the rewrite below is lossy
+    op.execute(
+        """
+        INSERT INTO call_payload_archives
+            (call_id, customer_id, provider_call_id, payload, archived_at)
+        SELECT id, customer_id, provider_call_id, metadata, now()
+        FROM calls
+        WHERE metadata IS NOT NULL AND metadata <> '{}'::jsonb
+        ON CONFLICT (call_id) DO NOTHING
+        """
+    )
+
+    projection = ", ".join(f"'{field}', metadata -> '{field}'" for field in SLIM_METADATA_FIELDS)
+    op.execute(
+        f"""
+        UPDATE calls SET
+            ended_reason = left(metadata ->> 'endedReason', 100),
+            metadata = jsonb_strip_nulls(jsonb_build_object({projection}))
+        WHERE metadata IS NOT NULL AND metadata <> '{{}}'::jsonb
+        """
+    )
+
+
+def downgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    insp = inspect(conn)
+    tables = insp.get_table_names()
+
+    if "calls" in tables:
+        cols = [c["name"] for c in insp.get_columns("calls")]
+        if "call_payload_archives" in tables:
+            # Restore full payloads where we have them
+            op.execute(
+                """
+                UPDATE calls SET metadata = a.payload
+                FROM call_payload_archives a
+                WHERE a.call_id = calls.id
+                """
+            )
+        if "ended_reason" in cols:
+            op.drop_column("calls", "ended_reason")
+
+    if "call_payload_archives" in tables:
+        op.drop_table("call_payload_archives")
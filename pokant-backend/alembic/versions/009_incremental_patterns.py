@@ -0,0 +1,97 @@
+"""incremental pattern maintenance: patterns.cluster_key/centroid, call_attributes.pattern_id
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17
+
+Existing duplicate patterns (one set per past run) are collapsed onto the
+newest row per (customer, failure_type), which gets the "label:" key and
+a zero frequency; the next cluster run recounts every failure into it.
+Older duplicates keep a NULL key and are left for manual cleanup, since
+variants may reference them.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = "009"
+down_revision = "008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    from app.config import get_settings
+    from app.utils.vector_index import column_spec, current_column_spec
+
+    conn = op.get_bind()
+    from sqlalchemy import inspect
+    insp = inspect(conn)
+    tables = insp.get_table_names()
+
+    if "patterns" in tables:
+        cols = [c["name"] for c in insp.get_columns("patterns")]
+        if "cluster_key" not in cols:
+            op.add_column("patterns", sa.Column("cluster_key", sa.String(255), nullable=True))
+            op.execute(
+                """
+                UPDATE patterns p SET
+                    cluster_key = 'label:' || coalesce(p.failure_type, 'other'),
+                    frequency = 0
+                FROM (
+                    SELECT DISTINCT ON (customer_id, coalesce(failure_type, 'other')) id
+                    FROM patterns
+                    ORDER BY customer_id, coalesce(failure_type, 'other'), created_at DESC
+                ) newest
+                WHERE p.id = newest.id
+                """
+            )
+            op.create_unique_constraint(
+                "uq_patterns_customer_cluster_key", "patterns", ["customer_id", "cluster_key"]
+            )
+        if "centroid" not in cols:
+            settings = get_settings()
+            spec = current_column_spec(conn) or column_spec(
+                settings.embedding_dimensions, settings.embedding_storage
+            )
+            op.execute(f"ALTER TABLE patterns ADD COLUMN centroid {spec}")
+        if "updated_at" not in cols:
+            op.add_column("patterns", sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+    if "call_attributes" in tables:
+        cols = [c["name"] for c in insp.get_columns("call_attributes")]
+        if "pattern_id" not in cols:
+            op.add_column(
+                "call_attributes",
+                sa.Column("pattern_id", UUID(as_uuid=True), sa.ForeignKey("patterns.id"), nullable=True),
+            )
+        op.execute(
+            """
+            CREATE INDEX IF NOT EXISTS ix_call_attributes_unassigned
+            ON call_attributes (customer_id) WHERE pattern_id IS NULL
+            """
+        )
+
+
+def downgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    insp = inspect(conn)
+    tables = insp.get_table_names()
+
+    if "call_attributes" in tables:
+        op.execute("DROP INDEX IF EXISTS ix_call_attributes_unassigned")
+        cols = [c["name"] for c in insp.get_columns("call_attributes")]
+        if "pattern_id" in cols:
+            op.drop_column("call_attributes", "pattern_id")
+
+    if "patterns" in tables:
+        constraints = [c["name"] for c in insp.get_unique_constraints("patterns")]
+        if "uq_patterns_customer_cluster_key" in constraints:
+            op.drop_constraint("uq_patterns_customer_cluster_key", "patterns", type_="unique")
+        cols = [c["name"] for c in insp.get_columns("patterns")]
+        for column in ("updated_at", "centroid", "cluster_key"):
+            if column in cols:
+                op.drop_column("patterns", column)
@@ -0,0 +1,41 @@
+"""add variants.ci_lower / ci_upper
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "010"
+down_revision = "009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    from sqlalchemy import inspect
+    insp = inspect(conn)
+    if "variants" not in insp.get_table_names():
+        return
+
+    cols = [c["name"] for c in insp.get_columns("variants")]
+    for column in ("ci_lower", "ci_upper"):
+        if column not in cols:
+            op.add_column("variants", sa.Column(column, sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    from sqlalchemy import inspect
+    conn = op.get_bind()
+    insp = inspect(conn)
+    if "variants" not in insp.get_table_names():
+        return
+    cols = [c["name"] for c in insp.get_columns("variants")]
+    for column in ("ci_upper", "ci_lower"):
+        if column in cols:
+            op.drop_column("variants", column)
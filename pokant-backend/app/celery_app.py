@@ -2,7 +2,11 @@
 Celery configuration for background jobs.
 
 Jobs:
-- analyze_customer_task: Full analysis pipeline
+- analyze_customer_task: Ingest calls, then fan out the analysis pipeline
+- analyze_calls_task: Analyze + embed one chunk of calls
+- cluster_customer_task: Chord callback that clusters patterns
+- maintain_partitions_task: Create/detach monthly call partitions (daily)
+- reanalyze_active_customers_task: Nightly incremental re-analysis
 - monitor_tests_task: Check all active A/B tests
 """
 
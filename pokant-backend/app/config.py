@@ -13,6 +13,105 @@ class Settings(BaseSettings):
     debug: bool = True
     redis_url: str = "redis://localhost:6379/0"
 
+    # Keep full provider call payloads in call_payload_archives (calls only
+    # store a slim projection either way)
+    archive_raw_call_payloads: bool = True
+
+    # Monthly partitions of calls/call_attributes: months created ahead, and
+    # months kept attached (0 = keep everything)
+    partition_months_ahead: int = 3
+    call_retention_months: int = 0
+
+    # How failures are grouped into patterns: "labels" (the LLM's
+    # failure_pattern) or "embeddings" (k-means over transcript embeddings)
+    pattern_clustering_method: str = "labels"
+
+    # Calls per analyze+embed sub-task when fanning out across Celery workers
+    analysis_chunk_size: int = 200
+    # Per-customer analysis run lock, so overlapping runs can't analyze the
+    # same pending calls twice (expires in case a run dies without releasing)
+    analysis_lock_ttl_seconds: int = 21600
+
+    # Claude request scheduling (0 disables a rate limit)
+    claude_max_concurrency: int = 8
+    claude_requests_per_minute: int = 50
+    claude_input_tokens_per_minute: int = 40000
+    claude_max_retries: int = 5
+
+    # Offline batch jobs (point at a local stand-in server for testing)
+    claude_batch_base_url: str = "https://api.anthropic.com"
+    claude_batch_poll_seconds: int = 60
+    claude_batch_timeout_seconds: int = 86400
+    # Pending calls per offline batch job, independent of the analysis chunk
+    # size (the provider caps a job at 100k requests / 256 MB)
+    claude_batch_max_requests: int = 10000
+
+    # Embedding backend: "openai" (text-embedding-3-small) or "local" (offline CPU)
+    embedding_provider: str = "openai"
+
+    # Embedding storage: dimensions (256/512/1024/1536) and "vector" (float32)
+    # or "halfvec" (float16). Apply to an existing database with
+    # scripts/convert_embedding_storage.py.
+    embedding_dimensions: int = 1536
+    embedding_storage: str = "vector"
+
+    # Embedding ANN index: "ivfflat" or "hnsw". Build parameters apply when the
+    # index is (re)built (scripts/rebuild_vector_index.py); search parameters
+    # are set per query.
+    embedding_index_type: str = "ivfflat"
+    embedding_ivfflat_lists: int = 100
+    embedding_ivfflat_probes: int = 10
+    embedding_hnsw_m: int = 16
+    embedding_hnsw_ef_construction: int = 64
+    embedding_hnsw_ef_search: int = 100
+
+    # Tenant-scoped similarity search: tenants with up to this many embedded
+    # calls get an exact scan; larger ones use the ANN index, optionally with
+    # iterative scans ("relaxed_order" or "strict_order"; pgvector >= 0.8 only,
+    # ignored on older servers)
+    vector_exact_search_max_rows: int = 20000
+    vector_iterative_scan: str = "off"
+
+    # Embedding request packing
+    embedding_batch_max_items: int = 256
+    embedding_batch_max_tokens: int = 100000
+    embedding_concurrency: int = 4
+
+    # Embedding cache (0 Redis entries = memory-only). Each Redis entry costs
+    # about 4 bytes per dimension plus ~200 bytes of key/index overhead
+    # (~6.3 KB at 1536 dims), and that Redis is shared with Celery
+    embedding_cache_memory_entries: int = 10000
+    embedding_cache_redis_entries: int = 30000
+
+    # Near-duplicate collapsing before analysis: transcripts whose
+    # estimated shingle Jaccard similarity reaches the threshold share one
+    # LLM analysis (0 disables; opt in with e.g. 0.8)
+    near_duplicate_threshold: float = 0.0
+    near_duplicate_num_perm: int = 128
+    near_duplicate_shingle_size: int = 4
+
+    # Offline variant testing: "racing" drops variants whose Wilson
+    # interval can't reach the leader's (opt-in); "exhaustive" simulates
+    # every case
+    variant_test_mode: str = "exhaustive"
+    variant_racing_confidence: float = 0.95
+    variant_racing_round_size: int = 10
+    variant_racing_min_cases: int = 20
+
+    # Batched variant judging: input tokens per request and cases per
+    # request (0 budget = one case per request)
+    simulation_batch_token_budget: int = 12000
+    simulation_batch_max_cases: int = 10
+
+    # Transcript token budgets for LLM prompts (0 = no trimming)
+    transcript_budget_analysis_tokens: int = 3000
+    transcript_budget_simulation_tokens: int = 1500
+    transcript_budget_example_tokens: int = 150
+
+    # Transcript analysis cache (0 Redis entries = memory-only)
+    analysis_cache_memory_entries: int = 5000
+    analysis_cache_redis_entries: int = 1000000
+
     model_config = {"env_file": ".env"}
 
 
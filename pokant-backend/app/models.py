@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 
 from sqlalchemy import (
+    DDL,
     Column,
     Date,
     String,
@@ -11,12 +12,18 @@ from sqlalchemy import (
     DateTime,
     Text,
     ForeignKey,
+    ForeignKeyConstraint,
     Index,
+    UniqueConstraint,
+    event,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from pgvector.sqlalchemy import Vector
+from sqlalchemy.orm import deferred
 
 from app.database import Base
+from app.utils.partitions import default_partition_ddl
+from app.utils.vector_index import embedding_column_type, embedding_opclass, index_options
 
 
 class Customer(Base):
@@ -37,6 +44,10 @@ class Customer(Base):
     api_token_hash = Column(String(64), unique=True, nullable=True)
     last_active_at = Column(DateTime, nullable=True)
 
+    # Ingestion high-water mark: newest provider call already stored
+    ingest_watermark_at = Column(DateTime, nullable=True)
+    ingest_watermark_call_id = Column(String(255), nullable=True)
+
     __table_args__ = (
         Index("ix_customers_email", "email"),
     )
@@ -51,17 +62,36 @@ class Call(Base):
     transcript = Column(Text)
     duration_seconds = Column(Float)
     outcome = Column(String(50))
+    ended_reason = Column(String(100))
     sentiment_score = Column(Float)
     failure_category = Column(String(100))
+    # Slim projection of the provider payload (see call_ingestion.SLIM_METADATA_FIELDS);
+    # the full payload lives in call_payload_archives
     metadata_ = Column("metadata", JSONB, default={})
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Partition key (monthly ranges, see app/utils/partitions), hence part of the PK
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     test_id = Column(UUID(as_uuid=True), ForeignKey("ab_tests.id"), nullable=True)
     variant_id = Column(UUID(as_uuid=True), ForeignKey("variants.id"), nullable=True)
 
+    # Analysis pipeline checkpoint: pending -> analyzed -> embedded.
+    # Ingestion marks failed calls 'pending'; everything else is 'skipped'.
+    analysis_status = Column(String(20), default="skipped")
+
     __table_args__ = (
         Index("ix_calls_customer_id", "customer_id"),
+        Index("ix_calls_customer_analysis_status", "customer_id", "analysis_status"),
         Index("ix_calls_created_at", "created_at"),
         Index("ix_calls_failure_category", "failure_category"),
+        # Dedupe key for bulk ingestion (INSERT ... ON CONFLICT DO NOTHING).
+        # Unique keys must include the partition key; a provider call always
+        # has the same created_at, so duplicates still collide.
+        UniqueConstraint(
+            "customer_id",
+            "provider_call_id",
+            "created_at",
+            name="uq_calls_customer_provider_call_id",
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
 
@@ -69,7 +99,11 @@ class CallAttribute(Base):
     __tablename__ = "call_attributes"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    call_id = Column(UUID(as_uuid=True), ForeignKey("calls.id"), nullable=False)
+    call_id = Column(UUID(as_uuid=True), nullable=False)
+    # Parent call's created_at: partition key, and half of the FK to calls
+    call_created_at = Column(DateTime, primary_key=True)
+    # Denormalized from calls so vector search can filter by tenant
+    customer_id = Column(UUID(as_uuid=True), ForeignKey("customers.id"))
 
     # 15 Claude-extracted analysis attributes
     accent_strength = Column(Integer, default=1)
@@ -88,19 +122,34 @@ class CallAttribute(Base):
     call_sentiment = Column(String(20))
     key_phrases = Column(JSONB, default=[])
 
-    # Vector embedding for semantic search
-    embedding = Column(Vector(1536))
+    # Pattern this failure was counted into (NULL until the cluster stage sees it)
+    pattern_id = Column(UUID(as_uuid=True), ForeignKey("patterns.id"))
+
+    # Vector embedding for semantic search. Type follows the embedding
+    # storage settings; deferred so attribute queries don't load it.
+    embedding = deferred(Column(embedding_column_type()))
 
     __table_args__ = (
+        ForeignKeyConstraint(
+            ["call_id", "call_created_at"],
+            ["calls.id", "calls.created_at"],
+        ),
         Index("ix_call_attributes_call_id", "call_id"),
+        Index("ix_call_attributes_customer_id", "customer_id"),
         Index("ix_call_attributes_failure_pattern", "failure_pattern"),
+        Index(
+            "ix_call_attributes_unassigned",
+            "customer_id",
+            postgresql_where=text("pattern_id IS NULL"),
+        ),
         Index(
             "ix_call_attributes_embedding",
             "embedding",
-            postgresql_using="ivfflat",
-            postgresql_with={"lists": 100},
-            postgresql_ops={"embedding": "vector_cosine_ops"},
+            postgresql_using=index_options()[0],
+            postgresql_with=index_options()[1],
+            postgresql_ops={"embedding": embedding_opclass()},
         ),
+        {"postgresql_partition_by": "RANGE (call_created_at)"},
     )
 
 
@@ -120,9 +169,16 @@ class Pattern(Base):
     suggested_fix = Column(Text)
     root_cause = Column(Text)
     status = Column(String(20), default="identified")
+    # Stable identity for upserts: "label:<failure_pattern>" or
+    # "cluster:<n>"; NULL for hand-made patterns
+    cluster_key = Column(String(255))
+    # Embedding cluster centre, used to assign new calls on arrival
+    centroid = deferred(Column(embedding_column_type()))
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     __table_args__ = (
+        UniqueConstraint("customer_id", "cluster_key", name="uq_patterns_customer_cluster_key"),
         Index("ix_patterns_customer_id", "customer_id"),
         Index("ix_patterns_severity", "severity"),
     )
@@ -147,6 +203,9 @@ class Variant(Base):
     improvement_delta = Column(Float, default=0.0)
     recommended = Column(Boolean, default=False)
     tested_against = Column(Integer, default=0)
+    # Confidence interval of the simulated success_rate (%)
+    ci_lower = Column(Float)
+    ci_upper = Column(Float)
 
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -189,3 +248,43 @@ class ABTest(Base):
         Index("ix_ab_tests_customer_id", "customer_id"),
         Index("ix_ab_tests_status", "status"),
     )
+
+
+class PipelineStageRun(Base):
+    __tablename__ = "pipeline_stage_runs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    customer_id = Column(UUID(as_uuid=True), ForeignKey("customers.id"), nullable=False)
+    stage = Column(String(20), nullable=False)
+    status = Column(String(20), default="running")
+    items_processed = Column(Integer, default=0)
+    stats = Column(JSONB, default={})
+    error = Column(Text)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_pipeline_stage_runs_customer_id", "customer_id"),
+    )
+
+
+class CallPayloadArchive(Base):
+    """Full provider call payloads, kept out of `calls` and loaded on demand."""
+
+    __tablename__ = "call_payload_archives"
+
+    # No FK: calls is partitioned and archived payloads outlive detached months
+    call_id = Column(UUID(as_uuid=True), primary_key=True)
+    customer_id = Column(UUID(as_uuid=True), ForeignKey("customers.id"), nullable=False)
+    provider_call_id = Column(String(255))
+    payload = Column(JSONB, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_call_payload_archives_customer_id", "customer_id"),
+    )
+
+
+# Partitioned tables need somewhere to put rows before monthly partitions exist
+for _table in (Call.__table__, CallAttribute.__table__):
+    event.listen(_table, "after_create", DDL(default_partition_ddl(_table.name)))
@@ -1,8 +1,9 @@
 import uuid
+from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends
 from sqlalchemy import case, func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 
 from app.database import get_db
 from app.models import Call, Pattern
@@ -56,6 +57,16 @@ async def get_dashboard(customer_id: str, db: Session = Depends(get_db)):
     # Recent calls
     recent = (
         db.query(Call)
+        .options(
+            load_only(
+                Call.id,
+                Call.outcome,
+                Call.duration_seconds,
+                Call.sentiment_score,
+                Call.failure_category,
+                Call.created_at,
+            )
+        )
         .filter(Call.customer_id == cid)
         .order_by(Call.created_at.desc())
         .limit(10)
@@ -73,8 +84,10 @@ async def get_dashboard(customer_id: str, db: Session = Depends(get_db)):
         for c in recent
     ]
 
-    # Trend data (daily aggregates for last 7 days)
+    # Trend data (daily aggregates for last 7 days). The created_at bound
+    # keeps the scan to the most recent monthly partitions.
     success_case = case((Call.outcome == "success", 1), else_=0)
+    window_start = datetime.utcnow().date() - timedelta(days=6)
     trend_data = (
         db.query(
             func.date(Call.created_at).label("date"),
@@ -82,6 +95,7 @@ async def get_dashboard(customer_id: str, db: Session = Depends(get_db)):
             func.sum(success_case).label("successes"),
         )
         .filter(Call.customer_id == cid)
+        .filter(Call.created_at >= window_start)
         .group_by(func.date(Call.created_at))
         .order_by(func.date(Call.created_at).desc())
         .limit(7)
@@ -80,6 +80,8 @@ class VariantResponse(BaseModel):
     improvement_delta: float
     recommended: bool
     tested_against: int
+    ci_lower: Optional[float] = None
+    ci_upper: Optional[float] = None
     created_at: datetime
 
     model_config = {"from_attributes": True}
@@ -0,0 +1,525 @@
+"""
+Checkpointed customer analysis pipeline.
+
+Stages:
+- ingest:  fetch calls from Vapi page by page and bulk-store them
+- analyze: extract attributes for failed calls still 'pending'
+- embed:   embed transcripts of calls that are 'analyzed'
+- cluster: group analyzed failures into patterns
+
+Fetch and store are fused into one streaming ingest stage so provider
+pages never pile up in memory; their timings are still reported
+separately. Every call carries its own ``analysis_status`` checkpoint
+(pending -> analyzed -> embedded, or skipped), so each later stage works
+from the database rather than from what the current run fetched. A run
+that dies in any stage resumes exactly where it stopped, and each stage
+can be run on its own. Every stage execution is recorded in
+``pipeline_stage_runs`` with its duration and item count.
+"""
+
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import Call, CallAttribute, Customer, Pattern, PipelineStageRun
+from app.services.call_ingestion import (
+    advance_watermark,
+    bulk_insert_calls,
+    watermark_cursor,
+)
+from app.services.claude_analysis import ClaudeAnalyzer
+from app.services.embedding_clustering import EmbeddingClusterer
+from app.services.encryption import decrypt_value
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.pattern_clustering import TOP_PATTERNS, PatternClusterer
+from app.services.transcript_metrics import extract_call_counts
+from app.services.vapi import VapiClient
+from app.utils.vectors import embed_texts
+
+STAGES = ("ingest", "analyze", "embed", "cluster")
+
+
+def attribute_row(
+    customer_id: uuid.UUID,
+    call_id: uuid.UUID,
+    call_created_at: datetime,
+    analysis: dict,
+) -> dict:
+    """Map a Claude analysis dict to a `call_attributes` row (no embedding yet)."""
+    return {
+        "id": uuid.uuid4(),
+        "call_id": call_id,
+        "call_created_at": call_created_at,
+        "customer_id": customer_id,
+        "accent_strength": analysis.get("accent_strength", 3),
+        "correction_attempts": analysis.get("correction_attempts", 0),
+        "emotional_markers": analysis.get("emotional_markers", []),
+        "disfluency_count": analysis.get("disfluency_count", 0),
+        "background_noise": analysis.get("background_noise", "none"),
+        "context_type": analysis.get("context_type"),
+        "failure_pattern": analysis.get("failure_pattern"),
+        "conversation_flow": analysis.get("conversation_flow"),
+        "bot_interruptions": analysis.get("bot_interruptions", 0),
+        "customer_interruptions": analysis.get("customer_interruptions", 0),
+        "clarification_requests": analysis.get("clarification_requests", 0),
+        "successful_resolution": analysis.get("successful_resolution", False),
+        "confidence_level": analysis.get("confidence_level", 3),
+        "call_sentiment": analysis.get("call_sentiment"),
+        "key_phrases": analysis.get("key_phrases", []),
+    }
+
+
+class AnalysisPipeline:
+    def __init__(
+        self,
+        db: Session,
+        customer: Customer,
+        chunk_size: int = 100,
+    ):
+        self.db = db
+        self.customer = customer
+        self.chunk_size = chunk_size
+        self.claude = ClaudeAnalyzer()
+        # Calls each stage left for the next run this time, by stage name
+        self.failed: dict[str, int] = {}
+
+    # ── Bookkeeping ─────────────────────────────────────────────────
+
+    @contextmanager
+    def _track(self, stage: str):
+        """Record a stage execution (duration, items, stats) in pipeline_stage_runs."""
+        run = PipelineStageRun(
+            id=uuid.uuid4(),
+            customer_id=self.customer.id,
+            stage=stage,
+            status="running",
+            started_at=datetime.utcnow(),
+        )
+        self.db.add(run)
+        self.db.commit()
+
+        started = time.monotonic()
+        result = {"items": 0, "stats": {}}
+        print(f"\n--- Stage: {stage} ---")
+
+        try:
+            yield result
+        except Exception as e:
+            self.db.rollback()
+            run.status = "failed"
+            run.error = f"{e}\n{traceback.format_exc()}"[:4000]
+            raise
+        else:
+            run.status = "completed"
+        finally:
+            elapsed = time.monotonic() - started
+            run.items_processed = result["items"]
+            run.stats = {**result["stats"], "seconds": round(elapsed, 2)}
+            run.finished_at = datetime.utcnow()
+            self.db.commit()
+            print(f"  {stage}: {result['items']} items in {elapsed:.1f}s")
+
+    def _set_status(self, call_ids: Iterable[uuid.UUID], status: str) -> None:
+        self.db.execute(
+            update(Call)
+            .where(Call.id.in_(list(call_ids)))
+            .values(analysis_status=status)
+        )
+
+    # ── Stages ──────────────────────────────────────────────────────
+
+    async def ingest(
+        self,
+        limit: Optional[int] = 1000,
+        incremental: bool = False,
+    ) -> int:
+        """
+        Stream calls from Vapi into the database.
+
+        In incremental mode only calls newer than the customer's ingestion
+        watermark are fetched, and ``limit`` is ignored so no new call is
+        ever skipped. The watermark advances once the fetch completes, but
+        only if the walk reached the oldest call: a full run cut short by
+        ``limit`` leaves it alone, or the calls past the limit would never
+        be fetched by later incremental runs.
+
+        Returns:
+            Number of new calls stored.
+        """
+        with self._track("ingest") as result:
+            vapi = VapiClient(decrypt_value(self.customer.vapi_api_key_encrypted))
+
+            created_at_gt = watermark_cursor(self.customer) if incremental else None
+            if incremental:
+                print(f"  Incremental mode: fetching calls after {created_at_gt or 'the beginning'}")
+
+            fetched = 0
+            stored = 0
+            fetch_seconds = 0.0
+            store_seconds = 0.0
+            newest_call = None
+
+            pages = vapi.iter_call_pages(
+                page_size=self.chunk_size,
+                created_at_gt=created_at_gt,
+                max_calls=None if incremental else limit,
+            )
+            while True:
+                started = time.monotonic()
+                calls_data = await anext(pages, None)
+                fetch_seconds += time.monotonic() - started
+                if calls_data is None:
+                    break
+
+                fetched += len(calls_data)
+                if newest_call is None:
+                    newest_call = {
+                        "id": calls_data[0]["id"],
+                        "createdAt": calls_data[0]["createdAt"],
+                    }
+
+                started = time.monotonic()
+                stored += len(bulk_insert_calls(self.db, self.customer.id, calls_data))
+                store_seconds += time.monotonic() - started
+
+            print(f"  Retrieved {fetched} calls, stored {stored} new calls")
+
+            # Hitting the limit may have left older history unfetched
+            walked_everything = incremental or limit is None or fetched < limit
+            if not walked_everything:
+                print(f"  Stopped at the {limit}-call limit; watermark left unchanged")
+            elif advance_watermark(self.customer, newest_call):
+                self.db.commit()
+                print(f"  Watermark advanced to {self.customer.ingest_watermark_at.isoformat()}")
+
+            result["items"] = stored
+            result["stats"] = {
+                "fetched": fetched,
+                "fetch_seconds": round(fetch_seconds, 2),
+                "store_seconds": round(store_seconds, 2),
+            }
+            return stored
+
+    def _calls_with_status(self, status: str, call_ids: Optional[list[uuid.UUID]]):
+        query = (
+            self.db.query(Call.id)
+            .filter(Call.customer_id == self.customer.id)
+            .filter(Call.analysis_status == status)
+        )
+        if call_ids is not None:
+            query = query.filter(Call.id.in_(call_ids))
+        return query
+
+    def unfinished_call_chunks(self, chunk_size: Optional[int] = None) -> list[list[str]]:
+        """
+        Split the customer's pending/analyzed calls into ID chunks.
+
+        Used to fan the analyze and embed stages out across workers.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        call_ids = [
+            str(call_id)
+            for (call_id,) in self.db.query(Call.id)
+            .filter(Call.customer_id == self.customer.id)
+            .filter(Call.analysis_status.in_(["pending", "analyzed"]))
+            .order_by(Call.created_at)
+            .all()
+        ]
+        return [
+            call_ids[start:start + chunk_size]
+            for start in range(0, len(call_ids), chunk_size)
+        ]
+
+    async def analyze(
+        self,
+        batch_job: bool = False,
+        call_ids: Optional[list[uuid.UUID]] = None,
+    ) -> int:
+        """
+        Analyze every pending failed call of the customer, chunk by chunk.
+
+        Attributes and the 'analyzed' checkpoint are committed together per
+        chunk, so an interrupted run re-analyzes at most one chunk. Calls
+        whose analysis fails stay 'pending' for the next run; the stage
+        stops early if a whole chunk fails (provider down).
+
+        With ``batch_job`` up to ``claude_batch_max_requests`` pending calls
+        go through a single offline provider batch job (cheaper for
+        backfills), independently of the chunk size; its results are then
+        written and checkpointed chunk by chunk. Finished results are in
+        the analysis cache, so a crash while writing doesn't resubmit them.
+
+        With ``near_duplicate_threshold`` set (off by default), near-duplicate
+        transcripts (see near_duplicates) are analyzed once per run: members
+        get their representative's semantic attributes and their own locally
+        computed counts.
+
+        Args:
+            batch_job: Use offline provider batch jobs.
+            call_ids: Only consider these calls (None = all of the customer's).
+
+        Returns:
+            Number of calls analyzed.
+        """
+        with self._track("analyze") as result:
+            # One provider job covers many chunks; live requests go a chunk at a time
+            fetch_size = (
+                get_settings().claude_batch_max_requests if batch_job else self.chunk_size
+            )
+            duplicates = self._near_duplicate_index()
+            # Analyses of representatives seen so far, reused by later chunks
+            representative_analyses: dict[str, dict] = {}
+            collapsed = 0
+            failed: list[uuid.UUID] = []
+
+            while True:
+                query = self._calls_with_status("pending", call_ids)
+                if failed:
+                    # Already failed this run; left for the next one
+                    query = query.filter(Call.id.notin_(failed))
+                pending = (
+                    query
+                    .with_entities(Call.id, Call.transcript, Call.outcome, Call.created_at)
+                    .order_by(Call.created_at)
+                    .limit(fetch_size)
+                    .all()
+                )
+                if not pending:
+                    break
+
+                transcripts = [
+                    (str(call_id), transcript or "", outcome)
+                    for call_id, transcript, outcome, _ in pending
+                ]
+                created_at = {str(row.id): row.created_at for row in pending}
+
+                if duplicates is not None:
+                    # Outcome is part of the prompt, so it is part of the text compared
+                    representatives = duplicates.assign(
+                        [(call_id, f"{outcome}\n{t}") for call_id, t, outcome in transcripts]
+                    )
+                else:
+                    representatives = [call_id for call_id, _, _ in transcripts]
+                to_analyze = [
+                    item for item, rep in zip(transcripts, representatives) if rep == item[0]
+                ]
+
+                if batch_job:
+                    fresh = await self.claude.batch_analyze_offline(to_analyze)
+                else:
+                    fresh = await self.claude.batch_analyze(to_analyze)
+                fresh = {a["call_id"]: a for a in fresh}
+                if duplicates is not None:
+                    representative_analyses.update(fresh)
+
+                analyses = []
+                for (call_id, transcript, _), rep in zip(transcripts, representatives):
+                    if rep == call_id:
+                        if call_id in fresh:
+                            analyses.append(fresh[call_id])
+                        else:
+                            failed.append(uuid.UUID(call_id))
+                    elif rep not in representative_analyses:
+                        # The representative's analysis failed; retry both next run
+                        failed.append(uuid.UUID(call_id))
+                    else:
+                        # Semantic attributes from the representative, counts from this call
+                        collapsed += 1
+                        analyses.append({
+                            **representative_analyses[rep],
+                            **extract_call_counts(transcript),
+                            "call_id": call_id,
+                        })
+
+                for start in range(0, len(analyses), self.chunk_size):
+                    written = analyses[start:start + self.chunk_size]
+                    self.db.add_all(
+                        CallAttribute(
+                            **attribute_row(
+                                self.customer.id,
+                                uuid.UUID(a["call_id"]),
+                                created_at[a["call_id"]],
+                                a,
+                            )
+                        )
+                        for a in written
+                    )
+                    self._set_status((uuid.UUID(a["call_id"]) for a in written), "analyzed")
+                    self.db.commit()
+
+                    result["items"] += len(written)
+                if not analyses:
+                    break
+
+            if collapsed:
+                print(
+                    f"  {collapsed}/{result['items']} transcripts were near duplicates "
+                    f"analyzed through {len(duplicates)} representatives"
+                )
+            if failed:
+                result["stats"]["failed"] = self.failed["analyze"] = len(failed)
+                print(f"  {len(failed)} calls failed to analyze; left 'pending' for the next run")
+            return result["items"]
+
+    def _near_duplicate_index(self) -> Optional[NearDuplicateIndex]:
+        settings = get_settings()
+        if not settings.near_duplicate_threshold:
+            return None
+        return NearDuplicateIndex(
+            threshold=settings.near_duplicate_threshold,
+            num_perm=settings.near_duplicate_num_perm,
+            shingle_size=settings.near_duplicate_shingle_size,
+        )
+
+    async def embed(self, call_ids: Optional[list[uuid.UUID]] = None) -> int:
+        """
+        Embed transcripts of all analyzed (not yet embedded) calls.
+
+        Calls whose embedding request fails stay 'analyzed' and are
+        retried by the next run; the stage stops early if a whole chunk
+        fails (provider down).
+
+        Args:
+            call_ids: Only consider these calls (None = all of the customer's).
+
+        Returns:
+            Number of calls embedded.
+        """
+        with self._track("embed") as result:
+            failed: list[uuid.UUID] = []
+
+            while True:
+                query = self._calls_with_status("analyzed", call_ids)
+                if failed:
+                    # Already failed this run; left for the next one
+                    query = query.filter(Call.id.notin_(failed))
+                rows = (
+                    query
+                    .with_entities(
+                        CallAttribute.id,
+                        CallAttribute.call_created_at,
+                        Call.id.label("call_id"),
+                        Call.transcript,
+                    )
+                    .join(
+                        CallAttribute,
+                        (Call.id == CallAttribute.call_id)
+                        & (Call.created_at == CallAttribute.call_created_at),
+                    )
+                    .limit(self.chunk_size)
+                    .all()
+                )
+                if not rows:
+                    break
+
+                # Packed, concurrent batch requests for the whole chunk
+                embeddings = await embed_texts([row.transcript or "" for row in rows])
+
+                embedded = [(row, e) for row, e in zip(rows, embeddings) if e is not None]
+                failed.extend(row.call_id for row, e in zip(rows, embeddings) if e is None)
+
+                if embedded:
+                    self.db.execute(
+                        update(CallAttribute),
+                        [
+                            {
+                                "id": row.id,
+                                "call_created_at": row.call_created_at,
+                                "embedding": embedding,
+                            }
+                            for row, embedding in embedded
+                        ],
+                    )
+                    self._set_status((row.call_id for row, _ in embedded), "embedded")
+                    self.db.commit()
+
+                result["items"] += len(embedded)
+                if not embedded:
+                    break
+
+            if failed:
+                result["stats"]["failed"] = self.failed["embed"] = len(failed)
+                print(f"  {len(failed)} calls failed to embed; left 'analyzed' for the next run")
+            return result["items"]
+
+    def cluster(self) -> list[str]:
+        """
+        Count newly analyzed failures into the customer's patterns.
+
+        Returns:
+            IDs of the patterns that gained calls.
+        """
+        with self._track("cluster") as result:
+            customer_id = str(self.customer.id)
+            if get_settings().pattern_clustering_method == "embeddings":
+                clusterer = EmbeddingClusterer(self.db)
+            else:
+                clusterer = PatternClusterer(self.db)
+            pattern_ids = clusterer.update_patterns(customer_id)
+
+            top_patterns = (
+                self.db.query(Pattern)
+                .filter(Pattern.customer_id == self.customer.id)
+                .filter(Pattern.cluster_key.like(f"{clusterer.key_prefix}:%"))
+                .order_by(Pattern.frequency.desc())
+                .limit(TOP_PATTERNS)
+                .all()
+            )
+            print("  Top patterns:")
+            for p in top_patterns:
+                print(f"    - {p.name}: {p.frequency} failures ({p.description})")
+
+            self.customer.status = "active"
+            self.db.commit()
+
+            result["items"] = len(pattern_ids)
+            return pattern_ids
+
+    # ── Orchestration ───────────────────────────────────────────────
+
+    async def run(
+        self,
+        stages: Iterable[str] = STAGES,
+        limit: Optional[int] = 1000,
+        incremental: bool = False,
+        batch_job: bool = False,
+    ) -> dict:
+        """
+        Run the requested stages in pipeline order.
+
+        Clustering is skipped when it runs alongside analyze/embed and
+        neither found new work; run the cluster stage alone to force it.
+
+        Returns:
+            Summary dict with per-stage counts, plus per-stage counts of
+            calls left for the next run under 'failed'.
+        """
+        stages = [s for s in STAGES if s in set(stages)]
+        summary: dict = {}
+
+        if "ingest" in stages:
+            summary["stored"] = await self.ingest(limit=limit, incremental=incremental)
+        if "analyze" in stages:
+            summary["analyzed"] = await self.analyze(batch_job=batch_job)
+        if "embed" in stages:
+            summary["embedded"] = await self.embed()
+        if self.failed:
+            summary["failed"] = dict(self.failed)
+
+        if "cluster" in stages:
+            ran_work_stages = "analyze" in stages or "embed" in stages
+            if ran_work_stages and not summary.get("analyzed") and not summary.get("embedded"):
+                print("\nNo new failures analyzed; skipping clustering")
+                self.customer.status = "active"
+                self.db.commit()
+            else:
+                summary["pattern_ids"] = self.cluster()
+
+        return summary
@@ -0,0 +1,187 @@
+"""
+Bulk ingestion of provider call records.
+
+Turns raw Vapi call payloads into `calls` rows and inserts them in
+batches with ``INSERT ... ON CONFLICT DO NOTHING RETURNING id``, so
+de-duplication against already stored calls happens inside Postgres
+instead of one existence query per call.
+
+Only the fields we use are kept on `calls` (typed columns plus a slim
+``metadata`` projection). Payloads carry the full message list and
+artifacts, which made every `calls` row a large TOASTed value, so the
+raw payload goes to `call_payload_archives` instead (when enabled) and
+is read back only by ``load_raw_payload``.
+"""
+
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import Call, CallPayloadArchive, Customer
+from app.utils.partitions import try_ensure_month_partitions
+
+# Rows per INSERT statement (keeps bind parameters well under Postgres' 65535 limit)
+INSERT_BATCH_SIZE = 1000
+
+# Payload fields kept in calls.metadata (everything else is archive-only)
+SLIM_METADATA_FIELDS = (
+    "type",
+    "status",
+    "assistantId",
+    "phoneNumberId",
+    "squadId",
+    "startedAt",
+    "endedAt",
+    "cost",
+    "recordingUrl",
+    "analysis",
+)
+
+
+def determine_outcome(call_data: dict) -> str:
+    """Determine if a call succeeded or failed based on Vapi metadata."""
+    end_reason = call_data.get("endedReason", "")
+
+    if "assistant-ended-call" in end_reason:
+        return "success"
+    elif "customer-ended-call" in end_reason:
+        # Short calls likely failed
+        if call_data.get("duration", 0) < 30:
+            return "failed"
+        return "success"
+    else:
+        return "abandoned"
+
+
+def parse_provider_timestamp(value: str) -> datetime:
+    """Parse a Vapi ISO timestamp ("...Z") into a naive UTC datetime."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def project_metadata(call_data: dict) -> dict:
+    """Slim copy of a provider payload with only SLIM_METADATA_FIELDS."""
+    return {
+        key: call_data[key]
+        for key in SLIM_METADATA_FIELDS
+        if call_data.get(key) is not None
+    }
+
+
+def call_row_from_vapi(customer_id: uuid.UUID, call_data: dict) -> dict:
+    """Map a Vapi call payload to a `calls` row."""
+    outcome = determine_outcome(call_data)
+    return {
+        "id": uuid.uuid4(),
+        "customer_id": customer_id,
+        "provider_call_id": call_data["id"],
+        "transcript": call_data.get("transcript", ""),
+        "duration_seconds": call_data.get("duration", 0),
+        "outcome": outcome,
+        "ended_reason": (call_data.get("endedReason") or "")[:100] or None,
+        "metadata_": project_metadata(call_data),
+        "created_at": parse_provider_timestamp(call_data["createdAt"]),
+        # Only failed calls go through analysis
+        "analysis_status": "pending" if outcome == "failed" else "skipped",
+    }
+
+
+def bulk_insert_calls(
+    db: Session,
+    customer_id: uuid.UUID,
+    calls_data: list[dict],
+    batch_size: int = INSERT_BATCH_SIZE,
+) -> list[dict]:
+    """
+    Insert provider calls, skipping ones already stored for this customer.
+
+    Uses the (customer_id, provider_call_id, created_at) unique constraint,
+    so a page of N calls costs ceil(N / batch_size) statements. Missing
+    monthly partitions for the calls' months (backfills) are created first
+    in a short transaction of their own; if that can't get its lock
+    quickly the rows land in the DEFAULT partition.
+
+    Returns:
+        The rows that were actually inserted (same keys as call_row_from_vapi).
+    """
+    rows = [call_row_from_vapi(customer_id, c) for c in calls_data]
+    raw_payloads = {c["id"]: c for c in calls_data}
+    archive = get_settings().archive_raw_call_payloads
+    inserted: list[dict] = []
+
+    if rows:
+        try_ensure_month_partitions(db.get_bind(), (row["created_at"] for row in rows))
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        stmt = (
+            insert(Call)
+            .values(batch)
+            .on_conflict_do_nothing(
+                index_elements=[Call.customer_id, Call.provider_call_id, Call.created_at],
+            )
+            .returning(Call.id)
+        )
+        new_ids = set(db.execute(stmt).scalars())
+        new_rows = [row for row in batch if row["id"] in new_ids]
+        inserted.extend(new_rows)
+
+        if archive and new_rows:
+            db.execute(
+                insert(CallPayloadArchive)
+                .values([
+                    {
+                        "call_id": row["id"],
+                        "customer_id": customer_id,
+                        "provider_call_id": row["provider_call_id"],
+                        "payload": raw_payloads[row["provider_call_id"]],
+                    }
+                    for row in new_rows
+                ])
+                .on_conflict_do_nothing(index_elements=[CallPayloadArchive.call_id])
+            )
+
+    db.commit()
+    return inserted
+
+
+def load_raw_payload(db: Session, call_id: uuid.UUID) -> Optional[dict]:
+    """Full provider payload of a call, if it was archived."""
+    return (
+        db.query(CallPayloadArchive.payload)
+        .filter(CallPayloadArchive.call_id == call_id)
+        .scalar()
+    )
+
+
+def watermark_cursor(customer: Customer) -> Optional[str]:
+    """Return the customer's ingestion watermark as a Vapi createdAtGt value."""
+    if not customer.ingest_watermark_at:
+        return None
+    return customer.ingest_watermark_at.isoformat(timespec="milliseconds") + "Z"
+
+
+def advance_watermark(customer: Customer, newest_call: Optional[dict]) -> bool:
+    """
+    Move the customer's watermark forward to the newest ingested call.
+
+    Only call this once a fetch walk has completed: pages arrive newest
+    first, so advancing mid-walk would skip the older calls of a run that
+    crashed part way through.
+
+    Returns:
+        True if the watermark moved.
+    """
+    if not newest_call:
+        return False
+
+    newest_at = parse_provider_timestamp(newest_call["createdAt"])
+    if customer.ingest_watermark_at and newest_at <= customer.ingest_watermark_at:
+        return False
+
+    customer.ingest_watermark_at = newest_at
+    customer.ingest_watermark_call_id = newest_call["id"]
+    return True
@@ -2,15 +2,50 @@
 Claude-powered transcript analysis.
 
 Uses Claude 3.5 Sonnet to analyze call transcripts and extract
-15 structured attributes for pattern detection.
+15 structured attributes for pattern detection. The five countable
+attributes are computed locally (see transcript_metrics); Claude is only
+asked for the semantic ones.
 """
 
+import asyncio
+import hashlib
 import json
+from functools import lru_cache
 from typing import Optional
 
 import anthropic
 
 from app.config import get_settings
+from app.services.claude_batch import (
+    AnthropicBatchBackend,
+    BatchJobBackend,
+    run_batch_job,
+)
+from app.services.transcript_metrics import extract_call_counts
+from app.services.transcript_preprocessor import PreparedTranscript, prepare_transcript
+from app.utils.cache import TieredCache
+from app.utils.rate_limit import get_rate_limiter, retry_with_backoff
+from app.utils.tokens import estimate_tokens
+
+ANALYSIS_MAX_TOKENS = 1000
+
+# Bump whenever the analysis prompt or output schema changes; cached
+# results from other versions are then ignored (and age out of the cache).
+PROMPT_VERSION = "v2"
+
+
+@lru_cache
+def get_analysis_cache() -> TieredCache[dict]:
+    """Process-wide transcript analysis cache (memory LRU + optional Redis tier)."""
+    settings = get_settings()
+    return TieredCache(
+        namespace="analysis",
+        memory_entries=settings.analysis_cache_memory_entries,
+        persistent_entries=settings.analysis_cache_redis_entries,
+        redis_url=settings.redis_url if settings.analysis_cache_redis_entries else None,
+        encode=lambda analysis: json.dumps(analysis).encode(),
+        decode=json.loads,
+    )
 
 
 class ClaudeAnalyzer:
@@ -18,21 +53,62 @@ class ClaudeAnalyzer:
         settings = get_settings()
         self.client = anthropic.AsyncAnthropic(
             api_key=api_key or settings.claude_api_key,
+            # Retries are handled by retry_with_backoff so they pass the limiter
+            max_retries=0,
         )
         self.model = "claude-sonnet-4-5-20250929"
+        self.max_concurrency = settings.claude_max_concurrency
+        self.max_retries = settings.claude_max_retries
+        self.limiter = get_rate_limiter(
+            "claude",
+            requests_per_minute=settings.claude_requests_per_minute,
+            tokens_per_minute=settings.claude_input_tokens_per_minute,
+        )
+        self.cache = get_analysis_cache()
+        self.transcript_budget = settings.transcript_budget_analysis_tokens
+        self.tokens_saved = 0
 
-    async def analyze_transcript(self, transcript: str, outcome: str) -> dict:
+    async def create_message(self, prompt: str, max_tokens: int):
         """
-        Analyze a single call transcript and extract 15 attributes.
+        Send a single-prompt request through the shared rate limiter.
 
-        Args:
-            transcript: Full conversation text.
-            outcome: 'success', 'failed', or 'abandoned'.
-
-        Returns:
-            Dictionary with 15 extracted attributes.
+        Rate-limit (429) and overload errors are retried with jittered
+        exponential backoff; other errors are raised to the caller.
         """
-        prompt = f"""Analyze this voice bot call transcript and extract these attributes.
+        async def attempt():
+            await self.limiter.acquire(estimate_tokens(prompt))
+            return await self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}],
+            )
+
+        return await retry_with_backoff(attempt, max_retries=self.max_retries)
+
+    def prepare(self, transcript: str) -> PreparedTranscript:
+        """Normalize a transcript and trim it to the analysis token budget."""
+        prepared = prepare_transcript(
+            transcript,
+            max_tokens=self.transcript_budget or None,
+        )
+        self.tokens_saved += prepared.tokens_saved
+        return prepared
+
+    def _prepare_many(
+        self,
+        transcripts: list[tuple[str, str, str]],
+    ) -> list[tuple[str, str, str]]:
+        """Preprocess (call_id, transcript, outcome) tuples and report savings."""
+        prepared = [(call_id, self.prepare(t), o) for call_id, t, o in transcripts]
+        original = sum(p.original_tokens for _, p, _ in prepared)
+        saved = sum(p.tokens_saved for _, p, _ in prepared)
+        if saved:
+            print(f"  Transcript preprocessing saved ~{saved}/{original} input tokens")
+        return [(call_id, p.text, o) for call_id, p, o in prepared]
+
+    def build_analysis_prompt(self, transcript: str, outcome: str) -> str:
+        """Build the attribute-extraction prompt for one transcript."""
+        return f"""Analyze this voice bot call transcript and extract these attributes.
 
 Call outcome: {outcome}
 
@@ -43,16 +119,11 @@ Extract the following (return ONLY valid JSON, no markdown):
 
 {{
   "accent_strength": <1-5, where 5=very strong accent detected>,
-  "correction_attempts": <number of times customer tries to correct bot>,
   "emotional_markers": [<array of: "frustrated", "confused", "angry", "neutral", "happy">],
-  "disfluency_count": <count of um, uh, pauses, restarts>,
   "background_noise": "<none|low|medium|high - infer from transcript mentions>",
   "context_type": "<appointment|inquiry|complaint|modification|cancellation>",
   "failure_pattern": "<customer_changes_mind|complex_scheduling|unclear_availability|bot_confusion|other>",
   "conversation_flow": "<smooth|interrupted|confused>",
-  "bot_interruptions": <count>,
-  "customer_interruptions": <count>,
-  "clarification_requests": <count of clarifying questions>,
   "successful_resolution": <true|false>,
   "confidence_level": <1-5, how confident was bot>,
   "call_sentiment": "<positive|neutral|negative>",
@@ -61,30 +132,58 @@ Extract the following (return ONLY valid JSON, no markdown):
 
 Focus on:
 - Accent: Detect from spelling variations, repeated clarifications, "what?" responses
-- Corrections: Customer says "no, actually..." or changes their mind
 - Emotions: Detect from language ("this is frustrating", "I don't understand")
-- Failure patterns: Why did this call fail? What went wrong?"""
+- Failure patterns: Why did this call fail? What went wrong? Did the customer change their mind?"""
 
-        try:
-            response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                messages=[{"role": "user", "content": prompt}],
-            )
+    def parse_analysis(self, content: str) -> dict:
+        """Parse Claude's JSON answer (with or without markdown fences)."""
+        # Strip markdown code fences if present
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+
+        return json.loads(content)
+
+    def cache_key(self, transcript: str, outcome: str) -> str:
+        """Cache address: (model, prompt version, sha256 of the preprocessed prompt inputs)."""
+        digest = hashlib.sha256(f"{outcome}\n{transcript}".encode()).hexdigest()
+        return f"{self.model}:{PROMPT_VERSION}:{digest}"
+
+    async def _request_analysis(self, transcript: str, outcome: str) -> dict:
+        """Ask Claude for the attributes of one transcript (raises on failure)."""
+        prompt = self.build_analysis_prompt(transcript, outcome)
+        response = await self.create_message(prompt, max_tokens=ANALYSIS_MAX_TOKENS)
+        return self.parse_analysis(response.content[0].text)
+
+    async def analyze_transcript(self, transcript: str, outcome: str) -> dict:
+        """
+        Analyze a single call transcript and extract 15 attributes.
 
-            content = response.content[0].text
+        Args:
+            transcript: Full conversation text.
+            outcome: 'success', 'failed', or 'abandoned'.
 
-            # Strip markdown code fences if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
+        Returns:
+            Dictionary with 15 extracted attributes.
+        """
+        # Counts come from the full transcript, before any trimming
+        counts = extract_call_counts(transcript)
+
+        transcript = self.prepare(transcript).text
+        key = self.cache_key(transcript, outcome)
+        cached = (await self.cache.get_many([key])).get(key)
+        if cached is not None:
+            return {**cached, **counts}
 
-            return json.loads(content)
+        try:
+            analysis = await self._request_analysis(transcript, outcome)
+            await self.cache.set_many({key: analysis})
+            return {**analysis, **counts}
 
         except Exception as e:
             print(f"Error analyzing transcript: {e}")
-            return self._get_default_analysis()
+            return {**self._get_default_analysis(), **counts}
 
     def _get_default_analysis(self) -> dict:
         """Fallback analysis if Claude request fails."""
@@ -109,22 +208,136 @@ Focus on:
     async def batch_analyze(
         self,
         transcripts: list[tuple[str, str, str]],
+        concurrency: Optional[int] = None,
+    ) -> list[dict]:
+        """
+        Analyze multiple transcripts concurrently.
+
+        Transcripts already in the analysis cache are served without a
+        request, and identical transcripts are analyzed once. At most
+        ``concurrency`` requests are in flight at once, and all of them go
+        through the shared requests/min and tokens/min limiter.
+
+        Args:
+            transcripts: List of (call_id, transcript, outcome) tuples.
+            concurrency: Max in-flight requests (defaults to settings).
+
+        Returns:
+            List of analysis results in input order, each with a 'call_id' key
+            added. Calls whose request failed are left out, so callers can
+            retry them instead of storing a made-up analysis.
+        """
+        counts = [extract_call_counts(t) for _, t, _ in transcripts]
+        transcripts = self._prepare_many(transcripts)
+        keys = [self.cache_key(t, o) for _, t, o in transcripts]
+        analyses = await self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # One request per distinct uncached transcript
+        to_analyze: dict[str, tuple[str, str]] = {}
+        for key, (_, transcript, outcome) in zip(keys, transcripts):
+            if key not in analyses and key not in to_analyze:
+                to_analyze[key] = (transcript, outcome)
+
+        if analyses:
+            print(f"  {len(transcripts) - len(to_analyze)}/{len(transcripts)} analyses served from cache")
+
+        semaphore = asyncio.Semaphore(concurrency or self.max_concurrency)
+        total = len(to_analyze)
+        done = 0
+
+        async def analyze_one(key: str, transcript: str, outcome: str) -> None:
+            nonlocal done
+            try:
+                async with semaphore:
+                    analyses[key] = await self._request_analysis(transcript, outcome)
+                # Cache as each result lands so a crashed run keeps its progress
+                await self.cache.set_many({key: analyses[key]})
+            except Exception as e:  # noqa: BLE001
+                print(f"Error analyzing transcript: {e}")
+
+            done += 1
+            if done % 25 == 0 or done == total:
+                print(f"  Analyzed {done}/{total} calls")
+
+        await asyncio.gather(
+            *(analyze_one(key, *item) for key, item in to_analyze.items())
+        )
+
+        return [
+            {**analyses[key], **call_counts, "call_id": call_id}
+            for key, call_counts, (call_id, _, _) in zip(keys, counts, transcripts)
+            if key in analyses
+        ]
+
+    async def batch_analyze_offline(
+        self,
+        transcripts: list[tuple[str, str, str]],
+        backend: Optional[BatchJobBackend] = None,
+        poll_interval: Optional[float] = None,
     ) -> list[dict]:
         """
-        Analyze multiple transcripts sequentially.
+        Analyze transcripts through a provider batch job instead of live calls.
+
+        Trades latency (results can take hours) for throughput and the
+        discounted batch price. Meant for large backfills. Cached
+        transcripts are not resubmitted.
 
         Args:
             transcripts: List of (call_id, transcript, outcome) tuples.
+            backend: Batch job backend (defaults to the Anthropic batch API).
+            poll_interval: Seconds between status polls (defaults to settings).
 
         Returns:
-            List of analysis results, each with a 'call_id' key added.
+            List of analysis results in input order, each with a 'call_id' key
+            added. Calls whose batch request failed are left out.
         """
-        results = []
+        backend = backend or AnthropicBatchBackend()
+
+        counts = [extract_call_counts(t) for _, t, _ in transcripts]
+        transcripts = self._prepare_many(transcripts)
+        keys = [self.cache_key(t, o) for _, t, o in transcripts]
+        analyses = await self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # One request per distinct uncached transcript; the cache key is a valid custom_id
+        requests = {}
+        for key, (_, transcript, outcome) in zip(keys, transcripts):
+            if key in analyses or key in requests:
+                continue
+            requests[key] = {
+                "custom_id": key.rsplit(":", 1)[1][:64],
+                "params": {
+                    "model": self.model,
+                    "max_tokens": ANALYSIS_MAX_TOKENS,
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": self.build_analysis_prompt(transcript, outcome),
+                        },
+                    ],
+                },
+            }
+
+        texts = {}
+        if requests:
+            texts = await run_batch_job(
+                backend, list(requests.values()), poll_interval=poll_interval
+            )
+
+        fresh = {}
+        for key, request in requests.items():
+            text = texts.get(request["custom_id"])
+            try:
+                if text is None:
+                    raise ValueError("no result returned")
+                fresh[key] = self.parse_analysis(text)
+            except Exception as e:  # noqa: BLE001
+                print(f"Error analyzing transcript {request['custom_id']} in batch: {e}")
 
-        for call_id, transcript, outcome in transcripts:
-            print(f"  Analyzing call {call_id}...")
-            analysis = await self.analyze_transcript(transcript, outcome)
-            analysis["call_id"] = call_id
-            results.append(analysis)
+        await self.cache.set_many(fresh)
+        analyses.update(fresh)
 
-        return results
+        return [
+            {**analyses[key], **call_counts, "call_id": call_id}
+            for key, call_counts, (call_id, _, _) in zip(keys, counts, transcripts)
+            if key in analyses
+        ]
@@ -0,0 +1,161 @@
+"""
+Offline batch jobs for Claude requests.
+
+Large backfills don't need interactive latency, so requests are
+serialized into one provider batch job, polled until it ends, and the
+results mapped back by ``custom_id``.
+
+The job lifecycle sits behind BatchJobBackend so a local stand-in can
+replace the Anthropic Message Batches API (e.g. in tests), or the HTTP
+backend can be pointed at a local server via ``claude_batch_base_url``.
+"""
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.config import get_settings
+
+# Anthropic accepts up to 100k requests per batch; stay well under the 256MB body cap
+MAX_REQUESTS_PER_BATCH = 10000
+
+
+class BatchJobBackend(ABC):
+    """Submit / poll / fetch-results interface for provider batch jobs."""
+
+    @abstractmethod
+    async def submit(self, requests: list[dict]) -> str:
+        """
+        Submit a batch job.
+
+        Args:
+            requests: List of {"custom_id": str, "params": <messages.create kwargs>}.
+
+        Returns:
+            Provider batch ID.
+        """
+
+    @abstractmethod
+    async def is_finished(self, batch_id: str) -> bool:
+        """True once the batch has stopped processing (ended or canceled)."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> AsyncIterator[tuple[str, Optional[str]]]:
+        """
+        Stream (custom_id, response_text) pairs for a finished batch.
+
+        response_text is None for requests that errored or expired.
+        """
+
+
+class AnthropicBatchBackend(BatchJobBackend):
+    """Anthropic Message Batches API over HTTP."""
+
+    API_VERSION = "2023-06-01"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+    ):
+        settings = get_settings()
+        self.base_url = (base_url or settings.claude_batch_base_url).rstrip("/")
+        self.headers = {
+            "x-api-key": api_key or settings.claude_api_key,
+            "anthropic-version": self.API_VERSION,
+            "content-type": "application/json",
+        }
+
+    async def submit(self, requests: list[dict]) -> str:
+        async with httpx.AsyncClient(timeout=120) as client:
+            response = await client.post(
+                f"{self.base_url}/v1/messages/batches",
+                headers=self.headers,
+                json={"requests": requests},
+            )
+            response.raise_for_status()
+            return response.json()["id"]
+
+    async def is_finished(self, batch_id: str) -> bool:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(
+                f"{self.base_url}/v1/messages/batches/{batch_id}",
+                headers=self.headers,
+            )
+            response.raise_for_status()
+            return response.json()["processing_status"] == "ended"
+
+    async def results(self, batch_id: str) -> AsyncIterator[tuple[str, Optional[str]]]:
+        async with httpx.AsyncClient(timeout=None) as client:
+            async with client.stream(
+                "GET",
+                f"{self.base_url}/v1/messages/batches/{batch_id}/results",
+                headers=self.headers,
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    result = item.get("result", {})
+                    if result.get("type") != "succeeded":
+                        yield item["custom_id"], None
+                        continue
+                    content = result["message"].get("content") or [{}]
+                    yield item["custom_id"], content[0].get("text")
+
+
+async def run_batch_job(
+    backend: BatchJobBackend,
+    requests: list[dict],
+    poll_interval: Optional[float] = None,
+    timeout: Optional[float] = None,
+) -> dict[str, Optional[str]]:
+    """
+    Run requests through batch jobs and collect the response texts.
+
+    Requests are split into jobs of MAX_REQUESTS_PER_BATCH, submitted
+    together, then polled until every job ends.
+
+    Returns:
+        Mapping of custom_id -> response text (None if that request failed).
+    """
+    settings = get_settings()
+    poll_interval = settings.claude_batch_poll_seconds if poll_interval is None else poll_interval
+    timeout = settings.claude_batch_timeout_seconds if timeout is None else timeout
+
+    batch_ids = []
+    for start in range(0, len(requests), MAX_REQUESTS_PER_BATCH):
+        chunk = requests[start:start + MAX_REQUESTS_PER_BATCH]
+        batch_id = await backend.submit(chunk)
+        print(f"  Submitted batch {batch_id} ({len(chunk)} requests)")
+        batch_ids.append(batch_id)
+
+    texts: dict[str, Optional[str]] = {}
+    deadline = time.monotonic() + timeout
+    pending = list(batch_ids)
+
+    while pending:
+        still_running = []
+        for batch_id in pending:
+            if not await backend.is_finished(batch_id):
+                still_running.append(batch_id)
+                continue
+
+            async for custom_id, text in backend.results(batch_id):
+                texts[custom_id] = text
+            print(f"  Batch {batch_id} finished")
+
+        pending = still_running
+        if not pending:
+            break
+        if time.monotonic() > deadline:
+            print(f"  Timed out waiting for batches: {pending}")
+            break
+        await asyncio.sleep(poll_interval)
+
+    return texts
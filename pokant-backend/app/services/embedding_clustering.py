@@ -0,0 +1,471 @@
+"""
+Cluster call failures by transcript embedding.
+
+The LLM's failure_pattern label only has a handful of values and most
+real failures end up as "other". EmbeddingClusterer groups failed calls
+by their stored ``call_attributes.embedding`` instead, so failures that
+read alike land together whatever their label.
+
+Embeddings are streamed from Postgres in chunks and never held in memory
+all at once:
+
+1. a reservoir sample is drawn while counting the rows (one vectorized
+   update per chunk);
+2. the cluster count is picked on the sample (MiniBatchKMeans for each
+   candidate k, best sampled silhouette score);
+3. the centroids are refined over every row with partial_fit;
+4. every row is assigned to its nearest centroid, accumulating cluster
+   sizes, averages and the calls closest to each centroid.
+
+Vectors are L2-normalized, so euclidean k-means approximates cosine
+clustering. A 1536-d float32 chunk of 5,000 rows is ~30 MB, which keeps
+hundreds of thousands of vectors workable on one CPU box. The output
+matches PatternClusterer.identify_patterns, so save_patterns is reused.
+
+Incrementally, the first run for a customer clusters everything and
+stores each cluster's centroid on its pattern ("cluster:<n>" keys);
+failures it moves out of label patterns are taken out of those
+patterns' counts. Later runs only assign new embedded failures to the
+nearest stored centroid.
+"""
+
+import heapq
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterator, Optional
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+from sklearn.metrics import silhouette_score
+from sqlalchemy import and_, func, update
+
+from app.models import Call, CallAttribute, Pattern
+from app.services.pattern_clustering import (
+    EXAMPLE_CALLS_PER_PATTERN,
+    PatternClusterer,
+)
+from app.services.similarity_search import count_embedded_calls
+
+# Speaker labels and fillers say nothing about a cluster
+KEYWORD_STOP_WORDS = list(
+    ENGLISH_STOP_WORDS | {"bot", "customer", "agent", "assistant", "user", "okay", "yeah", "yes", "thanks"}
+)
+
+
+@dataclass
+class EmbeddingChunk:
+    """One page of a customer's embedded failures."""
+
+    attribute_ids: list[uuid.UUID]
+    call_created_at: list
+    call_ids: list[uuid.UUID]
+    pattern_ids: list[Optional[uuid.UUID]]
+    failure_patterns: list[str]
+    accent_strength: np.ndarray
+    correction_attempts: np.ndarray
+    vectors: np.ndarray
+
+
+@dataclass
+class ClusterStats:
+    """Running totals for one cluster during the assignment pass."""
+
+    size: int = 0
+    accent_total: float = 0.0
+    corrections_total: float = 0.0
+    labels: Counter = field(default_factory=Counter)
+    # Max-heap (by negated distance) of the calls closest to the centroid
+    nearest: list = field(default_factory=list)
+
+    def add_nearest(self, distance: float, call_id: uuid.UUID, keep: int) -> None:
+        item = (-distance, call_id)
+        if len(self.nearest) < keep:
+            heapq.heappush(self.nearest, item)
+        elif item > self.nearest[0]:
+            heapq.heapreplace(self.nearest, item)
+
+    def nearest_call_ids(self) -> list[uuid.UUID]:
+        return [call_id for _, call_id in sorted(self.nearest, reverse=True)]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def choose_cluster_count(
+    sample: np.ndarray,
+    min_clusters: int = 2,
+    max_clusters: int = 12,
+    silhouette_sample_size: int = 2000,
+    random_state: int = 0,
+) -> MiniBatchKMeans:
+    """
+    Fit MiniBatchKMeans on ``sample`` for each candidate k and keep the best.
+
+    Returns:
+        The fitted model with the highest (sampled) silhouette score.
+    """
+    max_clusters = min(max_clusters, len(sample) - 1)
+    best_model, best_score = None, -1.0
+
+    for k in range(min_clusters, max_clusters + 1):
+        model = MiniBatchKMeans(
+            n_clusters=k,
+            batch_size=1024,
+            n_init=3,
+            random_state=random_state,
+        ).fit(sample)
+        if len(set(model.labels_)) < 2:
+            continue
+        score = silhouette_score(
+            sample,
+            model.labels_,
+            sample_size=min(silhouette_sample_size, len(sample)),
+            random_state=random_state,
+        )
+        if score > best_score:
+            best_model, best_score = model, score
+
+    return best_model
+
+
+class EmbeddingClusterer(PatternClusterer):
+    key_prefix = "cluster"
+
+    def __init__(
+        self,
+        db,
+        chunk_size: int = 5000,
+        sample_size: int = 20000,
+        min_clusters: int = 2,
+        max_clusters: int = 12,
+        min_calls: int = 50,
+        random_state: int = 0,
+    ):
+        super().__init__(db)
+        self.chunk_size = chunk_size
+        self.sample_size = sample_size
+        self.min_clusters = min_clusters
+        self.max_clusters = max_clusters
+        self.min_calls = min_calls
+        self.random_state = random_state
+
+    def identify_patterns(self, customer_id: str) -> list[dict]:
+        """
+        Cluster all of a customer's embedded failures, largest cluster first.
+
+        Falls back to grouping by failure_pattern label when the customer
+        has fewer than ``min_calls`` embedded failures.
+
+        Args:
+            customer_id: Customer UUID string.
+
+        Returns:
+            List of pattern dicts with stats and examples.
+        """
+        customer_uuid = uuid.UUID(customer_id)
+
+        # Pass 1: count rows and draw a uniform sample
+        total, sample = self._sample(customer_uuid)
+        if total < self.min_calls:
+            print(f"  Only {total} embedded failures; clustering by failure label")
+            return super().identify_patterns(customer_id)
+
+        model = choose_cluster_count(
+            sample,
+            min_clusters=self.min_clusters,
+            max_clusters=self.max_clusters,
+            random_state=self.random_state,
+        )
+        if model is None:
+            return super().identify_patterns(customer_id)
+        print(f"  Clustering {total} embedded failures into {model.n_clusters} clusters")
+
+        # Pass 2: refine the sample centroids over every row
+        if total > len(sample):
+            refined = MiniBatchKMeans(
+                n_clusters=model.n_clusters,
+                init=model.cluster_centers_,
+                n_init=1,
+                # Chunks aren't shuffled: a centroid missing from one chunk
+                # must not be moved onto another cluster's points
+                reassignment_ratio=0,
+                random_state=self.random_state,
+            )
+            for chunk in self._iter_chunks(customer_uuid):
+                refined.partial_fit(chunk.vectors)
+            centers = refined.cluster_centers_
+        else:
+            centers = model.cluster_centers_
+
+        # Pass 3: assign and accumulate
+        clusters = self._assign(customer_uuid, centers)
+
+        top = sorted(clusters.items(), key=lambda item: item[1].size, reverse=True)
+        examples = self._example_transcripts(
+            customer_uuid,
+            [call_id for _, stats in top for call_id in stats.nearest_call_ids()],
+        )
+        keywords = self._cluster_keywords(
+            [
+                " ".join(examples.get(call_id, "") for call_id in stats.nearest_call_ids())
+                for _, stats in top
+            ]
+        )
+
+        results = []
+        for (label, stats), terms in zip(top, keywords):
+            failure_pattern = stats.labels.most_common(1)[0][0]
+            call_ids = stats.nearest_call_ids()
+            name = self._format_pattern_name(failure_pattern)
+            if terms:
+                name = f"{name}: {', '.join(terms)}"
+
+            results.append({
+                "cluster_key": f"cluster:{label}",
+                "centroid": centers[label].tolist(),
+                "name": name[:255],
+                "failure_pattern": failure_pattern,
+                "frequency": stats.size,
+                "percentage": (stats.size / total) * 100,
+                "revenue_impact_monthly": stats.size * 20,
+                "example_transcript": examples.get(call_ids[0], "")[:500],
+                "avg_accent_strength": round(stats.accent_total / stats.size, 1),
+                "avg_correction_attempts": round(stats.corrections_total / stats.size, 1),
+                "call_ids": [str(call_id) for call_id in call_ids],
+            })
+
+        return results
+
+    # ── Streaming passes ────────────────────────────────────────────
+
+    def _iter_chunks(
+        self,
+        customer_uuid: uuid.UUID,
+        unassigned_only: bool = False,
+    ) -> Iterator[EmbeddingChunk]:
+        """
+        Stream the customer's embedded failures in chunks of ``chunk_size``.
+
+        One query read through a server-side cursor (yield_per), so each
+        pass is a single scan and only one chunk is in memory at a time.
+        """
+        query = (
+            self.db.query(
+                CallAttribute.id,
+                CallAttribute.call_created_at,
+                CallAttribute.call_id,
+                CallAttribute.pattern_id,
+                CallAttribute.failure_pattern,
+                CallAttribute.accent_strength,
+                CallAttribute.correction_attempts,
+                CallAttribute.embedding,
+            )
+            .join(
+                Call,
+                and_(
+                    Call.id == CallAttribute.call_id,
+                    Call.created_at == CallAttribute.call_created_at,
+                ),
+            )
+            .filter(CallAttribute.customer_id == customer_uuid)
+            .filter(CallAttribute.embedding.isnot(None))
+            .filter(Call.outcome == "failed")
+        )
+        if unassigned_only:
+            query = query.filter(CallAttribute.pattern_id.is_(None))
+
+        stream = iter(query.order_by(CallAttribute.id).yield_per(self.chunk_size))
+        while rows := list(islice(stream, self.chunk_size)):
+            yield EmbeddingChunk(
+                attribute_ids=[row.id for row in rows],
+                call_created_at=[row.call_created_at for row in rows],
+                call_ids=[row.call_id for row in rows],
+                pattern_ids=[row.pattern_id for row in rows],
+                failure_patterns=[row.failure_pattern or "other" for row in rows],
+                accent_strength=np.array([row.accent_strength or 0 for row in rows], dtype=np.float64),
+                correction_attempts=np.array([row.correction_attempts or 0 for row in rows], dtype=np.float64),
+                vectors=normalize(np.asarray([row.embedding for row in rows], dtype=np.float32)),
+            )
+
+    def _sample(self, customer_uuid: uuid.UUID) -> tuple[int, np.ndarray]:
+        """
+        Row count and a uniform reservoir sample of up to ``sample_size`` vectors.
+
+        Once the reservoir is full, a chunk of n rows contributes a
+        hypergeometric number m of rows to a uniform sample of everything
+        seen so far; m rows picked with ``choice`` over the chunk replace
+        m slots picked the same way, with no per-row Python loop.
+        """
+        rng = np.random.default_rng(self.random_state)
+        reservoir: Optional[np.ndarray] = None
+        seen = 0
+
+        for chunk in self._iter_chunks(customer_uuid):
+            vectors = chunk.vectors
+            if reservoir is None:
+                reservoir = np.empty((self.sample_size, vectors.shape[1]), dtype=np.float32)
+
+            # Fill the reservoir first
+            fill = min(len(vectors), max(self.sample_size - seen, 0))
+            reservoir[seen:seen + fill] = vectors[:fill]
+            seen += fill
+
+            rest = vectors[fill:]
+            if len(rest):
+                taken = rng.hypergeometric(len(rest), seen, self.sample_size)
+                if taken:
+                    slots = rng.choice(self.sample_size, size=taken, replace=False)
+                    reservoir[slots] = rest[rng.choice(len(rest), size=taken, replace=False)]
+                seen += len(rest)
+
+        if reservoir is None:
+            return 0, np.empty((0, 0), dtype=np.float32)
+        return seen, reservoir[:min(seen, self.sample_size)]
+
+    def _assign(self, customer_uuid: uuid.UUID, centers: np.ndarray) -> dict[int, ClusterStats]:
+        """Assign every row to its nearest centroid and accumulate per-cluster stats."""
+        clusters: dict[int, ClusterStats] = {}
+
+        for chunk in self._iter_chunks(customer_uuid):
+            # |x - c|^2 = |x|^2 - 2 x.c + |c|^2 with |x| = 1
+            distances = 1.0 - 2.0 * chunk.vectors @ centers.T + (centers ** 2).sum(axis=1)
+            labels = distances.argmin(axis=1)
+            nearest = distances[np.arange(len(labels)), labels]
+
+            for label in np.unique(labels):
+                members = np.flatnonzero(labels == label)
+                stats = clusters.setdefault(int(label), ClusterStats())
+                stats.size += len(members)
+                stats.accent_total += float(chunk.accent_strength[members].sum())
+                stats.corrections_total += float(chunk.correction_attempts[members].sum())
+                stats.labels.update(chunk.failure_patterns[i] for i in members)
+
+                closest = members[np.argsort(nearest[members])[:EXAMPLE_CALLS_PER_PATTERN]]
+                for i in closest:
+                    stats.add_nearest(float(nearest[i]), chunk.call_ids[i], EXAMPLE_CALLS_PER_PATTERN)
+
+        return clusters
+
+    # ── Incremental maintenance ─────────────────────────────────────
+
+    def _assign_new_calls(self, customer_uuid: uuid.UUID) -> Iterator[tuple[uuid.UUID, uuid.UUID]]:
+        """
+        Assign unassigned embedded failures to the nearest stored centroid.
+
+        The first run for a customer clusters everything, saves the
+        clusters with their full stats and assigns every failure without
+        yielding it again (it is already counted); the patterns those
+        failures were counted in before lose them. Customers with too few
+        embedded failures are grouped by label until they have enough.
+
+        Yields:
+            (pattern_id, call_id) for each newly counted failure.
+        """
+        centroids = self._load_centroids(customer_uuid)
+
+        if not centroids:
+            if count_embedded_calls(self.db, customer_uuid, self.min_calls) < self.min_calls:
+                yield from super()._assign_new_calls(customer_uuid)
+                return
+
+            patterns = [p for p in self.identify_patterns(str(customer_uuid)) if p.get("centroid")]
+            if not patterns:
+                yield from super()._assign_new_calls(customer_uuid)
+                return
+            self.save_patterns(str(customer_uuid), patterns)
+            centroids = self._load_centroids(customer_uuid)
+            # Failures leaving label patterns must stop counting there
+            moved: Counter = Counter()
+            for _ in self._assign_to_centroids(
+                customer_uuid, centroids, unassigned_only=False, moved=moved
+            ):
+                pass
+            self._remove_members(customer_uuid, moved)
+            return
+
+        yield from self._assign_to_centroids(customer_uuid, centroids, unassigned_only=True)
+
+    def _load_centroids(self, customer_uuid: uuid.UUID) -> Optional[tuple[list[uuid.UUID], np.ndarray]]:
+        rows = (
+            self.db.query(Pattern.id, Pattern.centroid)
+            .filter(Pattern.customer_id == customer_uuid)
+            .filter(Pattern.cluster_key.like("cluster:%"))
+            .filter(Pattern.centroid.isnot(None))
+            .all()
+        )
+        if not rows:
+            return None
+        return [row.id for row in rows], np.asarray([row.centroid for row in rows], dtype=np.float32)
+
+    def _assign_to_centroids(
+        self,
+        customer_uuid: uuid.UUID,
+        centroids: tuple[list[uuid.UUID], np.ndarray],
+        unassigned_only: bool,
+        moved: Optional[Counter] = None,
+    ) -> Iterator[tuple[uuid.UUID, uuid.UUID]]:
+        """
+        Assign failures to their nearest centroid.
+
+        With ``moved``, counts how many failures leave each pattern they
+        were previously assigned to (other than these centroids').
+        """
+        pattern_ids, centers = centroids
+        own = set(pattern_ids)
+        for chunk in self._iter_chunks(customer_uuid, unassigned_only=unassigned_only):
+            if moved is not None:
+                moved.update(p for p in chunk.pattern_ids if p is not None and p not in own)
+
+            distances = -2.0 * chunk.vectors @ centers.T + (centers ** 2).sum(axis=1)
+            nearest = [pattern_ids[i] for i in distances.argmin(axis=1)]
+
+            self.db.execute(
+                update(CallAttribute),
+                [
+                    {"id": attribute_id, "call_created_at": created_at, "pattern_id": pattern_id}
+                    for attribute_id, created_at, pattern_id in zip(
+                        chunk.attribute_ids, chunk.call_created_at, nearest
+                    )
+                ],
+            )
+            yield from zip(nearest, chunk.call_ids)
+
+    # ── Examples and naming ─────────────────────────────────────────
+
+    def _example_transcripts(
+        self,
+        customer_uuid: uuid.UUID,
+        call_ids: list[uuid.UUID],
+    ) -> dict[uuid.UUID, str]:
+        if not call_ids:
+            return {}
+        rows = (
+            self.db.query(Call.id, func.left(Call.transcript, 2000))
+            .filter(Call.customer_id == customer_uuid)
+            .filter(Call.id.in_(call_ids))
+            .all()
+        )
+        return {call_id: transcript or "" for call_id, transcript in rows}
+
+    def _cluster_keywords(self, documents: list[str], count: int = 3) -> list[list[str]]:
+        """Most distinctive terms of each cluster's example transcripts (TF-IDF across clusters)."""
+        if len(documents) < 2 or not any(documents):
+            return [[] for _ in documents]
+
+        vectorizer = TfidfVectorizer(stop_words=KEYWORD_STOP_WORDS, token_pattern=r"(?u)\b[a-zA-Z]{3,}\b")
+        try:
+            matrix = vectorizer.fit_transform(documents).toarray()
+        except ValueError:
+            # Nothing left after stop words
+            return [[] for _ in documents]
+
+        terms = vectorizer.get_feature_names_out()
+        keywords = []
+        for row in matrix:
+            top = [i for i in np.argsort(row)[::-1][:count] if row[i] > 0]
+            keywords.append([terms[i] for i in top])
+        return keywords
@@ -0,0 +1,129 @@
+"""
+Near-duplicate transcript detection with MinHash and LSH.
+
+Voice bot failures repeat the same scripted exchange over and over, so
+many pending transcripts differ only in a name, a time or a filler word.
+NearDuplicateIndex collapses them: each transcript is reduced to a
+MinHash signature of its word shingles, candidate matches are found by
+banded LSH, and a transcript joins the most similar representative
+whose estimated Jaccard similarity reaches the threshold. Only representatives
+are sent for analysis; the analysis pipeline fans their attributes out
+to the members.
+
+Members are compared with representatives, never with other members, so
+groups can't drift by chaining small differences.
+"""
+
+import re
+import zlib
+from typing import Optional
+
+import numpy as np
+
+# Largest prime below 2**32: (a * h + b) stays below 2**64 for 32-bit a and h
+MERSENNE_PRIME = np.uint64(4294967291)
+
+TOKEN_RE = re.compile(r"[a-z']+|\d+")
+
+
+def shingles(text: str, size: int = 4) -> set[str]:
+    """Word ``size``-grams of the lowercased text, with every number replaced by '0'."""
+    tokens = ["0" if token.isdigit() else token for token in TOKEN_RE.findall(text.lower())]
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def lsh_bands(num_perm: int, threshold: float) -> tuple[int, int]:
+    """
+    (bands, rows per band) whose LSH threshold (1/b)^(1/r) is closest to,
+    without exceeding, ``threshold``. Erring low keeps false negatives
+    rare; false positives are filtered by the signature comparison.
+    """
+    best = (num_perm, 1)
+    best_gap = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        curve_threshold = (1 / bands) ** (1 / rows)
+        gap = threshold - curve_threshold
+        if 0 <= gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class NearDuplicateIndex:
+    """Incremental MinHash/LSH index of representative transcripts."""
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        shingle_size: int = 4,
+        seed: int = 0,
+    ):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self.num_perm = self.bands * self.rows
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, size=self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=self.num_perm, dtype=np.uint64)
+
+        self._signatures: dict[str, np.ndarray] = {}
+        self._buckets: dict[tuple[int, bytes], list[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingles(text, self.shingle_size)),
+            dtype=np.uint64,
+        )
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> list[tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def find(self, signature: np.ndarray) -> Optional[str]:
+        """Most similar representative at or above the threshold, if any."""
+        candidates = {
+            key
+            for band_key in self._band_keys(signature)
+            for key in self._buckets.get(band_key, ())
+        }
+        best, best_similarity = None, self.threshold
+        for key in candidates:
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = key, similarity
+        return best
+
+    def add(self, key: str, signature: np.ndarray) -> None:
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, []).append(key)
+
+    def assign(self, items: list[tuple[str, str]]) -> list[str]:
+        """
+        Map each (key, text) to its representative's key.
+
+        Items with no near duplicate among the indexed representatives
+        become representatives themselves (mapped to their own key).
+        """
+        representatives = []
+        for key, text in items:
+            signature = self.signature(text)
+            representative = self.find(signature)
+            if representative is None:
+                self.add(key, signature)
+                representative = key
+            representatives.append(representative)
+        return representatives
@@ -3,18 +3,39 @@ Cluster similar call failures into patterns.
 
 Groups failed calls by their failure_pattern attribute,
 calculates statistics, and stores patterns in the database.
+
+Patterns are maintained incrementally: every pattern has a stable
+``cluster_key`` (unique per customer), each analyzed failure records the
+pattern it was counted into (``call_attributes.pattern_id``), and
+update_patterns only looks at failures that have no pattern yet. Their
+counts are added to the existing pattern rows, so a run costs in
+proportion to the new calls rather than the customer's whole history.
+identify_patterns + save_patterns remain for a full recompute and upsert
+by cluster_key instead of inserting duplicates.
 """
 
 import uuid
-from collections import Counter
-from typing import Optional
+from datetime import datetime
+from typing import Iterator, Optional
 
+from sqlalchemy import and_, func, literal, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from app.models import Call, CallAttribute, Pattern
 
+TOP_PATTERNS = 5
+EXAMPLE_CALLS_PER_PATTERN = 10
+
+
+def key_prefix(cluster_key: str) -> str:
+    return cluster_key.split(":", 1)[0]
+
 
 class PatternClusterer:
+    # cluster_key namespace of the patterns this clusterer maintains
+    key_prefix = "label"
+
     def __init__(self, db: Session):
         self.db = db
 
@@ -22,66 +43,101 @@ class PatternClusterer:
         """
         Identify top failure patterns for a customer.
 
+        Counting and averaging run in Postgres; only the top patterns,
+        their example call ids and one truncated transcript per pattern
+        come back to Python.
+
         Args:
             customer_id: Customer UUID string.
 
         Returns:
             List of pattern dicts with stats and examples.
         """
-        # Get all failed calls with attributes
-        failed_calls = (
-            self.db.query(Call, CallAttribute)
-            .join(CallAttribute, Call.id == CallAttribute.call_id)
-            .filter(Call.customer_id == uuid.UUID(customer_id))
-            .filter(Call.outcome == "failed")
+        customer_uuid = uuid.UUID(customer_id)
+        pattern = func.coalesce(CallAttribute.failure_pattern, "other")
+
+        def failed_attributes(*columns):
+            return (
+                self.db.query(*columns)
+                .join(
+                    Call,
+                    and_(
+                        Call.id == CallAttribute.call_id,
+                        Call.created_at == CallAttribute.call_created_at,
+                    ),
+                )
+                .filter(CallAttribute.customer_id == customer_uuid)
+                .filter(Call.outcome == "failed")
+            )
+
+        # Per-pattern stats; the window total is computed before LIMIT
+        frequency = func.count()
+        stats = (
+            failed_attributes(
+                pattern.label("pattern"),
+                frequency.label("frequency"),
+                func.sum(frequency).over().label("total"),
+                func.avg(func.coalesce(CallAttribute.accent_strength, 0)).label("avg_accent"),
+                func.avg(func.coalesce(CallAttribute.correction_attempts, 0)).label("avg_corrections"),
+            )
+            .group_by(pattern)
+            .order_by(frequency.desc(), pattern)
+            .limit(TOP_PATTERNS)
             .all()
         )
 
-        if not failed_calls:
+        if not stats:
             return []
 
-        # Count failure patterns
-        pattern_counts: Counter = Counter()
-        pattern_examples: dict[str, str] = {}
-        pattern_calls: dict[str, list] = {}
-
-        for call, attrs in failed_calls:
-            pattern = attrs.failure_pattern or "other"
-            pattern_counts[pattern] += 1
-
-            if pattern not in pattern_examples:
-                pattern_examples[pattern] = call.transcript or ""
-                pattern_calls[pattern] = []
+        # Most recent example calls of each top pattern
+        ranked = (
+            failed_attributes(
+                CallAttribute.call_id.label("call_id"),
+                pattern.label("pattern"),
+                func.row_number()
+                .over(partition_by=pattern, order_by=CallAttribute.call_created_at.desc())
+                .label("rank"),
+            )
+            .filter(pattern.in_([row.pattern for row in stats]))
+            .subquery()
+        )
+        examples = (
+            self.db.query(ranked.c.pattern, ranked.c.call_id)
+            .filter(ranked.c.rank <= EXAMPLE_CALLS_PER_PATTERN)
+            .order_by(ranked.c.pattern, ranked.c.rank)
+            .all()
+        )
 
-            pattern_calls[pattern].append((call.id, attrs))
+        pattern_calls: dict[str, list[uuid.UUID]] = {}
+        for name, call_id in examples:
+            pattern_calls.setdefault(name, []).append(call_id)
 
-        # Get top 5 patterns
-        top_patterns = pattern_counts.most_common(5)
+        first_call_ids = [ids[0] for ids in pattern_calls.values()]
+        transcripts = dict(
+            self.db.query(Call.id, func.left(Call.transcript, 500))
+            .filter(Call.customer_id == customer_uuid)
+            .filter(Call.id.in_(first_call_ids))
+            .all()
+        )
 
         results = []
-        for pattern_name, frequency in top_patterns:
-            calls_with_pattern = pattern_calls[pattern_name]
-
-            avg_accent = sum(
-                a.accent_strength or 0 for _, a in calls_with_pattern
-            ) / len(calls_with_pattern)
-            avg_corrections = sum(
-                a.correction_attempts or 0 for _, a in calls_with_pattern
-            ) / len(calls_with_pattern)
+        for row in stats:
+            call_ids = pattern_calls.get(row.pattern, [])
 
             # Estimate revenue impact ($20 per failed call)
-            revenue_impact = frequency * 20
+            revenue_impact = row.frequency * 20
 
             results.append({
-                "name": self._format_pattern_name(pattern_name),
-                "failure_pattern": pattern_name,
-                "frequency": frequency,
-                "percentage": (frequency / len(failed_calls)) * 100,
+                "cluster_key": f"label:{row.pattern}",
+                "name": self._format_pattern_name(row.pattern),
+                "failure_pattern": row.pattern,
+                "frequency": row.frequency,
+                "percentage": (row.frequency / int(row.total)) * 100,
                 "revenue_impact_monthly": revenue_impact,
-                "example_transcript": (pattern_examples[pattern_name] or "")[:500],
-                "avg_accent_strength": round(avg_accent, 1),
-                "avg_correction_attempts": round(avg_corrections, 1),
-                "call_ids": [str(call_id) for call_id, _ in calls_with_pattern[:10]],
+                "example_transcript": (transcripts.get(call_ids[0]) if call_ids else None) or "",
+                "avg_accent_strength": round(float(row.avg_accent), 1),
+                "avg_correction_attempts": round(float(row.avg_corrections), 1),
+                "call_ids": [str(call_id) for call_id in call_ids],
             })
 
         return results
@@ -98,33 +154,261 @@ class PatternClusterer:
         """
         Save identified patterns to the database.
 
+        Upserts on (customer_id, cluster_key): re-running a full recompute
+        refreshes the existing rows (keeping their status and fixes)
+        instead of adding duplicates.
+
         Returns:
-            List of created pattern ID strings.
+            List of saved pattern ID strings.
         """
-        pattern_ids = []
-
-        for p in patterns:
-            pattern = Pattern(
-                id=uuid.uuid4(),
-                customer_id=uuid.UUID(customer_id),
-                name=p["name"],
-                description=f"Occurs in {p['percentage']:.1f}% of failed calls",
-                failure_type=p["failure_pattern"],
-                frequency=p["frequency"],
-                severity=self._infer_severity(p["frequency"], p["percentage"]),
-                revenue_impact_monthly=p["revenue_impact_monthly"],
-                example_transcript=p["example_transcript"],
-                example_call_ids=p["call_ids"],
-                root_cause=self._infer_root_cause(p),
-                status="identified",
-            )
+        if not patterns:
+            return []
 
-            self.db.add(pattern)
-            pattern_ids.append(str(pattern.id))
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "customer_id": uuid.UUID(customer_id),
+                "cluster_key": p.get("cluster_key") or f"label:{p['failure_pattern']}",
+                "name": p["name"],
+                "description": f"Occurs in {p['percentage']:.1f}% of failed calls",
+                "failure_type": p["failure_pattern"],
+                "frequency": p["frequency"],
+                "severity": self._infer_severity(p["frequency"], p["percentage"]),
+                "revenue_impact_monthly": p["revenue_impact_monthly"],
+                "example_transcript": p["example_transcript"],
+                "example_call_ids": p["call_ids"],
+                "root_cause": self._infer_root_cause(p),
+                "centroid": p.get("centroid"),
+                "status": "identified",
+                "created_at": now,
+                "updated_at": now,
+            }
+            for p in patterns
+        ]
 
+        stmt = insert(Pattern).values(rows)
+        refreshed = (
+            "name", "description", "failure_type", "frequency", "severity",
+            "revenue_impact_monthly", "example_transcript", "example_call_ids",
+            "root_cause", "centroid", "updated_at",
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_patterns_customer_cluster_key",
+            set_={column: stmt.excluded[column] for column in refreshed},
+        ).returning(Pattern.id)
+
+        pattern_ids = [str(pattern_id) for pattern_id in self.db.execute(stmt).scalars()]
         self.db.commit()
         return pattern_ids
 
+    # ── Incremental maintenance ─────────────────────────────────────
+
+    def update_patterns(self, customer_id: str) -> list[str]:
+        """
+        Count failures that have no pattern yet into the customer's patterns.
+
+        Returns:
+            IDs of the patterns that gained calls.
+        """
+        customer_uuid = uuid.UUID(customer_id)
+
+        members: dict[uuid.UUID, list[uuid.UUID]] = {}
+        for pattern_id, call_id in self._assign_new_calls(customer_uuid):
+            members.setdefault(pattern_id, []).append(call_id)
+
+        if members:
+            self._apply_new_members(customer_uuid, members)
+        self.db.commit()
+
+        new_calls = sum(len(call_ids) for call_ids in members.values())
+        print(f"  Assigned {new_calls} new failures to {len(members)} patterns")
+        return [str(pattern_id) for pattern_id in members]
+
+    def _failed_attributes(self, customer_uuid: uuid.UUID, *columns):
+        return (
+            self.db.query(*columns)
+            .join(
+                Call,
+                and_(
+                    Call.id == CallAttribute.call_id,
+                    Call.created_at == CallAttribute.call_created_at,
+                ),
+            )
+            .filter(CallAttribute.customer_id == customer_uuid)
+            .filter(Call.outcome == "failed")
+        )
+
+    def _has_patterns(self, customer_uuid: uuid.UUID, prefix: str) -> bool:
+        return self.db.query(
+            self.db.query(Pattern.id)
+            .filter(Pattern.customer_id == customer_uuid)
+            .filter(Pattern.cluster_key.like(f"{prefix}:%"))
+            .exists()
+        ).scalar()
+
+    def _ensure_patterns(self, customer_uuid: uuid.UUID, patterns: list[dict]) -> None:
+        """Insert empty pattern rows for keys the customer doesn't have yet."""
+        if not patterns:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "customer_id": customer_uuid,
+                "frequency": 0,
+                "revenue_impact_monthly": 0.0,
+                "example_call_ids": [],
+                "severity": "low",
+                "status": "identified",
+                "created_at": now,
+                "updated_at": now,
+                **p,
+            }
+            for p in patterns
+        ]
+        self.db.execute(
+            insert(Pattern)
+            .values(rows)
+            .on_conflict_do_nothing(constraint="uq_patterns_customer_cluster_key")
+        )
+
+    def _assign_new_calls(self, customer_uuid: uuid.UUID) -> Iterator[tuple[uuid.UUID, uuid.UUID]]:
+        """
+        Assign unassigned failures to their label's pattern.
+
+        On the first run for a customer (no label patterns yet) every
+        failure is (re)assigned, including ones counted by another method;
+        those patterns lose the failures.
+
+        Yields:
+            (pattern_id, call_id) for each newly counted failure.
+        """
+        label = func.coalesce(CallAttribute.failure_pattern, "other")
+        reassign_all = not self._has_patterns(customer_uuid, "label")
+
+        new_labels = self._failed_attributes(customer_uuid, label.distinct())
+        if not reassign_all:
+            new_labels = new_labels.filter(CallAttribute.pattern_id.is_(None))
+        new_labels = [name for (name,) in new_labels.all()]
+        if not new_labels:
+            return
+
+        self._ensure_patterns(
+            customer_uuid,
+            [
+                {
+                    "cluster_key": f"label:{name}",
+                    "name": self._format_pattern_name(name),
+                    "failure_type": name,
+                    "root_cause": self._infer_root_cause({"failure_pattern": name}),
+                }
+                for name in new_labels
+            ],
+        )
+
+        stmt = (
+            update(CallAttribute)
+            .where(CallAttribute.customer_id == customer_uuid)
+            .where(Call.id == CallAttribute.call_id)
+            .where(Call.created_at == CallAttribute.call_created_at)
+            .where(Call.outcome == "failed")
+            .where(Pattern.customer_id == customer_uuid)
+            .where(Pattern.cluster_key == literal("label:") + label)
+            .values(pattern_id=Pattern.id)
+            .returning(CallAttribute.pattern_id, CallAttribute.call_id)
+            .execution_options(synchronize_session=False)
+        )
+        if not reassign_all:
+            stmt = stmt.where(CallAttribute.pattern_id.is_(None))
+
+        moved = {}
+        if reassign_all:
+            # No label patterns yet, so every current assignment is another method's
+            moved = dict(
+                self._failed_attributes(customer_uuid, CallAttribute.pattern_id, func.count())
+                .filter(CallAttribute.pattern_id.isnot(None))
+                .group_by(CallAttribute.pattern_id)
+                .all()
+            )
+
+        for pattern_id, call_id in self.db.execute(stmt):
+            yield pattern_id, call_id
+
+        self._remove_members(customer_uuid, moved)
+
+    def _apply_new_members(
+        self,
+        customer_uuid: uuid.UUID,
+        members: dict[uuid.UUID, list[uuid.UUID]],
+    ) -> None:
+        """Add newly assigned calls to their patterns' stats and examples."""
+        patterns = (
+            self.db.query(Pattern)
+            .filter(Pattern.customer_id == customer_uuid)
+            .filter(Pattern.cluster_key.isnot(None))
+            .all()
+        )
+
+        missing_examples = [
+            members[p.id][0] for p in patterns if p.id in members and not p.example_transcript
+        ]
+        transcripts = {}
+        if missing_examples:
+            transcripts = dict(
+                self.db.query(Call.id, func.left(Call.transcript, 500))
+                .filter(Call.customer_id == customer_uuid)
+                .filter(Call.id.in_(missing_examples))
+                .all()
+            )
+
+        for pattern in patterns:
+            new_calls = members.get(pattern.id)
+            if not new_calls:
+                continue
+            pattern.frequency = (pattern.frequency or 0) + len(new_calls)
+            # Estimate revenue impact ($20 per failed call)
+            pattern.revenue_impact_monthly = pattern.frequency * 20
+            # Newest examples first
+            examples = [str(call_id) for call_id in new_calls] + list(pattern.example_call_ids or [])
+            pattern.example_call_ids = examples[:EXAMPLE_CALLS_PER_PATTERN]
+            if not pattern.example_transcript:
+                pattern.example_transcript = transcripts.get(new_calls[0]) or ""
+
+        self._refresh_shares(patterns)
+
+    def _remove_members(self, customer_uuid: uuid.UUID, removed: dict[uuid.UUID, int]) -> None:
+        """Take calls reassigned to another method's patterns out of their old patterns' stats."""
+        if not removed:
+            return
+        patterns = (
+            self.db.query(Pattern)
+            .filter(Pattern.customer_id == customer_uuid)
+            .filter(Pattern.cluster_key.isnot(None))
+            .all()
+        )
+        for pattern in patterns:
+            if pattern.id in removed:
+                pattern.frequency = max((pattern.frequency or 0) - removed[pattern.id], 0)
+                pattern.revenue_impact_monthly = pattern.frequency * 20
+        self._refresh_shares(patterns)
+
+    def _refresh_shares(self, patterns: list[Pattern]) -> None:
+        """Recompute each pattern's share and severity within its method's patterns."""
+        # Shares are relative to the patterns of the same method
+        totals: dict[str, int] = {}
+        for pattern in patterns:
+            prefix = key_prefix(pattern.cluster_key)
+            totals[prefix] = totals.get(prefix, 0) + (pattern.frequency or 0)
+
+        for pattern in patterns:
+            total = totals[key_prefix(pattern.cluster_key)]
+            if not total:
+                continue
+            percentage = (pattern.frequency or 0) / total * 100
+            pattern.description = f"Occurs in {percentage:.1f}% of failed calls"
+            pattern.severity = self._infer_severity(pattern.frequency or 0, percentage)
+
     def _infer_severity(self, frequency: int, percentage: float) -> str:
         """Infer severity from frequency and percentage."""
         if percentage >= 30 or frequency >= 50:
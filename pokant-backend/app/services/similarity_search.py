@@ -0,0 +1,89 @@
+"""
+Tenant-scoped nearest-neighbour search over call embeddings.
+
+The ANN index covers every tenant, so filtering an ANN scan by customer
+either returns too few rows (neighbours from other tenants are dropped
+after the scan) or makes Postgres give up on the index. Searches are
+therefore routed by tenant size:
+
+- small tenants (up to ``vector_exact_search_max_rows`` embedded calls)
+  get an exact scan of their own rows through the
+  ``call_attributes.customer_id`` index, which is fast and has perfect
+  recall at that size;
+- larger tenants use the ANN index with pgvector's iterative index scans
+  (pgvector >= 0.8), which keep scanning until ``limit`` rows pass the
+  customer filter.
+
+Either way the cost depends on the tenant's own data, not on how many
+other tenants share the table.
+"""
+
+import uuid
+
+from sqlalchemy import and_, literal
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.models import Call, CallAttribute
+from app.utils.vector_index import apply_search_settings
+
+
+def count_embedded_calls(db: Session, customer_id: uuid.UUID, cap: int) -> int:
+    """Count the customer's embedded calls, stopping at ``cap`` + 1."""
+    capped = (
+        db.query(CallAttribute.id)
+        .filter(CallAttribute.customer_id == customer_id)
+        .filter(CallAttribute.embedding.isnot(None))
+        .limit(cap + 1)
+        .subquery()
+    )
+    return db.query(capped).count()
+
+
+def find_similar_failed_calls(
+    db: Session,
+    customer_id: uuid.UUID,
+    embedding: list[float],
+    limit: int = 100,
+) -> list[tuple[Call, CallAttribute]]:
+    """
+    Return the customer's failed calls closest to ``embedding`` (cosine).
+
+    Returns:
+        (Call, CallAttribute) pairs, nearest first.
+    """
+    settings = get_settings()
+    distance = CallAttribute.embedding.cosine_distance(embedding)
+
+    exact = (
+        count_embedded_calls(db, customer_id, settings.vector_exact_search_max_rows)
+        <= settings.vector_exact_search_max_rows
+    )
+    if exact:
+        # "+ 0" hides the ORDER BY from the ANN index, so Postgres filters by
+        # customer first and sorts only that tenant's rows
+        order_by = distance + literal(0.0)
+    else:
+        apply_search_settings(db, limit, iterative=True)
+        order_by = distance
+
+    rows = (
+        db.query(Call, CallAttribute, distance.label("distance"))
+        .join(
+            CallAttribute,
+            and_(
+                Call.id == CallAttribute.call_id,
+                Call.created_at == CallAttribute.call_created_at,
+            ),
+        )
+        .filter(CallAttribute.customer_id == customer_id)
+        .filter(CallAttribute.embedding.isnot(None))
+        .filter(Call.outcome == "failed")
+        .order_by(order_by)
+        .limit(limit)
+        .all()
+    )
+
+    # Relaxed-order iterative scans may return rows slightly out of order
+    rows.sort(key=lambda row: row.distance)
+    return [(call, attrs) for call, attrs, _ in rows]
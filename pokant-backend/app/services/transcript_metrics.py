@@ -0,0 +1,73 @@
+"""
+Deterministic extraction of the countable call attributes.
+
+Disfluencies, clarification requests, interruptions and correction
+attempts are counted directly from the transcript turns with regexes,
+so the LLM prompt only has to ask for the semantic attributes.
+"""
+
+import re
+
+from app.services.transcript_preprocessor import BOT, CUSTOMER, FILLER_RE, parse_turns
+
+LOCAL_FIELDS = (
+    "disfluency_count",
+    "clarification_requests",
+    "bot_interruptions",
+    "customer_interruptions",
+    "correction_attempts",
+)
+
+# Word restarts ("I- I want", "the the"); trailing off ("so...") is not a disfluency
+RESTART_RE = re.compile(r"\b(\w+)(?:-|\s*[—–]|,)?\s+\1\b|\b\w+-\s", re.IGNORECASE)
+
+CLARIFICATION_RE = re.compile(
+    r"\b(?:could you repeat|can you repeat|repeat that|say that again|come again"
+    r"|did you (?:mean|say)|do you mean|you mean|can you clarify|could you clarify"
+    r"|what do you mean|which one|sorry,? what|i didn'?t (?:catch|get) that"
+    r"|i'?m not sure i understand|what was that)\b|^(?:what|sorry|pardon|huh)\?",
+    re.IGNORECASE,
+)
+
+CORRECTION_RE = re.compile(
+    r"^(?:no|nope|nah)\b|\b(?:actually|i said|i meant|i didn'?t say|that'?s not"
+    r"|that is not|not what i|that'?s wrong|you got it wrong|let me correct|i mean)\b",
+    re.IGNORECASE,
+)
+
+# A turn cut off mid-sentence ("I want to-", "so I was—") before the other party
+# speaks; trailing off with "..." is a pause, not an interruption
+CUT_OFF_RE = re.compile(r"[-—–]$")
+
+
+def extract_call_counts(transcript: str) -> dict:
+    """
+    Count the five numeric call attributes from a raw transcript.
+
+    Returns:
+        Dict with the LOCAL_FIELDS keys.
+    """
+    turns = parse_turns(transcript, strip_fillers=False)
+    counts = dict.fromkeys(LOCAL_FIELDS, 0)
+
+    previous_speaker = None
+    previous_text = ""
+    for speaker, text in turns:
+        if speaker == CUSTOMER:
+            counts["disfluency_count"] += len(FILLER_RE.findall(text)) + len(RESTART_RE.findall(text))
+            if CORRECTION_RE.search(text):
+                counts["correction_attempts"] += 1
+
+        if CLARIFICATION_RE.search(text):
+            counts["clarification_requests"] += 1
+
+        if previous_speaker and speaker != previous_speaker and CUT_OFF_RE.search(previous_text):
+            if speaker == BOT:
+                counts["bot_interruptions"] += 1
+            elif speaker == CUSTOMER:
+                counts["customer_interruptions"] += 1
+
+        previous_speaker = speaker
+        previous_text = text
+
+    return counts
@@ -0,0 +1,214 @@
+"""
+Transcript preprocessing before transcripts are embedded in LLM prompts.
+
+Provider transcripts come with inconsistent speaker labels, tool/system
+lines and timestamps, and long calls can run to tens of thousands of
+tokens. ``prepare_transcript`` turns a raw transcript into compact
+``Bot:``/``Customer:`` turns and, when it is over a token budget, keeps
+the opening, the ending and the turns around failure cues (corrections,
+"what?", requests for a human, ...) with the rest replaced by omission
+markers.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from app.utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+BOT = "Bot"
+CUSTOMER = "Customer"
+
+SPEAKER_LABELS = {
+    "ai": BOT,
+    "assistant": BOT,
+    "bot": BOT,
+    "agent": BOT,
+    "user": CUSTOMER,
+    "customer": CUSTOMER,
+    "caller": CUSTOMER,
+    "human": CUSTOMER,
+}
+NOISE_LABELS = {"system", "tool", "function", "tool_calls", "tool_call_result"}
+
+TURN_RE = re.compile(r"^\s*([A-Za-z_ ]{2,20}?)\s*:\s*(.*)$")
+# Leading "[00:12]" / "00:12:03" stamps and bracketed stamps anywhere (not "at 3:30")
+TIMESTAMP_RE = re.compile(
+    r"^\s*[\[(]?\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?[\])]?\s*"
+    r"|\[\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?\]"
+)
+FILLER_RE = re.compile(r"\b(?:u+m+|u+h+|e+r+m+|h+m+|mhm|uh-huh)\b[,.]?\s*", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Phrases that usually mark the point where a call goes wrong
+FAILURE_CUE_RE = re.compile(
+    r"\b(?:no,|not what i|that's not|that is not|wrong|i said|i meant|actually"
+    r"|what\?|sorry\?|pardon|repeat|say that again|don't understand|didn't understand"
+    r"|confus|frustrat|ridiculous|speak to (?:a |an )?(?:human|person|agent|representative)"
+    r"|real person|never ?mind|forget it|cancel|hang up)",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class PreparedTranscript:
+    """A preprocessed transcript plus token accounting."""
+
+    text: str
+    original_tokens: int
+    tokens: int
+    turns_total: int
+    turns_kept: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+
+def parse_turns(transcript: str, strip_fillers: bool = False) -> list[tuple[str, str]]:
+    """
+    Split a raw transcript into normalized (speaker, text) turns.
+
+    Speaker labels are mapped to Bot/Customer, system and tool lines are
+    dropped, unlabeled lines are joined onto the previous turn, and empty
+    or immediately repeated turns are removed.
+    """
+    turns: list[list[str]] = []
+    skipping = False
+
+    for line in (transcript or "").splitlines():
+        line = TIMESTAMP_RE.sub(" ", line)
+        match = TURN_RE.match(line)
+        label = match.group(1).strip().lower() if match else None
+
+        if label in NOISE_LABELS:
+            skipping = True
+            continue
+        if label in SPEAKER_LABELS:
+            skipping = False
+            turns.append([SPEAKER_LABELS[label], match.group(2)])
+        elif skipping:
+            continue
+        elif turns:
+            turns[-1][1] += " " + line
+        elif line.strip():
+            # Text before any speaker label: keep it, speaker unknown
+            turns.append(["", line])
+
+    result: list[tuple[str, str]] = []
+    for speaker, text in turns:
+        if strip_fillers:
+            text = FILLER_RE.sub("", text)
+        text = WHITESPACE_RE.sub(" ", text).strip()
+        if not text or text in {".", ",", "..."}:
+            continue
+        if result and result[-1] == (speaker, text):
+            continue
+        result.append((speaker, text))
+    return result
+
+
+def format_turns(turns: list[tuple[str, str]]) -> str:
+    return "\n".join(f"{speaker}: {text}" if speaker else text for speaker, text in turns)
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 3)].rstrip() + "..."
+
+
+def select_turns(
+    turns: list[tuple[str, str]],
+    max_tokens: int,
+    head_turns: int = 2,
+    tail_turns: int = 4,
+    context_turns: int = 2,
+) -> list[Optional[tuple[str, str]]]:
+    """
+    Pick the turns to keep so the formatted transcript fits ``max_tokens``.
+
+    Priority: the last turn, the opening turns, the closing turns, then
+    windows of ``context_turns`` around failure cues (latest first).
+    Returns the kept turns in order, with None where turns were omitted.
+    """
+    n = len(turns)
+    priority: list[int] = [n - 1]
+    priority += list(range(min(head_turns, n)))
+    priority += list(range(n - 1, max(n - tail_turns, 0) - 1, -1))
+    for i in range(n - 1, -1, -1):
+        if FAILURE_CUE_RE.search(turns[i][1]):
+            priority += range(max(0, i - context_turns), min(n, i + context_turns + 1))
+
+    kept: set[int] = set()
+    # Reserve room for a few omission markers
+    budget = max_tokens - 10
+    for i in dict.fromkeys(priority):
+        cost = estimate_tokens(f"{turns[i][0]}: {turns[i][1]}") + 1
+        if cost <= budget:
+            kept.add(i)
+            budget -= cost
+        elif not kept:
+            # Even the final turn alone is over budget: keep its end
+            speaker, text = turns[i]
+            keep_chars = (budget - 2) * CHARS_PER_TOKEN
+            # text[-0:] would be the whole turn, so a budget this small keeps only the marker
+            kept_text = "..." + (text[-keep_chars:] if keep_chars > 0 else "")
+            turns = turns[:i] + [(speaker, kept_text)] + turns[i + 1:]
+            kept.add(i)
+            budget = 0
+
+    selected: list[Optional[tuple[str, str]]] = []
+    for i in range(n):
+        if i in kept:
+            selected.append(turns[i])
+        elif selected and selected[-1] is None:
+            continue
+        else:
+            selected.append(None)
+    return selected
+
+
+def prepare_transcript(
+    transcript: str,
+    max_tokens: Optional[int] = None,
+    strip_fillers: bool = True,
+    max_turn_tokens: Optional[int] = None,
+) -> PreparedTranscript:
+    """
+    Normalize a raw transcript and trim it to a token budget.
+
+    Args:
+        transcript: Raw provider transcript.
+        max_tokens: Token budget for the result (None = no trimming).
+        strip_fillers: Remove um/uh/hmm fillers. Leave them in when the
+            consumer counts disfluencies.
+        max_turn_tokens: Clip any single turn to this many tokens.
+
+    Returns:
+        PreparedTranscript with the prompt-ready text.
+    """
+    original_tokens = estimate_tokens(transcript or "")
+    turns = parse_turns(transcript, strip_fillers=strip_fillers)
+    if max_turn_tokens:
+        turns = [(speaker, _clip(text, max_turn_tokens)) for speaker, text in turns]
+
+    text = format_turns(turns)
+    kept = len(turns)
+
+    if max_tokens and estimate_tokens(text) > max_tokens:
+        selected = select_turns(turns, max_tokens)
+        text = "\n".join(
+            "[... turns omitted ...]" if turn is None else format_turns([turn])
+            for turn in selected
+        )
+        kept = sum(1 for turn in selected if turn is not None)
+
+    return PreparedTranscript(
+        text=text,
+        original_tokens=original_tokens,
+        tokens=estimate_tokens(text),
+        turns_total=len(turns),
+        turns_kept=kept,
+    )
@@ -2,26 +2,45 @@
 Vapi voice AI API client with deployment capabilities.
 """
 
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
 
 import httpx
 
 from app.config import get_settings
 
+# Largest page Vapi serves
+MAX_PAGE_SIZE = 1000
+
+
+def _just_before(timestamp: str) -> str:
+    """ISO timestamp one millisecond earlier (Vapi timestamps have ms precision)."""
+    moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    moment -= timedelta(milliseconds=1)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
 
 class VapiClient:
     """Async client for the Vapi voice AI API."""
 
     BASE_URL = "https://api.vapi.ai"
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
         settings = get_settings()
         self.api_key = api_key or settings.vapi_test_api_key
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        # Custom transport for tests (None = real network)
+        self.transport = transport
+
+    def _client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=self.transport)
 
     # ── Call operations ─────────────────────────────────────────────
 
@@ -35,7 +54,7 @@ class VapiClient:
         if created_at_gt:
             params["createdAtGt"] = created_at_gt
 
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             response = await client.get(
                 f"{self.BASE_URL}/call",
                 headers=self.headers,
@@ -44,9 +63,85 @@ class VapiClient:
             response.raise_for_status()
             return response.json()
 
+    async def iter_call_pages(
+        self,
+        page_size: int = 100,
+        created_at_gt: Optional[str] = None,
+        max_calls: Optional[int] = None,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Stream call records from Vapi one page at a time.
+
+        Vapi returns calls newest first, so ``createdAtGt`` stays pinned as
+        the lower bound while a ``createdAtLe`` cursor walks backwards from
+        the oldest call of each page. Calls that share the cursor timestamp
+        are de-duplicated across page boundaries, and the page limit grows
+        by the number already seen there, so a run of calls sharing one
+        timestamp can't fill a page with duplicates and end the walk. Only
+        if more than MAX_PAGE_SIZE calls share a timestamp are the excess
+        ones skipped (with a warning) to get past it.
+
+        Args:
+            page_size: Calls requested per page (Vapi caps this at 1000).
+            created_at_gt: Only yield calls created after this ISO timestamp.
+            max_calls: Stop after this many calls (None = walk everything).
+
+        Yields:
+            Non-empty lists of call dicts, newest first.
+        """
+        cursor: Optional[str] = None
+        seen_at_cursor: set[str] = set()
+        remaining = max_calls
+
+        async with self._client() as client:
+            while remaining is None or remaining > 0:
+                limit = min(page_size + len(seen_at_cursor), MAX_PAGE_SIZE)
+                params: dict = {"limit": limit}
+                if created_at_gt:
+                    params["createdAtGt"] = created_at_gt
+                if cursor:
+                    params["createdAtLe"] = cursor
+
+                response = await client.get(
+                    f"{self.BASE_URL}/call",
+                    headers=self.headers,
+                    params=params,
+                )
+                response.raise_for_status()
+                page = response.json()
+
+                fresh = [c for c in page if c.get("id") not in seen_at_cursor]
+                if not fresh:
+                    if len(page) < limit:
+                        return
+                    print(
+                        f"Warning: more than {MAX_PAGE_SIZE} Vapi calls created at "
+                        f"{cursor}; skipping the rest of them"
+                    )
+                    cursor = _just_before(cursor)
+                    seen_at_cursor = set()
+                    continue
+
+                if remaining is not None:
+                    fresh = fresh[:remaining]
+                    remaining -= len(fresh)
+
+                yield fresh
+
+                if len(page) < limit:
+                    return
+
+                oldest = min(c["createdAt"] for c in page)
+                if oldest != cursor:
+                    seen_at_cursor = set()
+                cursor = oldest
+                seen_at_cursor.update(
+                    c["id"] for c in page if c["createdAt"] == cursor
+                )
+
     async def get_call(self, call_id: str) -> dict:
         """Fetch a single call by ID."""
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             response = await client.get(
                 f"{self.BASE_URL}/call/{call_id}",
                 headers=self.headers,
@@ -56,7 +151,7 @@ class VapiClient:
 
     async def create_call(self, payload: dict) -> dict:
         """Initiate a new test call via Vapi."""
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             response = await client.post(
                 f"{self.BASE_URL}/call",
                 headers=self.headers,
@@ -79,7 +174,7 @@ class VapiClient:
         if created_after:
             params["createdAtGt"] = created_after.isoformat()
 
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             response = await client.get(
                 f"{self.BASE_URL}/call",
                 headers=self.headers,
@@ -92,7 +187,7 @@ class VapiClient:
 
     async def get_assistant(self, assistant_id: str) -> dict:
         """Fetch assistant/bot configuration."""
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             response = await client.get(
                 f"{self.BASE_URL}/assistant/{assistant_id}",
                 headers=self.headers,
@@ -102,7 +197,7 @@ class VapiClient:
 
     async def update_assistant(self, assistant_id: str, payload: dict) -> dict:
         """Update assistant configuration (generic)."""
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             response = await client.patch(
                 f"{self.BASE_URL}/assistant/{assistant_id}",
                 headers=self.headers,
@@ -142,7 +237,7 @@ class VapiClient:
         """
         base = await self.get_assistant(base_assistant_id)
 
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             response = await client.post(
                 f"{self.BASE_URL}/assistant",
                 headers=self.headers,
@@ -164,7 +259,7 @@ class VapiClient:
 
     async def delete_assistant(self, assistant_id: str) -> None:
         """Delete assistant (cleanup after A/B test)."""
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             response = await client.delete(
                 f"{self.BASE_URL}/assistant/{assistant_id}",
                 headers=self.headers,
@@ -8,10 +8,12 @@ import json
 from typing import List, Dict
 
 from openai import AsyncOpenAI
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
 
 from app.config import get_settings
 from app.models import Pattern, Call, CallAttribute
+from app.services.transcript_preprocessor import prepare_transcript
 
 
 class VariantGenerator:
@@ -29,6 +31,7 @@ class VariantGenerator:
         settings = get_settings()
         self.client = AsyncOpenAI(api_key=settings.openai_api_key)
         self.model = "gpt-4o"
+        self.example_budget = settings.transcript_budget_example_tokens
 
     async def generate_variants(self, pattern_id: str) -> List[Dict]:
         """
@@ -153,7 +156,8 @@ Return JSON array:
 
         Currently:
         - Fetches calls whose CallAttribute.failure_pattern matches the pattern name.
-        - Truncates transcripts for prompt brevity.
+        - Trims transcripts to the example token budget, keeping the turns
+          around the failure rather than just the opening.
         """
 
         pattern = (
@@ -168,7 +172,13 @@ Return JSON array:
 
         examples = (
             self.db.query(Call, CallAttribute)
-            .join(CallAttribute, Call.id == CallAttribute.call_id)
+            .join(
+                CallAttribute,
+                and_(
+                    Call.id == CallAttribute.call_id,
+                    Call.created_at == CallAttribute.call_created_at,
+                ),
+            )
             .filter(CallAttribute.failure_pattern == key)
             .limit(limit)
             .all()
@@ -176,7 +186,11 @@ Return JSON array:
 
         return [
             {
-                "transcript": (call.transcript or "")[:300],
+                "transcript": prepare_transcript(
+                    call.transcript or "",
+                    max_tokens=self.example_budget or None,
+                    max_turn_tokens=self.example_budget // 3 or None,
+                ).text,
                 "accent_strength": attrs.accent_strength,
                 "corrections": attrs.correction_attempts,
                 "emotional_markers": attrs.emotional_markers or [],
@@ -64,6 +64,8 @@ class VariantManager:
                 improvement_delta=v.get("improvement_delta", 0.0),
                 recommended=v.get("recommended", False),
                 tested_against=v.get("tested_against", 0),
+                ci_lower=v.get("ci_lower"),
+                ci_upper=v.get("ci_upper"),
                 total_calls=0,
             )
 
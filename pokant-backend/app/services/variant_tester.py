@@ -4,14 +4,43 @@ Simulate how each prompt variant would perform on historical edge cases.
 
 from __future__ import annotations
 
-from typing import List, Dict
+import asyncio
+import json
+import math
+import re
+from statistics import NormalDist
+from typing import List, Dict, Optional, Tuple
 
 from sqlalchemy.orm import Session
 
-from app.models import Call, CallAttribute, Pattern
+from app.config import get_settings
+from app.models import Pattern
 from app.services.claude_analysis import ClaudeAnalyzer
+from app.services.similarity_search import find_similar_failed_calls
+from app.services.transcript_preprocessor import prepare_transcript
+from app.utils.tokens import estimate_tokens
 from app.utils.vectors import generate_embedding
 
+SIMULATION_MAX_TOKENS = 100
+# Batched judge requests: output tokens per case verdict, and input
+# tokens of the instructions around the cases
+BATCH_VERDICT_TOKENS = 40
+BATCH_PROMPT_OVERHEAD_TOKENS = 400
+
+VERDICT_ARRAY_RE = re.compile(r"\[.*\]", re.DOTALL)
+
+
+def wilson_interval(successes: int, trials: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """Wilson score interval for a success proportion, as (lower, upper) in [0, 1]."""
+    if trials == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
 
 class VariantTester:
     """
@@ -21,11 +50,37 @@ class VariantTester:
     - Find similar failed calls (edge cases) via pgvector search
     - Ask Claude whether each call would succeed with the new prompt
     - Aggregate a simulated success_rate for each variant
+
+    All (variant, case) simulations run concurrently, bounded by a
+    semaphore and the shared Claude rate limiter.
+
+    In "racing" mode (opt-in) cases are simulated in rounds and,
+    from ``variant_racing_min_cases`` on, a variant is dropped once the
+    upper bound of its Wilson interval falls below the best lower bound
+    among the remaining variants. Hopeless variants then stop consuming
+    simulations; survivors are evaluated on every case. "exhaustive"
+    mode (the default) simulates every pair, so scores stay comparable
+    with earlier runs.
+
+    Cases are judged in batches: one request evaluates a variant against
+    as many cases as fit ``simulation_batch_token_budget`` (at most
+    ``simulation_batch_max_cases``) and answers with a per-case verdict
+    array. Cases whose verdict is missing or unparseable are re-judged
+    one per request.
     """
 
     def __init__(self, db: Session):
         self.db = db
         self.claude = ClaudeAnalyzer()
+        settings = get_settings()
+        self.transcript_budget = settings.transcript_budget_simulation_tokens
+        self.max_concurrency = settings.claude_max_concurrency
+        self.mode = settings.variant_test_mode
+        self.confidence = settings.variant_racing_confidence
+        self.round_size = settings.variant_racing_round_size
+        self.min_cases = settings.variant_racing_min_cases
+        self.batch_token_budget = settings.simulation_batch_token_budget
+        self.batch_max_cases = settings.simulation_batch_max_cases
 
     async def test_variants(
         self,
@@ -39,7 +94,9 @@ class VariantTester:
             List of variant dicts with:
             - success_rate
             - improvement_delta (vs ~65%)
-            - tested_against
+            - tested_against (cases this variant was simulated on)
+            - ci_lower / ci_upper (confidence interval of success_rate, %)
+            - eliminated (dropped early by racing)
             - recommended (bool, set on best variant)
         """
 
@@ -53,51 +110,272 @@ class VariantTester:
 
         print(f"Testing {len(variants)} variants against {len(edge_cases)} edge cases...")
 
-        results: List[Dict] = []
-
-        for variant in variants:
-            print(f"  Testing Variant {variant.get('letter', '?')}: {variant.get('name', '')}...")
+        if self.mode == "racing":
+            outcomes = await self._race(variants, edge_cases)
+        else:
+            outcomes = await self._simulate_all(variants, edge_cases)
 
-            successes = 0
+        results: List[Dict] = []
 
-            for case in edge_cases:
-                would_succeed = await self._simulate_call(
-                    original_transcript=case["transcript"],
-                    original_outcome="failed",
-                    new_prompt=variant["prompt_text"],
-                    context=case,
-                )
-                if would_succeed:
-                    successes += 1
+        for variant, variant_outcomes in zip(variants, outcomes):
+            successes = sum(variant_outcomes)
+            tested = len(variant_outcomes)
 
-            success_rate = (successes / len(edge_cases)) * 100 if edge_cases else 0.0
+            success_rate = (successes / tested) * 100 if tested else 0.0
             improvement = success_rate - 65.0  # Baseline ~65%
+            ci_lower, ci_upper = wilson_interval(successes, tested, self.confidence)
 
             variant_result = {
                 **variant,
                 "success_rate": round(success_rate, 1),
                 "improvement_delta": round(improvement, 1),
-                "tested_against": len(edge_cases),
+                "tested_against": tested,
+                "ci_lower": round(ci_lower * 100, 1),
+                "ci_upper": round(ci_upper * 100, 1),
+                "eliminated": tested < len(edge_cases),
                 "recommended": False,
             }
 
             print(
-                f"    → {variant_result['success_rate']:.1f}% success "
-                f"({variant_result['improvement_delta']:+.1f}%)"
+                f"  Variant {variant.get('letter', '?')}: {variant.get('name', '')} "
+                f"→ {variant_result['success_rate']:.1f}% success "
+                f"({variant_result['improvement_delta']:+.1f}%), "
+                f"CI {variant_result['ci_lower']:.1f}-{variant_result['ci_upper']:.1f}% "
+                f"over {tested} cases"
             )
 
             results.append(variant_result)
 
-        # Mark best performer as recommended
+        # Mark best performer as recommended (only survivors can win)
         if results:
-            best = max(results, key=lambda x: x["success_rate"])
+            best = max(results, key=lambda x: (not x["eliminated"], x["success_rate"]))
             best["recommended"] = True
 
         return results
 
+    async def _race(self, variants: List[Dict], edge_cases: List[Dict]) -> List[List[bool]]:
+        """
+        Simulate cases in rounds, dropping variants that can't beat the leader.
+
+        Returns:
+            outcomes[variant_index] for the cases that variant was
+            simulated on (a prefix of ``edge_cases``).
+        """
+        outcomes: List[List[bool]] = [[] for _ in variants]
+        active = list(range(len(variants)))
+        round_size = max(1, self.round_size)
+
+        for start in range(0, len(edge_cases), round_size):
+            cases = edge_cases[start:start + round_size]
+            round_outcomes = await self._simulate_all([variants[i] for i in active], cases)
+            for i, variant_outcomes in zip(active, round_outcomes):
+                outcomes[i].extend(variant_outcomes)
+
+            tested = start + len(cases)
+            if tested < self.min_cases or len(active) < 2 or tested == len(edge_cases):
+                continue
+
+            intervals = {
+                i: wilson_interval(sum(outcomes[i]), tested, self.confidence) for i in active
+            }
+            leader_lower = max(lower for lower, _ in intervals.values())
+            dropped = [i for i in active if intervals[i][1] < leader_lower]
+            for i in dropped:
+                print(
+                    f"  Dropping Variant {variants[i].get('letter', '?')} after {tested} cases "
+                    f"(≤{intervals[i][1] * 100:.0f}% vs leader ≥{leader_lower * 100:.0f}%)"
+                )
+            active = [i for i in active if i not in dropped]
+
+        return outcomes
+
+    async def _simulate_all(
+        self,
+        variants: List[Dict],
+        edge_cases: List[Dict],
+        concurrency: Optional[int] = None,
+    ) -> List[List[bool]]:
+        """
+        Simulate every (variant, case) pair concurrently, in batched requests.
+
+        Returns:
+            outcomes[variant_index][case_index], in input order regardless
+            of completion order.
+        """
+        outcomes: List[List[bool]] = [[False] * len(edge_cases) for _ in variants]
+        semaphore = asyncio.Semaphore(concurrency or self.max_concurrency)
+        batches = self._case_batches(variants, edge_cases)
+        total = len(variants) * len(edge_cases)
+        done = 0
+
+        def report(count: int) -> None:
+            nonlocal done
+            before, done = done, done + count
+            if done // 50 > before // 50 or done == total:
+                print(f"  Simulated {done}/{total} calls")
+
+        async def simulate_one(variant_index: int, case_index: int) -> None:
+            case = edge_cases[case_index]
+            async with semaphore:
+                outcomes[variant_index][case_index] = await self._simulate_call(
+                    original_transcript=case["transcript"],
+                    original_outcome="failed",
+                    new_prompt=variants[variant_index]["prompt_text"],
+                    context=case,
+                )
+            report(1)
+
+        async def simulate_batch(variant_index: int, case_indexes: List[int]) -> None:
+            if len(case_indexes) == 1:
+                await simulate_one(variant_index, case_indexes[0])
+                return
+
+            async with semaphore:
+                verdicts = await self._simulate_batch(
+                    variants[variant_index]["prompt_text"],
+                    [edge_cases[i] for i in case_indexes],
+                )
+
+            missing = []
+            for case_index, verdict in zip(case_indexes, verdicts):
+                if verdict is None:
+                    missing.append(case_index)
+                else:
+                    outcomes[variant_index][case_index] = verdict
+            report(len(case_indexes) - len(missing))
+
+            if missing:
+                print(f"  Re-judging {len(missing)} cases one by one")
+                await asyncio.gather(*(simulate_one(variant_index, i) for i in missing))
+
+        await asyncio.gather(
+            *(
+                simulate_batch(variant_index, case_indexes)
+                for variant_index in range(len(variants))
+                for case_indexes in batches
+            )
+        )
+        return outcomes
+
+    def _case_batches(self, variants: List[Dict], edge_cases: List[Dict]) -> List[List[int]]:
+        """
+        Split case indexes into consecutive batches that fit the input token budget.
+
+        The budget covers the longest variant prompt, the fixed
+        instructions and the case blocks; a case that doesn't fit on its
+        own is judged alone.
+        """
+        max_cases = max(1, self.batch_max_cases)
+        if not self.batch_token_budget or max_cases == 1:
+            return [[i] for i in range(len(edge_cases))]
+
+        fixed = BATCH_PROMPT_OVERHEAD_TOKENS + max(
+            (estimate_tokens(v.get("prompt_text", "")) for v in variants), default=0
+        )
+        batches: List[List[int]] = []
+        current: List[int] = []
+        used = fixed
+        for i, case in enumerate(edge_cases):
+            tokens = estimate_tokens(self._case_block(i + 1, case))
+            if current and (used + tokens > self.batch_token_budget or len(current) >= max_cases):
+                batches.append(current)
+                current, used = [], fixed
+            current.append(i)
+            used += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _case_block(self, number: int, case: Dict) -> str:
+        return f"""### Case {number} (FAILED)
+{case["transcript"]}
+
+Context:
+- Accent strength: {case['accent_strength']}/5
+- Correction attempts: {case['correction_attempts']}
+- Customer emotion: {', '.join(case['emotional_markers'])}
+- Context: {case['context_type']}
+"""
+
+    def build_batch_prompt(self, new_prompt: str, cases: List[Dict]) -> str:
+        """Judge prompt for one variant against several cases."""
+        blocks = "\n".join(self._case_block(i + 1, case) for i, case in enumerate(cases))
+        return f"""You are evaluating a voice bot prompt improvement.
+
+New prompt being tested:
+"{new_prompt}"
+
+Below are {len(cases)} calls that FAILED with the original prompt.
+
+{blocks}
+For each case, question: If the bot used this new prompt, would this call have succeeded?
+
+Consider:
+1. Does the new prompt specifically address why the original failed?
+2. Would it handle the customer's accent/corrections/emotion?
+3. Is it clear and actionable for the bot?
+
+Judge every case independently. Return ONLY a JSON array with one object
+per case, in order, no markdown:
+[{{"case": 1, "verdict": "yes", "reason": "<1 short sentence>"}}, ...]
+"""
+
+    def parse_batch_verdicts(self, content: str, count: int) -> List[Optional[bool]]:
+        """
+        Read per-case verdicts from a batched judge answer.
+
+        Returns:
+            One entry per case: True/False, or None when that case's verdict
+            is missing or unreadable (all None if the array can't be parsed).
+        """
+        verdicts: List[Optional[bool]] = [None] * count
+        match = VERDICT_ARRAY_RE.search(content)
+        if not match:
+            return verdicts
+        try:
+            items = json.loads(match.group(0))
+        except ValueError:
+            return verdicts
+        if not isinstance(items, list):
+            return verdicts
+
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            number = item.get("case", position + 1)
+            verdict = str(item.get("verdict", "")).strip().lower()
+            if not isinstance(number, int) or not 1 <= number <= count:
+                continue
+            if verdict.startswith("yes"):
+                verdicts[number - 1] = True
+            elif verdict.startswith("no"):
+                verdicts[number - 1] = False
+        return verdicts
+
+    async def _simulate_batch(self, new_prompt: str, cases: List[Dict]) -> List[Optional[bool]]:
+        """
+        Judge one variant against several cases in a single request.
+
+        Returns:
+            Per-case verdicts; None for cases to re-judge individually.
+        """
+        prompt = self.build_batch_prompt(new_prompt, cases)
+        try:
+            response = await self.claude.create_message(
+                prompt,
+                max_tokens=SIMULATION_MAX_TOKENS + BATCH_VERDICT_TOKENS * len(cases),
+            )
+            return self.parse_batch_verdicts(response.content[0].text, len(cases))
+        except Exception as e:  # noqa: BLE001
+            print(f"Error in batched simulation: {e}")
+            return [None] * len(cases)
+
     async def _get_edge_cases(self, pattern_id: str, limit: int = 100) -> List[Dict]:
         """
-        Get similar failed calls using pgvector similarity search.
+        Get the pattern customer's most similar failed calls (pgvector).
+
+        Transcripts are preprocessed once here (normalized, trimmed to the
+        simulation token budget) since each one is sent once per variant.
         """
 
         pattern = (
@@ -109,29 +387,40 @@ class VariantTester:
             return []
 
         pattern_embedding = await generate_embedding(pattern.example_transcript)
+        if pattern_embedding is None:
+            return []
 
-        # Vector similarity search using pgvector's cosine distance
-        similar_calls = (
-            self.db.query(Call, CallAttribute)
-            .join(CallAttribute, Call.id == CallAttribute.call_id)
-            .filter(Call.outcome == "failed")
-            .filter(Call.customer_id == pattern.customer_id)
-            .order_by(CallAttribute.embedding.cosine_distance(pattern_embedding))
-            .limit(limit)
-            .all()
+        # Tenant-scoped vector similarity search (cosine distance)
+        similar_calls = find_similar_failed_calls(
+            self.db,
+            pattern.customer_id,
+            pattern_embedding,
+            limit=limit,
         )
 
-        return [
-            {
-                "call_id": str(call.id),
-                "transcript": call.transcript or "",
-                "accent_strength": attrs.accent_strength,
-                "correction_attempts": attrs.correction_attempts,
-                "emotional_markers": attrs.emotional_markers or [],
-                "context_type": attrs.context_type,
-            }
-            for call, attrs in similar_calls
-        ]
+        cases = []
+        tokens_saved = 0
+        for call, attrs in similar_calls:
+            prepared = prepare_transcript(
+                call.transcript or "",
+                max_tokens=self.transcript_budget or None,
+            )
+            tokens_saved += prepared.tokens_saved
+            cases.append(
+                {
+                    "call_id": str(call.id),
+                    "transcript": prepared.text,
+                    "accent_strength": attrs.accent_strength,
+                    "correction_attempts": attrs.correction_attempts,
+                    "emotional_markers": attrs.emotional_markers or [],
+                    "context_type": attrs.context_type,
+                }
+            )
+
+        if tokens_saved:
+            print(f"Transcript preprocessing saved ~{tokens_saved} tokens per variant")
+
+        return cases
 
     async def _simulate_call(
         self,
@@ -173,11 +462,8 @@ Format: yes|<reason> or no|<reason>
 """
 
         try:
-            response = await self.claude.client.messages.create(
-                model=self.claude.model,
-                max_tokens=100,
-                messages=[{"role": "user", "content": prompt}],
-            )
+            # Rate-limited, with backoff on 429/overload
+            response = await self.claude.create_message(prompt, max_tokens=SIMULATION_MAX_TOKENS)
 
             answer = response.content[0].text.strip().lower()
 
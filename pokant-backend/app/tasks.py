@@ -3,32 +3,250 @@ Celery background tasks.
 """
 
 import asyncio
+import uuid
+from typing import Optional
+
+from celery import chord
 
 from app.celery_app import celery_app
+from app.config import get_settings
+from app.database import SessionLocal
 from app.services.test_monitor import monitor_active_tests
+from app.utils.locks import acquire_customer_lock, release_customer_lock
 
 
-def _run_analyze_customer(customer_id: str, limit: int = 1000) -> dict:
-    """Run async analyze_customer in sync context."""
-    from scripts.analyze_customer import analyze_customer
+def _run_pipeline(customer_id: str, fn):
+    """
+    Run ``await fn(pipeline)`` in sync context with a fresh DB session.
 
+    Returns None if the customer doesn't exist.
+    """
+    from app.models import Customer
+    from app.services.analysis_pipeline import AnalysisPipeline
+
+    settings = get_settings()
+    db = SessionLocal()
     try:
-        asyncio.run(analyze_customer(customer_id, limit))
-        return {"status": "success", "customer_id": customer_id}
-    except Exception as e:
-        return {"status": "error", "error": str(e)}
+        customer = (
+            db.query(Customer)
+            .filter(Customer.id == uuid.UUID(customer_id))
+            .first()
+        )
+        if not customer:
+            return None
+
+        pipeline = AnalysisPipeline(db, customer, chunk_size=settings.analysis_chunk_size)
+        return asyncio.run(fn(pipeline))
+    finally:
+        db.close()
 
 
 @celery_app.task(name="analyze_customer")
-def analyze_customer_task(customer_id: str, limit: int = 1000):
+def analyze_customer_task(
+    customer_id: str,
+    limit: int = 1000,
+    incremental: bool = False,
+):
     """
-    Run full customer analysis pipeline in background.
+    Run the customer analysis pipeline across workers.
+
+    Ingests calls in this task, then fans the analyze+embed stages out as
+    one sub-task per chunk of unfinished call IDs, with a chord callback
+    that clusters patterns once every chunk is done.
+
+    Runs hold a per-customer Redis lock from ingestion until the chord
+    callback finishes, so an overlapping run (e.g. the nightly re-analysis
+    while a manual run is in flight) is skipped instead of analyzing the
+    same pending calls twice.
 
     Usage:
         from app.tasks import analyze_customer_task
         analyze_customer_task.delay(customer_id)
+        analyze_customer_task.delay(customer_id, incremental=True)
+    """
+
+    async def ingest(pipeline):
+        stored = await pipeline.ingest(limit=limit, incremental=incremental)
+        return stored, pipeline.unfinished_call_chunks()
+
+    lock_token = acquire_customer_lock(customer_id)
+    if lock_token is None:
+        return {
+            "status": "skipped",
+            "customer_id": customer_id,
+            "reason": "another analysis run is in progress",
+        }
+
+    try:
+        result = _run_pipeline(customer_id, ingest)
+    except Exception as e:
+        release_customer_lock(customer_id, lock_token)
+        return {"status": "error", "error": str(e)}
+
+    if result is None:
+        release_customer_lock(customer_id, lock_token)
+        return {"status": "error", "error": f"Customer {customer_id} not found"}
+
+    stored, chunks = result
+    if not chunks:
+        # Nothing new to analyze; just make sure the customer isn't stuck "analyzing"
+        mark_customer_active_task.delay(customer_id, lock_token)
+        return {"status": "success", "customer_id": customer_id, "stored": stored, "chunks": 0}
+
+    # The callback releases the lock once every chunk is done
+    chord(
+        analyze_calls_task.s(customer_id, chunk) for chunk in chunks
+    )(cluster_customer_task.s(customer_id, lock_token))
+
+    return {
+        "status": "dispatched",
+        "customer_id": customer_id,
+        "stored": stored,
+        "chunks": len(chunks),
+    }
+
+
+@celery_app.task(name="analyze_calls")
+def analyze_calls_task(customer_id: str, call_ids: list[str]):
+    """
+    Analyze and embed one chunk of a customer's calls.
+
+    Errors are returned rather than raised so the chord callback still
+    runs; calls from a failed chunk keep their checkpoint and are picked
+    up by the next run.
+    """
+    ids = [uuid.UUID(cid) for cid in call_ids]
+
+    async def analyze_and_embed(pipeline):
+        analyzed = await pipeline.analyze(call_ids=ids)
+        embedded = await pipeline.embed(call_ids=ids)
+        return {"analyzed": analyzed, "embedded": embedded, "failed": pipeline.failed}
+
+    try:
+        counts = _run_pipeline(customer_id, analyze_and_embed)
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+    if counts is None:
+        return {"status": "error", "error": f"Customer {customer_id} not found"}
+    return {"status": "success", **counts}
+
+
+@celery_app.task(name="cluster_customer")
+def cluster_customer_task(
+    chunk_results: list[dict],
+    customer_id: str,
+    lock_token: Optional[str] = None,
+):
     """
-    return _run_analyze_customer(customer_id, limit)
+    Chord callback: cluster patterns once all analyze chunks finished.
+
+    Releases the customer's analysis lock taken by analyze_customer_task.
+    """
+
+    async def cluster(pipeline):
+        return pipeline.cluster()
+
+    errors = [r for r in chunk_results if r.get("status") != "success"]
+    failed_calls = {}
+    for r in chunk_results:
+        for stage, count in r.get("failed", {}).items():
+            failed_calls[stage] = failed_calls.get(stage, 0) + count
+    try:
+        pattern_ids = _run_pipeline(customer_id, cluster) or []
+        return {
+            "status": "success",
+            "customer_id": customer_id,
+            "chunks": len(chunk_results),
+            "failed_chunks": len(errors),
+            "failed_calls": failed_calls,
+            "pattern_ids": pattern_ids,
+        }
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+    finally:
+        release_customer_lock(customer_id, lock_token)
+
+
+@celery_app.task(name="mark_customer_active")
+def mark_customer_active_task(customer_id: str, lock_token: Optional[str] = None):
+    """Flip a customer out of 'analyzing' when a run had no work to fan out."""
+    from app.models import Customer
+
+    db = SessionLocal()
+    try:
+        db.query(Customer).filter(Customer.id == uuid.UUID(customer_id)).update(
+            {"status": "active"}
+        )
+        db.commit()
+        return {"status": "success"}
+    finally:
+        db.close()
+        release_customer_lock(customer_id, lock_token)
+
+
+@celery_app.task(name="reanalyze_active_customers")
+def reanalyze_active_customers_task():
+    """
+    Queue an incremental analysis run for every active customer.
+
+    Each run only pulls calls newer than the customer's ingestion
+    watermark, so the nightly cost tracks new traffic. Customers with a
+    run still in progress are skipped by that run's lock.
+    """
+    from app.models import Customer
+
+    db = SessionLocal()
+    try:
+        customer_ids = [
+            str(cid)
+            for (cid,) in db.query(Customer.id)
+            .filter(Customer.is_active.is_(True))
+            .filter(Customer.status == "active")
+            .filter(Customer.vapi_api_key_encrypted.isnot(None))
+            .all()
+        ]
+    finally:
+        db.close()
+
+    for customer_id in customer_ids:
+        analyze_customer_task.delay(customer_id, incremental=True)
+
+    return {"status": "success", "queued": len(customer_ids)}
+
+
+@celery_app.task(name="maintain_partitions")
+def maintain_partitions_task():
+    """
+    Create upcoming monthly partitions and detach expired ones.
+
+    Detached partitions keep their data as standalone tables, to be
+    archived or dropped out of band.
+    """
+    from datetime import datetime
+
+    from app.database import engine
+    from app.utils.partitions import (
+        add_months,
+        detach_partitions_before,
+        ensure_partitions,
+        month_start,
+    )
+
+    settings = get_settings()
+    try:
+        with engine.begin() as conn:
+            created = ensure_partitions(conn, months_ahead=settings.partition_months_ahead)
+            detached = []
+            if settings.call_retention_months > 0:
+                cutoff = add_months(
+                    month_start(datetime.utcnow().date()),
+                    -settings.call_retention_months,
+                )
+                detached = detach_partitions_before(conn, cutoff)
+        return {"status": "success", "created": created, "detached": detached}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
 
 
 @celery_app.task(name="monitor_tests")
@@ -52,4 +270,12 @@ celery_app.conf.beat_schedule = {
         "task": "monitor_tests",
         "schedule": 3600.0,  # Every hour
     },
+    "reanalyze-customers-nightly": {
+        "task": "reanalyze_active_customers",
+        "schedule": 86400.0,  # Every 24 hours
+    },
+    "maintain-partitions-daily": {
+        "task": "maintain_partitions",
+        "schedule": 86400.0,  # Every 24 hours
+    },
 }
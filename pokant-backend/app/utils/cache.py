@@ -0,0 +1,171 @@
+"""
+Two-tier (in-process LRU + Redis) cache for expensive provider results.
+
+The Redis tier is optional: if Redis is unreachable it is disabled for
+the rest of the process and the cache degrades to memory only. Redis
+entries are capped by count; least recently used keys are evicted
+through a sorted-set index scored by last access time.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Bounded in-process LRU map."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, V]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[V]:
+        if key not in self._data:
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def set(self, key: str, value: V) -> None:
+        if self.max_entries <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisTier:
+    """Size-bounded Redis key/value tier for one cache namespace."""
+
+    def __init__(self, url: str, namespace: str, max_entries: int):
+        self.url = url
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.index_key = f"{namespace}:lru"
+        self.available = bool(url) and max_entries > 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _disable(self, e: Exception) -> None:
+        print(f"Cache tier {self.namespace} disabled (Redis unavailable): {e}")
+        self.available = False
+
+    async def get_many(self, keys: list[str]) -> dict[str, bytes]:
+        """Fetch the keys present in Redis and refresh their recency."""
+        if not self.available or not keys:
+            return {}
+
+        from redis.asyncio import Redis
+
+        try:
+            async with Redis.from_url(self.url) as r:
+                values = await r.mget([self._key(k) for k in keys])
+                found = {k: v for k, v in zip(keys, values) if v is not None}
+                if found:
+                    now = time.time()
+                    await r.zadd(self.index_key, {k: now for k in found})
+                return found
+        except Exception as e:  # noqa: BLE001
+            self._disable(e)
+            return {}
+
+    async def set_many(self, items: dict[str, bytes]) -> None:
+        """Store values and evict the least recently used keys over the cap."""
+        if not self.available or not items:
+            return
+
+        from redis.asyncio import Redis
+
+        try:
+            async with Redis.from_url(self.url) as r:
+                now = time.time()
+                async with r.pipeline(transaction=False) as pipe:
+                    pipe.mset({self._key(k): v for k, v in items.items()})
+                    pipe.zadd(self.index_key, {k: now for k in items})
+                    pipe.zcard(self.index_key)
+                    size = (await pipe.execute())[-1]
+
+                overflow = size - self.max_entries
+                if overflow > 0:
+                    evicted = await r.zpopmin(self.index_key, overflow)
+                    if evicted:
+                        await r.delete(*(self._key(k.decode()) for k, _ in evicted))
+        except Exception as e:  # noqa: BLE001
+            self._disable(e)
+
+
+class TieredCache(Generic[V]):
+    """
+    Memory LRU in front of an optional Redis tier, with hit/miss counters.
+
+    ``encode``/``decode`` convert values to and from the bytes stored in Redis.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        memory_entries: int,
+        persistent_entries: int,
+        redis_url: Optional[str],
+        encode: Callable[[V], bytes],
+        decode: Callable[[bytes], V],
+    ):
+        self.memory: LRUCache[V] = LRUCache(memory_entries)
+        self.persistent = RedisTier(redis_url or "", namespace, persistent_entries)
+        self.encode = encode
+        self.decode = decode
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    async def get_many(self, keys: list[str]) -> dict[str, V]:
+        """Look keys up in memory, then Redis; returns only the hits."""
+        found: dict[str, V] = {}
+        missing: list[str] = []
+
+        for key in keys:
+            value = self.memory.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        self.memory_hits += len(found)
+
+        if missing:
+            for key, raw in (await self.persistent.get_many(missing)).items():
+                value = self.decode(raw)
+                self.memory.set(key, value)
+                found[key] = value
+                self.persistent_hits += 1
+
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def set_many(self, items: dict[str, V]) -> None:
+        """Write values through both tiers."""
+        for key, value in items.items():
+            self.memory.set(key, value)
+        await self.persistent.set_many(
+            {key: self.encode(value) for key, value in items.items()}
+        )
+
+    def stats(self) -> dict:
+        """Hit/miss counters since process start."""
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        hits = self.memory_hits + self.persistent_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
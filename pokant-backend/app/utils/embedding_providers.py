@@ -0,0 +1,132 @@
+"""
+Embedding providers.
+
+``openai`` calls the OpenAI embeddings API. ``local`` embeds on CPU with
+no network: hashed word/bigram TF features projected to the vector
+dimension by a fixed-seed sparse random projection, L2-normalized. It is
+deterministic across processes (no fitted state), so it can back
+ingestion, clustering and edge-case search offline, and gives
+benchmarks a fast reproducible backend. Select with the
+``embedding_provider`` setting.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from app.config import get_settings
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+class EmbeddingProvider(ABC):
+    """Turns texts into fixed-size float vectors."""
+
+    # Used in cache keys: vectors from different models never mix
+    name: str
+    dimensions: int = EMBEDDING_DIMENSIONS
+    max_input_tokens: int = 8191
+    # Whether results are worth caching (remote calls are, local compute isn't)
+    cache_results: bool = True
+
+    @abstractmethod
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed a batch of texts (raises on failure)."""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI text-embedding-3-* models."""
+
+    def __init__(
+        self,
+        model: str = "text-embedding-3-small",
+        api_key: str = "",
+        dimensions: int = EMBEDDING_DIMENSIONS,
+    ):
+        # Shortened vectors differ from truncated full ones only by norm,
+        # but keep them apart in the cache anyway
+        self.name = model if dimensions == EMBEDDING_DIMENSIONS else f"{model}-{dimensions}"
+        self.model = model
+        self.api_key = api_key
+        self.dimensions = dimensions
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        client = AsyncOpenAI(api_key=self.api_key)
+        extra = {} if self.dimensions == EMBEDDING_DIMENSIONS else {"dimensions": self.dimensions}
+        response = await client.embeddings.create(
+            model=self.model,
+            input=texts,
+            encoding_format="float",
+            **extra,
+        )
+        return [item.embedding for item in response.data]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Hashing vectorizer + fixed random projection, computed on CPU."""
+
+    cache_results = False
+    # No provider limit; just keep pathological inputs bounded
+    max_input_tokens = 32768
+
+    def __init__(
+        self,
+        dimensions: int = EMBEDDING_DIMENSIONS,
+        n_features: int = 2**18,
+        nonzeros_per_feature: int = 8,
+        seed: int = 0,
+    ):
+        from scipy import sparse
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.name = f"local-hash-{n_features}-{dimensions}-s{seed}"
+        self.dimensions = dimensions
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None,
+            lowercase=True,
+        )
+
+        # Sparse sign projection: each hashed feature adds +-1/sqrt(k) to k
+        # random output dimensions. Depends only on the shape and the seed.
+        rng = np.random.default_rng(seed)
+        k = nonzeros_per_feature
+        rows = np.repeat(np.arange(n_features), k)
+        cols = rng.integers(0, dimensions, size=n_features * k)
+        signs = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), size=n_features * k)
+        self.projection = sparse.csr_matrix(
+            (signs / np.sqrt(k), (rows, cols)),
+            shape=(n_features, dimensions),
+            dtype=np.float32,
+        )
+
+    def embed_sync(self, texts: list[str]) -> list[list[float]]:
+        from sklearn.preprocessing import normalize
+
+        features = self.vectorizer.transform(texts).astype(np.float32)
+        # Sublinear TF damps words repeated throughout long transcripts
+        features.data = 1.0 + np.log(features.data)
+        projected = (normalize(features) @ self.projection).toarray()
+        return normalize(projected).tolist()
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+
+@lru_cache
+def get_embedding_provider() -> EmbeddingProvider:
+    """Process-wide provider selected by the ``embedding_provider`` setting."""
+    settings = get_settings()
+    if settings.embedding_provider == "local":
+        return LocalEmbeddingProvider(dimensions=settings.embedding_dimensions)
+    if settings.embedding_provider == "openai":
+        return OpenAIEmbeddingProvider(
+            api_key=settings.openai_api_key,
+            dimensions=settings.embedding_dimensions,
+        )
+    raise ValueError(f"Unknown embedding provider: {settings.embedding_provider}")
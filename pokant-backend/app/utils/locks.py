@@ -0,0 +1,52 @@
+"""
+Per-customer analysis run lock in Redis.
+
+Celery runs (analyze_customer_task through its chord callback) and
+manual runs (scripts/analyze_customer.py) claim the same lock, so two
+runs can never pick up the same pending calls and pay for their
+analysis twice. The lock expires after ``analysis_lock_ttl_seconds`` in
+case a run dies without releasing it.
+"""
+
+import uuid
+from typing import Optional
+
+from app.config import get_settings
+
+# Delete the lock only if this run still holds it (it may have expired and been re-taken)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _lock_key(customer_id: str) -> str:
+    return f"pokant:analysis-lock:{customer_id}"
+
+
+def acquire_customer_lock(customer_id: str) -> Optional[str]:
+    """
+    Claim the customer's analysis run with Redis SET NX.
+
+    Returns the lock token, or None if another run holds the lock.
+    """
+    from redis import Redis
+
+    settings = get_settings()
+    token = uuid.uuid4().hex
+    redis = Redis.from_url(settings.redis_url)
+    if redis.set(_lock_key(customer_id), token, nx=True, ex=settings.analysis_lock_ttl_seconds):
+        return token
+    return None
+
+
+def release_customer_lock(customer_id: str, token: Optional[str]) -> None:
+    """Release the customer's analysis lock if ``token`` still holds it."""
+    if not token:
+        return
+    from redis import Redis
+
+    redis = Redis.from_url(get_settings().redis_url)
+    redis.eval(RELEASE_LOCK_SCRIPT, 1, _lock_key(customer_id), token)
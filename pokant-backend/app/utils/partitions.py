@@ -0,0 +1,222 @@
+"""
+Monthly range partitions of the calls and call_attributes tables.
+
+``calls`` is partitioned by ``created_at`` and ``call_attributes`` by the
+matching ``call_created_at``, one partition per month
+(``calls_y2026m10``) plus a DEFAULT partition that catches anything
+outside the created months. Queries bounded on created_at only touch the
+partitions of that window, and old months can be detached (then archived
+or dropped) instead of bulk-deleted.
+
+Partitions are created ahead of time by the daily maintenance task and
+init_db. Ingestion only tries to create a missing month (a backfill of
+old calls) in a short transaction of its own with a lock timeout, since
+the DDL takes an ACCESS EXCLUSIVE lock on the parent tables; if the lock
+isn't granted quickly, the rows go to the DEFAULT partition instead of
+blocking dashboard reads. A month whose rows already sit in DEFAULT is
+not created (Postgres would reject it); those rows stay queryable where
+they are.
+"""
+
+import re
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+# Parent table -> partition key column. Order matters for detaching:
+# call_attributes references calls, so its partitions go first.
+PARTITIONED_TABLES = {
+    "call_attributes": "call_created_at",
+    "calls": "created_at",
+}
+
+PARTITION_NAME_RE = re.compile(r"_y(\d{4})m(\d{2})$")
+
+# Partitions known to exist in this process (skips catalog lookups on ingest)
+_known_partitions: set[str] = set()
+
+# How long ingestion waits for the parent-table lock before using DEFAULT
+INGEST_DDL_LOCK_TIMEOUT = "2s"
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def default_partition_ddl(table: str) -> str:
+    return f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    return conn.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table},
+    ).scalar() or False
+
+
+def ensure_month_partitions(conn: Connection, months: Iterable[date]) -> list[str]:
+    """
+    Create the monthly partitions covering ``months`` for both tables.
+
+    Does nothing for tables that aren't partitioned (pre-migration).
+
+    Returns:
+        Names of the partitions created.
+    """
+    created: list[str] = []
+    months = sorted({month_start(m) for m in months})
+
+    for table, column in PARTITIONED_TABLES.items():
+        missing = [m for m in months if partition_name(table, m) not in _known_partitions]
+        if not missing or not is_partitioned(conn, table):
+            continue
+
+        conn.execute(text(default_partition_ddl(table)))
+        for month in missing:
+            name = partition_name(table, month)
+            start, end = month, add_months(month, 1)
+
+            if conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar():
+                _known_partitions.add(name)
+                continue
+
+            in_default = conn.execute(
+                text(
+                    f"SELECT EXISTS (SELECT 1 FROM {table}_default "
+                    f"WHERE {column} >= :start AND {column} < :end)"
+                ),
+                {"start": start, "end": end},
+            ).scalar()
+            if in_default:
+                print(f"Partition {name} not created: {table}_default already holds rows for {start:%Y-%m}")
+                continue
+
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                )
+            )
+            _known_partitions.add(name)
+            created.append(name)
+
+    return created
+
+
+def try_ensure_month_partitions(engine: Engine, months: Iterable[date]) -> list[str]:
+    """
+    Create missing monthly partitions for ``months`` without holding up readers.
+
+    Runs in its own short transaction (never the caller's ingest
+    transaction, which would keep the ACCESS EXCLUSIVE lock until it
+    commits) and gives up after INGEST_DDL_LOCK_TIMEOUT, leaving the rows
+    to the DEFAULT partition.
+
+    Returns:
+        Names of the partitions created.
+    """
+    months = {month_start(m) for m in months}
+    if all(partition_name(t, m) in _known_partitions for t in PARTITIONED_TABLES for m in months):
+        return []
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text("SELECT set_config('lock_timeout', :timeout, true)"),
+                {"timeout": INGEST_DDL_LOCK_TIMEOUT},
+            )
+            return ensure_month_partitions(conn, months)
+    except OperationalError as e:
+        print(f"Partitions for {sorted(m.isoformat() for m in months)} not created, using DEFAULT: {e.orig}")
+        return []
+
+
+def ensure_partitions(
+    conn: Connection,
+    months_ahead: int = 3,
+    since: Optional[date] = None,
+) -> list[str]:
+    """Create partitions from ``since`` (default: this month) to ``months_ahead`` months out."""
+    current = month_start(datetime.utcnow().date())
+    month = month_start(since) if since else current
+    months = []
+    while month <= add_months(current, months_ahead):
+        months.append(month)
+        month = add_months(month, 1)
+    return ensure_month_partitions(conn, months)
+
+
+def list_month_partitions(conn: Connection, table: str) -> list[tuple[str, date]]:
+    """Attached monthly partitions of ``table`` as (name, month), oldest first."""
+    rows = conn.execute(
+        text(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:table)
+            """
+        ),
+        {"table": table},
+    ).scalars()
+
+    partitions = []
+    for name in rows:
+        match = PARTITION_NAME_RE.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def detach_partitions_before(conn: Connection, cutoff: date) -> list[str]:
+    """
+    Detach monthly partitions for months before ``cutoff`` from both tables.
+
+    Detached tables keep their data under the same name, ready to be
+    archived or dropped; nothing is deleted row by row.
+
+    Returns:
+        Names of the detached partitions.
+    """
+    detached: list[str] = []
+    cutoff = month_start(cutoff)
+
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(conn, table):
+            continue
+        for name, month in list_month_partitions(conn, table):
+            if month >= cutoff:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            _known_partitions.discard(name)
+            detached.append(name)
+
+            # A detached call_attributes month keeps its FK to calls, which
+            # would block detaching the matching calls month
+            foreign_keys = conn.execute(
+                text(
+                    """
+                    SELECT conname FROM pg_constraint
+                    WHERE conrelid = to_regclass(:name)
+                      AND contype = 'f'
+                      AND confrelid = to_regclass('calls')
+                    """
+                ),
+                {"name": name},
+            ).scalars().all()
+            for constraint in foreign_keys:
+                conn.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"'))
+
+    return detached
@@ -0,0 +1,156 @@
+"""
+Client-side rate limiting and retries for LLM provider calls.
+
+- TokenBucket / RateLimiter: smooth requests/min and tokens/min budgets
+- retry_with_backoff: retry 429/overloaded responses with jittered backoff
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 529 = Anthropic "overloaded"
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class TokenBucket:
+    """
+    Continuously refilling token bucket.
+
+    Holds at most ``rate_per_minute`` tokens and refills at the same rate,
+    so bursts are capped at one minute's budget. Safe to share between
+    coroutines on one event loop: the check-and-deduct never awaits.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate_per_second = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+        self.updated_at = now
+
+    def try_acquire(self, amount: float) -> float:
+        """
+        Take ``amount`` tokens if available.
+
+        Returns:
+            0.0 on success, otherwise seconds to wait before retrying.
+        """
+        amount = min(amount, self.capacity)
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_second
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until ``amount`` tokens are available, then take them."""
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class RateLimiter:
+    """Combined requests/min and tokens/min limiter (0 disables a limit)."""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait for one request slot and ``tokens`` tokens of budget."""
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens and tokens > 0:
+            await self.tokens.acquire(tokens)
+
+
+_limiters: dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(
+    name: str,
+    requests_per_minute: int = 0,
+    tokens_per_minute: int = 0,
+) -> RateLimiter:
+    """
+    Get the process-wide limiter for a provider.
+
+    Every caller of the same provider shares one budget, so concurrent
+    analysis and simulation runs in one worker can't jointly exceed it.
+    """
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        _limiters[name] = limiter
+    return limiter
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None and getattr(exc, "response", None) is not None:
+        status = getattr(exc.response, "status_code", None)
+    return status
+
+
+def is_retryable(exc: Exception) -> bool:
+    """True for rate-limit, overload and transient connection errors."""
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # Connection errors / timeouts carry no status code
+    return any(
+        name in type(exc).__name__
+        for name in ("Connection", "Timeout")
+    )
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def retry_with_backoff(
+    fn: Callable[[], Awaitable[T]],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> T:
+    """
+    Await ``fn()``, retrying retryable errors with full-jitter backoff.
+
+    Honors a ``retry-after`` header when the provider sends one.
+    Non-retryable errors and the final failure are re-raised.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except Exception as e:  # noqa: BLE001
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+            attempt += 1
+            print(f"  Provider error ({e.__class__.__name__}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
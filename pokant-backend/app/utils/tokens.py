@@ -0,0 +1,15 @@
+"""
+Cheap token estimates for prompt budgeting and rate limiting.
+
+Uses the ~4 characters per token rule of thumb for English text, which
+is close enough for budgeting without pulling in a tokenizer.
+"""
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of LLM tokens in text."""
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
@@ -0,0 +1,351 @@
+"""
+Storage type and ANN index of the call embedding column.
+
+``call_attributes.embedding`` is stored as ``vector(d)`` (float32) or
+``halfvec(d)`` (float16) with d from the ``embedding_dimensions``
+setting. text-embedding-3 vectors can be shortened by keeping their
+first d components, so existing rows are converted in place
+(``subvector`` + ``l2_normalize``) instead of being re-embedded.
+Converting halfvec storage and subvector require pgvector >= 0.7 in
+Postgres.
+
+The ANN index is ivfflat or HNSW (``embedding_index_type``). ivfflat
+centroids are computed from the rows present at build time, so the index
+has to be rebuilt once the table has data (``rebuild_embedding_index``).
+call_attributes is partitioned by month, so the index is a partitioned
+index with one ivfflat/HNSW index per partition, each trained on (and,
+for ivfflat, sized to) that partition's rows.
+"""
+
+import math
+import re
+from typing import Optional
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql.base import ischema_names
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+
+INDEX_NAME = "ix_call_attributes_embedding"
+SUPPORTED_DIMENSIONS = (256, 512, 1024, 1536)
+
+
+class HalfVector(Vector):
+    """pgvector ``halfvec`` column; same text wire format as ``vector``."""
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        if self.dim is None:
+            return "HALFVEC"
+        return "HALFVEC(%d)" % self.dim
+
+
+# for reflection
+ischema_names["halfvec"] = HalfVector
+
+STORAGE_TYPES = {
+    "vector": (Vector, "vector_cosine_ops"),
+    "halfvec": (HalfVector, "halfvec_cosine_ops"),
+}
+
+
+def _storage(storage: str):
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown embedding storage: {storage} (use 'vector' or 'halfvec')")
+    return STORAGE_TYPES[storage]
+
+
+def embedding_column_type(dimensions: Optional[int] = None, storage: Optional[str] = None):
+    """SQLAlchemy type for the embedding column (defaults to settings)."""
+    settings = get_settings()
+    column_type, _ = _storage(storage or settings.embedding_storage)
+    return column_type(dimensions or settings.embedding_dimensions)
+
+
+def embedding_opclass(storage: Optional[str] = None) -> str:
+    """Cosine operator class matching the storage type."""
+    _, opclass = _storage(storage or get_settings().embedding_storage)
+    return opclass
+
+
+def column_spec(dimensions: int, storage: str) -> str:
+    """Postgres type name, e.g. ``halfvec(512)``."""
+    _storage(storage)
+    if dimensions not in SUPPORTED_DIMENSIONS:
+        raise ValueError(f"Unsupported embedding dimensions: {dimensions}")
+    return f"{storage}({dimensions})"
+
+
+def current_column_spec(conn: Connection) -> Optional[str]:
+    """Current Postgres type of call_attributes.embedding (None if missing)."""
+    return conn.execute(
+        text(
+            """
+            SELECT format_type(atttypid, atttypmod)
+            FROM pg_attribute
+            WHERE attrelid = to_regclass('call_attributes')
+              AND attname = 'embedding'
+              AND NOT attisdropped
+            """
+        )
+    ).scalar()
+
+
+def index_options(index_type: Optional[str] = None, lists: Optional[int] = None) -> tuple[str, dict]:
+    """(access method, WITH parameters) for the embedding index."""
+    settings = get_settings()
+    index_type = index_type or settings.embedding_index_type
+    if index_type == "ivfflat":
+        return "ivfflat", {"lists": int(lists or settings.embedding_ivfflat_lists)}
+    if index_type == "hnsw":
+        return "hnsw", {
+            "m": settings.embedding_hnsw_m,
+            "ef_construction": settings.embedding_hnsw_ef_construction,
+        }
+    raise ValueError(f"Unknown embedding index type: {index_type} (use 'ivfflat' or 'hnsw')")
+
+
+def recommended_lists(rows: int) -> int:
+    """ivfflat list count per pgvector guidance: rows/1000 up to 1M rows, sqrt(rows) above."""
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def _index_ddl(
+    name: str,
+    storage: Optional[str] = None,
+    index_type: Optional[str] = None,
+    lists: Optional[int] = None,
+    concurrently: bool = False,
+    table: str = "call_attributes",
+    only: bool = False,
+) -> str:
+    method, params = index_options(index_type, lists)
+    with_clause = ", ".join(f"{key} = {int(value)}" for key, value in params.items())
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+        f"ON {'ONLY ' if only else ''}{table} "
+        f"USING {method} (embedding {embedding_opclass(storage)}) "
+        f"WITH ({with_clause})"
+    )
+
+
+def create_embedding_index(conn: Connection, storage: Optional[str] = None) -> None:
+    """Create the cosine ANN index on the embedding column if it is missing."""
+    conn.execute(text(_index_ddl(INDEX_NAME, storage)))
+
+
+def _partitions(conn: Connection) -> list[str]:
+    """Names of the partitions of call_attributes (empty if not partitioned)."""
+    return conn.execute(
+        text(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass('call_attributes')
+            ORDER BY c.relname
+            """
+        )
+    ).scalars().all()
+
+
+def _embedded_rows(conn: Connection, table: str) -> int:
+    return conn.execute(
+        text(f"SELECT count(*) FROM {table} WHERE embedding IS NOT NULL")
+    ).scalar()
+
+
+def rebuild_embedding_index(
+    engine: Engine,
+    index_type: Optional[str] = None,
+    lists: Optional[int] = None,
+) -> dict:
+    """
+    Rebuild the embedding index without blocking writes.
+
+    Postgres can't build an index CONCURRENTLY on a partitioned table,
+    so each partition gets its own index built CONCURRENTLY and attached
+    to a new parent index created with ON ONLY. The finished parent then
+    replaces the old one in a short transaction. For ivfflat, ``lists``
+    defaults to recommended_lists() of each partition's own row count.
+    On an unpartitioned table the replacement is built directly.
+
+    Returns:
+        Dict with the index type, total row count and, per partition,
+        its row count and build parameters.
+    """
+    tmp_name = f"{INDEX_NAME}_new"
+    method, params = index_options(index_type, lists)
+    partitions = []
+
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        partition_names = _partitions(conn)
+
+        if not partition_names:
+            rows = _embedded_rows(conn, "call_attributes")
+            _, params = index_options(method, lists or recommended_lists(rows))
+            # Leftover from an interrupted rebuild (invalid index)
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp_name}"))
+            conn.execute(
+                text(_index_ddl(tmp_name, index_type=method, lists=params.get("lists"), concurrently=True))
+            )
+        else:
+            # Leftovers of an interrupted rebuild go with their parent
+            conn.execute(text(f"DROP INDEX IF EXISTS {tmp_name}"))
+            # Invalid until every partition has an attached index; new
+            # partitions created afterwards inherit these parameters
+            conn.execute(text(_index_ddl(tmp_name, index_type=method, lists=params.get("lists"), only=True)))
+
+            for partition in partition_names:
+                rows = _embedded_rows(conn, partition)
+                _, partition_params = index_options(method, lists or recommended_lists(rows))
+                partition_index = f"{partition}_embedding_new"
+
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {partition_index}"))
+                conn.execute(
+                    text(
+                        _index_ddl(
+                            partition_index,
+                            index_type=method,
+                            lists=partition_params.get("lists"),
+                            concurrently=True,
+                            table=partition,
+                        )
+                    )
+                )
+                conn.execute(text(f"ALTER INDEX {tmp_name} ATTACH PARTITION {partition_index}"))
+                partitions.append({"name": partition, "rows": rows, **partition_params})
+
+            rows = sum(p["rows"] for p in partitions)
+
+    # Swap atomically so searches never run without an index
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+        conn.execute(text(f"ALTER INDEX {tmp_name} RENAME TO {INDEX_NAME}"))
+        # Free the "_new" names for the next rebuild
+        for partition in partitions:
+            conn.execute(
+                text(
+                    f"ALTER INDEX {partition['name']}_embedding_new "
+                    f"RENAME TO {partition['name']}_embedding_idx"
+                )
+            )
+
+    return {"index_type": method, "rows": rows, **params, "partitions": partitions}
+
+
+# pgvector version per database URL, looked up once per process
+_pgvector_versions: dict[str, tuple[int, ...]] = {}
+
+
+def pgvector_version(db: Session) -> tuple[int, ...]:
+    """Installed pgvector extension version, e.g. (0, 8, 0)."""
+    url = str(db.get_bind().url)
+    if url not in _pgvector_versions:
+        version = db.execute(
+            text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        ).scalar()
+        _pgvector_versions[url] = tuple(
+            int(part) for part in re.findall(r"\d+", version or "0")
+        )
+    return _pgvector_versions[url]
+
+
+def apply_search_settings(db: Session, limit: int, iterative: bool = False) -> None:
+    """
+    Set ANN search parameters for the current transaction.
+
+    HNSW returns at most ef_search rows, so it is raised to ``limit``
+    when needed. With ``iterative``, filtered scans keep going until
+    ``limit`` rows pass the filter. That needs pgvector >= 0.8 (older
+    versions reject the settings), so it is skipped on older servers and
+    when the ``vector_iterative_scan`` setting is "off".
+    """
+    settings = get_settings()
+    db.execute(
+        text(
+            "SELECT set_config('hnsw.ef_search', :ef_search, true), "
+            "set_config('ivfflat.probes', :probes, true)"
+        ),
+        {
+            "ef_search": str(max(settings.embedding_hnsw_ef_search, limit)),
+            "probes": str(settings.embedding_ivfflat_probes),
+        },
+    )
+    if (
+        iterative
+        and settings.vector_iterative_scan != "off"
+        and pgvector_version(db) >= (0, 8)
+    ):
+        db.execute(
+            text(
+                "SELECT set_config('hnsw.iterative_scan', :mode, true), "
+                "set_config('ivfflat.iterative_scan', :mode, true)"
+            ),
+            {"mode": settings.vector_iterative_scan},
+        )
+
+
+def convert_embedding_column(conn: Connection, dimensions: int, storage: str) -> bool:
+    """
+    Convert the embedding column to ``storage(dimensions)`` and rebuild its index.
+
+    Shrinking keeps the leading components of each vector and
+    re-normalizes them. Vectors can't be grown, so when the dimension
+    increases stored embeddings are cleared and their calls go back to
+    the 'analyzed' checkpoint to be re-embedded by the next pipeline run.
+
+    Returns:
+        True if the column was changed.
+    """
+    target = column_spec(dimensions, storage)
+    current = current_column_spec(conn)
+    if current is None or current == target:
+        return False
+
+    current_dims = int(re.search(r"\((\d+)\)", current).group(1))
+
+    conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+    if dimensions < current_dims:
+        using = f"l2_normalize(subvector(embedding::vector, 1, {dimensions}))::{target}"
+    elif dimensions == current_dims:
+        using = f"embedding::{target}"
+    else:
+        conn.execute(
+            text(
+                """
+                UPDATE calls SET analysis_status = 'analyzed'
+                WHERE analysis_status = 'embedded'
+                """
+            )
+        )
+        using = "NULL"
+    conn.execute(
+        text(f"ALTER TABLE call_attributes ALTER COLUMN embedding TYPE {target} USING {using}")
+    )
+    create_embedding_index(conn, storage)
+
+    # Pattern centroids live in the same space; clearing them makes the
+    # next cluster run re-cluster in the new one
+    has_centroids = conn.execute(
+        text(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_attribute
+                WHERE attrelid = to_regclass('patterns')
+                  AND attname = 'centroid'
+                  AND NOT attisdropped
+            )
+            """
+        )
+    ).scalar()
+    if has_centroids:
+        conn.execute(text(f"ALTER TABLE patterns ALTER COLUMN centroid TYPE {target} USING NULL"))
+    return True
@@ -1,72 +1,209 @@
 """
 Vector embedding generation for semantic search.
 
-Uses OpenAI's text-embedding-3-small model to generate
-1536-dimensional vectors for transcript similarity search.
+Generates vectors (1536 dimensions unless ``embedding_dimensions`` is
+set lower) for transcript similarity search
+through the configured embedding provider (OpenAI's
+text-embedding-3-small by default, or the offline local backend; see
+embedding_providers). Remote embeddings are content-addressed by
+(model, sha256(normalized text)) and cached, so repeated transcripts and
+pattern examples are only embedded once.
 """
 
-from openai import AsyncOpenAI
+import asyncio
+import hashlib
+import unicodedata
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
 
 from app.config import get_settings
+from app.utils.cache import TieredCache
+from app.utils.embedding_providers import get_embedding_provider
+from app.utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+
+def _encode_vector(vector: list[float]) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _decode_vector(raw: bytes) -> list[float]:
+    return np.frombuffer(raw, dtype=np.float32).tolist()
 
 
-async def _get_client() -> AsyncOpenAI:
+@lru_cache
+def get_embedding_cache() -> TieredCache[list[float]]:
+    """Process-wide embedding cache (memory LRU + optional Redis tier)."""
     settings = get_settings()
-    return AsyncOpenAI(api_key=settings.openai_api_key)
+    return TieredCache(
+        namespace="emb",
+        memory_entries=settings.embedding_cache_memory_entries,
+        persistent_entries=settings.embedding_cache_redis_entries,
+        redis_url=settings.redis_url if settings.embedding_cache_redis_entries else None,
+        encode=_encode_vector,
+        decode=_decode_vector,
+    )
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used both as the cache key input and the embedded text."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def embedding_cache_key(text: str, model: Optional[str] = None) -> str:
+    """Content address for an embedding: (model, sha256(normalized text))."""
+    model = model or get_embedding_provider().name
+    digest = hashlib.sha256(normalize_text(text).encode()).hexdigest()
+    return f"{model}:{digest}"
+
+
+async def _request_embeddings(texts: list[str]) -> list[list[float]]:
+    """Embed already-normalized texts with one provider call (raises on failure)."""
+    return await get_embedding_provider().embed(texts)
+
+
+async def _embed_cached(texts: list[str]) -> list[list[float]]:
+    """
+    Embed texts, serving repeats from the cache.
+
+    Only cache misses are sent to the API (identical texts once), and only
+    successful responses are written back. Providers that compute locally
+    skip the cache.
+    """
+    if not get_embedding_provider().cache_results:
+        return await _request_embeddings([normalize_text(t) or " " for t in texts])
+
+    cache = get_embedding_cache()
+    keys = [embedding_cache_key(t) for t in texts]
+    cached = await cache.get_many(list(dict.fromkeys(keys)))
+
+    to_embed: dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in to_embed:
+            to_embed[key] = normalize_text(text) or " "
+
+    if to_embed:
+        vectors = await _request_embeddings(list(to_embed.values()))
+        fresh = dict(zip(to_embed.keys(), vectors))
+        await cache.set_many(fresh)
+        cached.update(fresh)
 
+    return [cached[key] for key in keys]
 
-async def generate_embedding(text: str) -> list[float]:
+
+async def generate_embedding(text: str) -> Optional[list[float]]:
     """
-    Generate a 1536-dimensional embedding vector for text.
+    Generate an embedding vector for text.
 
     Args:
         text: Text to embed (transcript or phrase).
 
     Returns:
-        1536-dimensional float vector.
+        Float vector of the configured embedding dimension, or None if
+        the provider failed (a zero vector has no cosine distance).
     """
     try:
-        client = await _get_client()
-        response = await client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text,
-            encoding_format="float",
-        )
-        return response.data[0].embedding
+        return (await _embed_cached([text]))[0]
 
     except Exception as e:
         print(f"Error generating embedding: {e}")
-        return [0.0] * 1536
+        return None
 
 
-async def generate_embeddings_batch(texts: list[str]) -> list[list[float]]:
+async def generate_embeddings_batch(texts: list[str]) -> Optional[list[list[float]]]:
     """
     Generate embeddings for multiple texts in a single API call.
 
+    Cached texts are served without an API call; only misses are sent.
+
     Args:
         texts: List of texts to embed.
 
     Returns:
-        List of embedding vectors.
+        List of embedding vectors, or None if the provider failed.
     """
     try:
-        client = await _get_client()
-        response = await client.embeddings.create(
-            model="text-embedding-3-small",
-            input=texts,
-            encoding_format="float",
-        )
-        return [item.embedding for item in response.data]
+        return await _embed_cached(texts)
 
     except Exception as e:
         print(f"Error generating batch embeddings: {e}")
-        return [[0.0] * 1536] * len(texts)
+        return None
+
+
+def pack_batches(
+    texts: list[str],
+    max_items: int,
+    max_tokens: int,
+) -> list[list[int]]:
+    """
+    Group text indices into request batches under an item and token budget.
+
+    Returns:
+        List of batches, each a list of indices into ``texts`` (in order).
+    """
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def embed_texts(
+    texts: list[str],
+    max_batch_items: Optional[int] = None,
+    max_batch_tokens: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> list[Optional[list[float]]]:
+    """
+    Embed many texts with packed, concurrent batch requests.
+
+    Texts are clipped to the provider's per-input limit, packed into batches
+    under the item/token budget and sent ``concurrency`` batches at a time.
+
+    Returns:
+        Embedding vectors aligned with ``texts``; None for texts whose
+        batch failed.
+    """
+    if not texts:
+        return []
+
+    settings = get_settings()
+    max_batch_items = max_batch_items or settings.embedding_batch_max_items
+    max_batch_tokens = max_batch_tokens or settings.embedding_batch_max_tokens
+    semaphore = asyncio.Semaphore(concurrency or settings.embedding_concurrency)
+
+    max_chars = get_embedding_provider().max_input_tokens * CHARS_PER_TOKEN
+    clipped = [(t or " ")[:max_chars] for t in texts]
+    vectors: list[Optional[list[float]]] = [None] * len(texts)
+
+    async def run_batch(indices: list[int]) -> None:
+        async with semaphore:
+            batch_vectors = await generate_embeddings_batch([clipped[i] for i in indices])
+        if batch_vectors is None:
+            return
+        for i, vector in zip(indices, batch_vectors):
+            vectors[i] = vector
+
+    await asyncio.gather(
+        *(run_batch(b) for b in pack_batches(clipped, max_batch_items, max_batch_tokens))
+    )
+    return vectors
 
 
 def cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
     """Calculate cosine similarity between two vectors."""
-    import numpy as np
-
     v1 = np.array(vec1)
     v2 = np.array(vec2)
 
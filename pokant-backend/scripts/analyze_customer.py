@@ -2,55 +2,61 @@
 Manual analysis script for new customers.
 
 Runs the full pipeline: fetch calls from Vapi, analyze with Claude,
-generate embeddings, cluster into patterns.
+generate embeddings, cluster into patterns. Stages are checkpointed, so a
+re-run resumes where the previous one stopped, and each can run alone.
 
 Usage:
     cd pokant-backend
     python -m scripts.analyze_customer --customer-id=<uuid>
     python -m scripts.analyze_customer --customer-id=<uuid> --limit=100
+    python -m scripts.analyze_customer --customer-id=<uuid> --limit=100000 --page-size=500
+    python -m scripts.analyze_customer --customer-id=<uuid> --incremental
+    python -m scripts.analyze_customer --customer-id=<uuid> --limit=100000 --page-size=500 --batch-job
+    python -m scripts.analyze_customer --customer-id=<uuid> --stages=analyze,embed
 """
 
 import asyncio
 import argparse
 import uuid
-from datetime import datetime
 
 from app.database import SessionLocal
-from app.models import Customer, Call, CallAttribute
-from app.services.vapi import VapiClient
-from app.services.claude_analysis import ClaudeAnalyzer
-from app.services.pattern_clustering import PatternClusterer
-from app.services.encryption import decrypt_value
-from app.utils.vectors import generate_embedding
-
-
-def _determine_outcome(call_data: dict) -> str:
-    """Determine if a call succeeded or failed based on Vapi metadata."""
-    end_reason = call_data.get("endedReason", "")
-
-    if "assistant-ended-call" in end_reason:
-        return "success"
-    elif "customer-ended-call" in end_reason:
-        # Short calls likely failed
-        if call_data.get("duration", 0) < 30:
-            return "failed"
-        return "success"
-    else:
-        return "abandoned"
-
-
-async def analyze_customer(customer_id: str, limit: int = 1000):
+from app.models import Customer
+from app.services.analysis_pipeline import STAGES, AnalysisPipeline
+from app.utils.locks import acquire_customer_lock, release_customer_lock
+from app.utils.vectors import get_embedding_cache
+
+
+async def analyze_customer(
+    customer_id: str,
+    limit: int = 1000,
+    page_size: int = 100,
+    incremental: bool = False,
+    batch_job: bool = False,
+    stages: tuple[str, ...] = STAGES,
+):
     """
     Full analysis pipeline for a customer.
 
-    Steps:
-    1. Fetch calls from Vapi
-    2. Store in database
-    3. Analyze failed calls with Claude
-    4. Generate embeddings
-    5. Cluster into patterns
-    6. Update customer status
+    Runs the checkpointed stages of AnalysisPipeline (ingest -> analyze ->
+    embed -> cluster). Each stage picks up whatever work earlier runs left
+    behind, so re-running after a crash resumes where it stopped.
+
+    In incremental mode only calls newer than the customer's ingestion
+    watermark are fetched, and ``limit`` is ignored so no new call is ever
+    skipped.
+
+    With ``batch_job`` failed calls are analyzed through offline provider
+    batch jobs of up to ``CLAUDE_BATCH_MAX_REQUESTS`` calls each, whatever
+    ``page_size``; results are written in chunks of ``page_size``.
+
+    Takes the same per-customer lock as the Celery analysis run, so a
+    manual backfill never overlaps a scheduled run.
     """
+    lock_token = acquire_customer_lock(customer_id)
+    if lock_token is None:
+        print(f"Another analysis run for customer {customer_id} is in progress; try again later")
+        return
+
     db = SessionLocal()
 
     try:
@@ -68,134 +74,23 @@ async def analyze_customer(customer_id: str, limit: int = 1000):
         print(f"Starting analysis for {customer.company_name}...")
         print(f"Platform: {customer.bot_provider}")
 
-        # Step 1: Fetch calls from Vapi
-        print("\n--- Step 1: Fetching calls from Vapi ---")
-
-        api_key = decrypt_value(customer.vapi_api_key_encrypted)
-        vapi = VapiClient(api_key)
-
-        calls_data = await vapi.list_calls(limit=limit)
-
-        print(f"  Retrieved {len(calls_data)} calls")
-
-        # Step 2: Store calls in database
-        print("\n--- Step 2: Storing calls ---")
-
-        stored_calls = []
-        for call_data in calls_data:
-            # Skip if already stored
-            existing = (
-                db.query(Call)
-                .filter(Call.provider_call_id == call_data["id"])
-                .first()
-            )
-            if existing:
-                continue
-
-            call = Call(
-                id=uuid.uuid4(),
-                customer_id=customer.id,
-                provider_call_id=call_data["id"],
-                transcript=call_data.get("transcript", ""),
-                duration_seconds=call_data.get("duration", 0),
-                outcome=_determine_outcome(call_data),
-                metadata_=call_data,
-                created_at=datetime.fromisoformat(
-                    call_data["createdAt"].replace("Z", "+00:00")
-                ),
-            )
-
-            db.add(call)
-            stored_calls.append(call)
-
-        db.commit()
-        print(f"  Stored {len(stored_calls)} new calls")
-
-        # Step 3: Analyze with Claude
-        print("\n--- Step 3: Analyzing transcripts with Claude ---")
-
-        claude = ClaudeAnalyzer()
-
-        # Only analyze failed calls
-        failed_calls = [c for c in stored_calls if c.outcome == "failed"]
-
-        if not failed_calls:
-            print("  No failed calls to analyze")
-            # Still update status and return
-            customer.status = "active"
-            db.commit()
-            print("\nAnalysis complete (no failures detected)")
-            return
-
-        print(f"  Analyzing {len(failed_calls)} failed calls...")
-
-        transcripts = [
-            (str(c.id), c.transcript or "", c.outcome)
-            for c in failed_calls
-        ]
-
-        analyses = await claude.batch_analyze(transcripts)
-
-        # Step 4: Generate embeddings and store attributes
-        print("\n--- Step 4: Generating embeddings ---")
-
-        for analysis in analyses:
-            call_id = uuid.UUID(analysis["call_id"])
-
-            # Get the call transcript for embedding
-            call = db.query(Call).filter(Call.id == call_id).first()
-            embedding = await generate_embedding(call.transcript or "")
-
-            # Store attributes
-            attrs = CallAttribute(
-                id=uuid.uuid4(),
-                call_id=call_id,
-                accent_strength=analysis.get("accent_strength", 3),
-                correction_attempts=analysis.get("correction_attempts", 0),
-                emotional_markers=analysis.get("emotional_markers", []),
-                disfluency_count=analysis.get("disfluency_count", 0),
-                background_noise=analysis.get("background_noise", "none"),
-                context_type=analysis.get("context_type"),
-                failure_pattern=analysis.get("failure_pattern"),
-                conversation_flow=analysis.get("conversation_flow"),
-                bot_interruptions=analysis.get("bot_interruptions", 0),
-                customer_interruptions=analysis.get("customer_interruptions", 0),
-                clarification_requests=analysis.get("clarification_requests", 0),
-                successful_resolution=analysis.get("successful_resolution", False),
-                confidence_level=analysis.get("confidence_level", 3),
-                call_sentiment=analysis.get("call_sentiment"),
-                key_phrases=analysis.get("key_phrases", []),
-                embedding=embedding,
-            )
-
-            db.add(attrs)
-
-        db.commit()
-        print(f"  Generated {len(analyses)} embeddings")
-
-        # Step 5: Cluster into patterns
-        print("\n--- Step 5: Identifying patterns ---")
-
-        clusterer = PatternClusterer(db)
-        patterns = clusterer.identify_patterns(customer_id)
-
-        print(f"  Found {len(patterns)} patterns:")
-        for p in patterns:
-            print(f"    - {p['name']}: {p['frequency']} failures ({p['percentage']:.1f}%)")
-
-        # Save patterns
-        pattern_ids = clusterer.save_patterns(customer_id, patterns)
-
-        # Step 6: Update customer status
-        customer.status = "active"
-        db.commit()
+        pipeline = AnalysisPipeline(db, customer, chunk_size=page_size)
+        summary = await pipeline.run(
+            stages=stages,
+            limit=limit,
+            incremental=incremental,
+            batch_job=batch_job,
+        )
 
         print(f"\nAnalysis complete!")
         print(f"  Customer ID: {customer_id}")
-        print(f"  Total calls: {len(calls_data)}")
-        print(f"  Failed calls: {len(failed_calls)}")
-        print(f"  Patterns identified: {len(patterns)}")
-        print(f"  Pattern IDs: {pattern_ids}")
+        print(f"  New calls stored: {summary.get('stored', '-')}")
+        print(f"  Failed calls analyzed: {summary.get('analyzed', '-')}")
+        print(f"  Calls embedded: {summary.get('embedded', '-')}")
+        for stage, count in summary.get("failed", {}).items():
+            print(f"  Calls left for the next run ({stage} failed): {count}")
+        print(f"  Pattern IDs: {summary.get('pattern_ids', [])}")
+        print(f"  Embedding cache: {get_embedding_cache().stats()}")
 
     except Exception as e:
         print(f"\nError: {e}")
@@ -204,6 +99,7 @@ async def analyze_customer(customer_id: str, limit: int = 1000):
 
     finally:
         db.close()
+        release_customer_lock(customer_id, lock_token)
 
 
 if __name__ == "__main__":
@@ -216,6 +112,33 @@ if __name__ == "__main__":
     parser.add_argument(
         "--limit", type=int, default=1000, help="Max calls to fetch"
     )
+    parser.add_argument(
+        "--page-size", type=int, default=100, help="Calls fetched and processed per chunk"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch calls newer than the customer's ingestion watermark",
+    )
+    parser.add_argument(
+        "--batch-job",
+        action="store_true",
+        help="Analyze through offline provider batch jobs (slower, cheaper)",
+    )
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"Comma-separated stages to run (default: {','.join(STAGES)})",
+    )
 
     args = parser.parse_args()
-    asyncio.run(analyze_customer(args.customer_id, args.limit))
+    asyncio.run(
+        analyze_customer(
+            args.customer_id,
+            args.limit,
+            args.page_size,
+            incremental=args.incremental,
+            batch_job=args.batch_job,
+            stages=tuple(s.strip() for s in args.stages.split(",")),
+        )
+    )
@@ -0,0 +1,159 @@
+"""
+Recall-vs-size benchmark for embedding storage options.
+
+Embeds a sample of transcripts at full 1536 dimensions, then measures,
+for every (dimensions, storage) combination, how many of the exact
+top-k cosine neighbours of each query survive truncation to d
+dimensions and float16 rounding, next to the bytes each option stores
+per row. Use it to pick EMBEDDING_DIMENSIONS / EMBEDDING_STORAGE.
+
+Usage:
+    cd pokant-backend
+    python -m scripts.benchmark_embeddings --customer-id=<uuid> --limit=5000
+    python -m scripts.benchmark_embeddings --synthetic=5000 --provider=local
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import os
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings
+from app.utils.embedding_providers import (
+    EMBEDDING_DIMENSIONS,
+    LocalEmbeddingProvider,
+    OpenAIEmbeddingProvider,
+)
+from app.utils.vector_index import SUPPORTED_DIMENSIONS
+
+# pgvector stores a 4-byte header (dim + unused) plus the varlena header
+ROW_OVERHEAD_BYTES = 8
+BYTES_PER_COMPONENT = {"vector": 4, "halfvec": 2}
+
+
+def load_transcripts(customer_id: str, limit: int) -> list[str]:
+    from app.database import SessionLocal
+    from app.models import Call
+
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Call.transcript)
+            .filter(Call.customer_id == uuid.UUID(customer_id))
+            .filter(Call.outcome == "failed")
+            .order_by(Call.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+        return [t for (t,) in rows if t]
+    finally:
+        db.close()
+
+
+def synthetic_transcripts(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    intents = ["book", "move", "cancel", "confirm", "ask about"]
+    things = ["appointment", "cleaning", "consultation", "delivery", "refund", "order"]
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "next week"]
+    troubles = [
+        "No, I said {day}",
+        "Sorry, what?",
+        "Can I talk to a person?",
+        "That's not what I asked",
+        "Actually, make it {day}",
+        "Okay thanks",
+    ]
+    transcripts = []
+    for _ in range(n):
+        day = rng.choice(days)
+        lines = [
+            "Bot: Hi, how can I help you today?",
+            f"Customer: I want to {rng.choice(intents)} my {rng.choice(things)} for {day}",
+            f"Bot: Sure, I have {rng.choice(days)} available",
+            f"Customer: {rng.choice(troubles).format(day=rng.choice(days))}",
+        ]
+        transcripts.append("\n".join(lines))
+    return transcripts
+
+
+def reduce(vectors: np.ndarray, dimensions: int, storage: str) -> np.ndarray:
+    """What the database would hold: leading components, re-normalized, maybe float16."""
+    reduced = vectors[:, :dimensions]
+    reduced = reduced / np.maximum(np.linalg.norm(reduced, axis=1, keepdims=True), 1e-12)
+    if storage == "halfvec":
+        reduced = reduced.astype(np.float16).astype(np.float32)
+    return reduced
+
+
+def top_k(vectors: np.ndarray, query_ids: np.ndarray, k: int) -> np.ndarray:
+    """Exact cosine top-k neighbours (excluding the query itself)."""
+    scores = vectors[query_ids] @ vectors.T
+    scores[np.arange(len(query_ids)), query_ids] = -np.inf
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / (k * len(truth))
+
+
+async def run(args):
+    settings = get_settings()
+    if args.synthetic:
+        texts = synthetic_transcripts(args.synthetic)
+    else:
+        texts = load_transcripts(args.customer_id, args.limit)
+    if len(texts) <= args.k:
+        print(f"Need more than {args.k} transcripts, got {len(texts)}")
+        return
+
+    provider_name = args.provider or settings.embedding_provider
+    if provider_name == "local":
+        provider = LocalEmbeddingProvider(dimensions=EMBEDDING_DIMENSIONS)
+    else:
+        provider = OpenAIEmbeddingProvider(api_key=settings.openai_api_key)
+
+    print(f"Embedding {len(texts)} transcripts with {provider.name}...")
+    started = time.monotonic()
+    vectors = []
+    for start in range(0, len(texts), 256):
+        vectors.extend(await provider.embed(texts[start:start + 256]))
+    full = np.asarray(vectors, dtype=np.float32)
+    full /= np.maximum(np.linalg.norm(full, axis=1, keepdims=True), 1e-12)
+    print(f"  done in {time.monotonic() - started:.1f}s")
+
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(full), size=min(args.queries, len(full)), replace=False)
+    truth = top_k(full, query_ids, args.k)
+
+    print(f"\n{'storage':<10}{'dims':>6}{'bytes/row':>11}{'MB/1M rows':>12}{f'recall@{args.k}':>12}")
+    for storage in ("vector", "halfvec"):
+        for dimensions in sorted(SUPPORTED_DIMENSIONS, reverse=True):
+            reduced = reduce(full, dimensions, storage)
+            recall = recall_at_k(truth, top_k(reduced, query_ids, args.k))
+            row_bytes = dimensions * BYTES_PER_COMPONENT[storage] + ROW_OVERHEAD_BYTES
+            print(
+                f"{storage:<10}{dimensions:>6}{row_bytes:>11}"
+                f"{row_bytes * 1_000_000 / 2**20:>12.0f}{recall:>12.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding storage recall vs size")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--customer-id", help="Use this customer's failed call transcripts")
+    source.add_argument("--synthetic", type=int, help="Use N generated transcripts instead")
+    parser.add_argument("--limit", type=int, default=5000, help="Max transcripts to load")
+    parser.add_argument("--queries", type=int, default=200, help="Query sample size")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--provider", choices=["openai", "local"], help="Defaults to settings")
+
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,37 @@
+"""
+Convert call_attributes.embedding to the configured storage.
+
+Applies EMBEDDING_DIMENSIONS / EMBEDDING_STORAGE to an existing database:
+changes the column type (shrinking vectors in place, or clearing them for
+re-embedding when the dimension grows) and rebuilds the ANN index.
+
+Usage:
+    cd pokant-backend
+    EMBEDDING_DIMENSIONS=512 EMBEDDING_STORAGE=halfvec python -m scripts.convert_embedding_storage
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings
+from app.database import engine
+from app.utils.vector_index import column_spec, convert_embedding_column, current_column_spec
+
+
+def main():
+    settings = get_settings()
+    target = column_spec(settings.embedding_dimensions, settings.embedding_storage)
+
+    with engine.begin() as conn:
+        current = current_column_spec(conn)
+        print(f"call_attributes.embedding: {current} -> {target}")
+        if convert_embedding_column(conn, settings.embedding_dimensions, settings.embedding_storage):
+            print("Column converted and index rebuilt.")
+        else:
+            print("Nothing to do.")
+
+
+if __name__ == "__main__":
+    main()
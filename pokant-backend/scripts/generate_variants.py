@@ -37,6 +37,8 @@ async def generate_variants(pattern_id: str) -> None:
                 f"({getattr(v, 'improvement_delta', 0.0):+0.1f}%)"
             )
             print(f"   Tested against: {getattr(v, 'tested_against', 0)} edge cases")
+            if getattr(v, "ci_lower", None) is not None:
+                print(f"   {v.ci_lower:.1f}-{v.ci_upper:.1f}% confidence interval")
             print()
 
     finally:
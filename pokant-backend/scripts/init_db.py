@@ -15,13 +15,17 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import engine, SessionLocal, Base
 from app import models
+from app.utils.partitions import ensure_partitions
 
 
 def create_tables():
     """Create all tables (skips pgvector extension if not available)."""
     print("Creating tables...")
     Base.metadata.create_all(bind=engine)
-    print("Tables created successfully.")
+    with engine.begin() as conn:
+        # Seed calls go back a week, possibly into last month
+        created = ensure_partitions(conn, since=(datetime.utcnow() - timedelta(days=31)).date())
+    print(f"Tables created successfully ({len(created)} monthly partitions).")
 
 
 def seed_test_data():
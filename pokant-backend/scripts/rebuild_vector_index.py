@@ -0,0 +1,53 @@
+"""
+Rebuild the call embedding ANN index.
+
+ivfflat centroids are trained on the rows present when the index is
+built, so rebuild after large ingests (or once, after the first one).
+call_attributes is partitioned by month: every partition gets its own
+index, built concurrently (writes are not blocked) and attached to a new
+partitioned parent index that then replaces the old one. ``lists`` is
+sized to each partition's row count unless given. Also switches between
+ivfflat and HNSW.
+
+Usage:
+    cd pokant-backend
+    python -m scripts.rebuild_vector_index
+    python -m scripts.rebuild_vector_index --lists=500
+    python -m scripts.rebuild_vector_index --index-type=hnsw
+"""
+
+import argparse
+import math
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from app.utils.vector_index import rebuild_embedding_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the call embedding ANN index")
+    parser.add_argument(
+        "--index-type",
+        choices=["ivfflat", "hnsw"],
+        help="Index type (default: EMBEDDING_INDEX_TYPE setting)",
+    )
+    parser.add_argument(
+        "--lists", type=int, help="ivfflat lists (default: sized to each partition's row count)"
+    )
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    result = rebuild_embedding_index(engine, index_type=args.index_type, lists=args.lists)
+    print(f"Rebuilt {result['index_type']} index over {result['rows']} rows "
+          f"in {time.monotonic() - started:.1f}s")
+    for partition in result["partitions"]:
+        params = {k: v for k, v in partition.items() if k not in ("name", "rows")}
+        print(f"  {partition['name']}: {partition['rows']} rows {params}")
+
+    if result["index_type"] == "ivfflat":
+        lists = max([p["lists"] for p in result["partitions"]] or [result["lists"]])
+        print(f"Suggested EMBEDDING_IVFFLAT_PROBES: {max(1, round(math.sqrt(lists)))}")
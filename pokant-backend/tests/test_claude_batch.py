@@ -0,0 +1,76 @@
+"""
+Test offline batch-job transcript analysis against a local stand-in backend.
+"""
+
+import json
+
+import pytest
+
+from app.services.claude_analysis import ClaudeAnalyzer
+from app.services.claude_batch import BatchJobBackend
+from app.utils.cache import TieredCache
+
+
+class LocalBatchBackend(BatchJobBackend):
+    """Stand-in batch server: answers every request after one poll."""
+
+    def __init__(self):
+        self.jobs: dict[str, list[dict]] = {}
+        self.polls: dict[str, int] = {}
+
+    async def submit(self, requests):
+        batch_id = f"batch_{len(self.jobs)}"
+        self.jobs[batch_id] = requests
+        self.polls[batch_id] = 0
+        return batch_id
+
+    async def is_finished(self, batch_id):
+        self.polls[batch_id] += 1
+        return self.polls[batch_id] > 1
+
+    async def results(self, batch_id):
+        # Return results out of order, like the real API may
+        for request in reversed(self.jobs[batch_id]):
+            custom_id = request["custom_id"]
+            prompt = request["params"]["messages"][0]["content"]
+            if "<dropped>" in prompt:
+                yield custom_id, None
+                continue
+            yield custom_id, json.dumps({
+                "failure_pattern": "bot_confusion" if "I am lost" in prompt else "other",
+            })
+
+
+@pytest.mark.asyncio
+async def test_batch_analyze_offline_maps_results_by_call_id():
+    """Test batch results are mapped back by call_id in input order."""
+    analyzer = ClaudeAnalyzer(api_key="test")
+    analyzer.cache = TieredCache(
+        namespace="analysis-test",
+        memory_entries=100,
+        persistent_entries=0,
+        redis_url=None,
+        encode=lambda v: v,
+        decode=lambda v: v,
+    )
+    backend = LocalBatchBackend()
+
+    transcripts = [
+        ("call-1", "Bot: Hello\nCustomer: I am lost", "failed"),
+        ("call-2", "Bot: Hello <dropped>", "failed"),
+        ("call-3", "Bot: Hi\nCustomer: Bye", "failed"),
+        ("call-4", "Bot: Hello\nCustomer: I am lost", "failed"),
+    ]
+
+    results = await analyzer.batch_analyze_offline(
+        transcripts, backend=backend, poll_interval=0
+    )
+
+    # Failed request is left out rather than replaced by a default analysis
+    assert [r["call_id"] for r in results] == ["call-1", "call-3", "call-4"]
+    assert results[0]["failure_pattern"] == "bot_confusion"
+    assert results[2]["failure_pattern"] == "bot_confusion"
+    assert results[1]["failure_pattern"] == "other"
+    # Duplicate transcript submitted once
+    assert len(backend.jobs) == 1
+    assert len(backend.jobs["batch_0"]) == 3
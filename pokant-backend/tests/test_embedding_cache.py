@@ -0,0 +1,88 @@
+"""
+Test the content-addressed embedding cache and the local embedding provider.
+"""
+
+import numpy as np
+import pytest
+
+from app.utils import vectors
+from app.utils.cache import LRUCache, TieredCache
+from app.utils.embedding_providers import LocalEmbeddingProvider
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test LRU tier keeps the most recently used entries."""
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_repeated_texts_are_embedded_once(monkeypatch):
+    """Test identical (normalized) texts hit the API once and count as cache hits."""
+    cache = TieredCache(
+        namespace="emb-test",
+        memory_entries=100,
+        persistent_entries=0,
+        redis_url=None,
+        encode=vectors._encode_vector,
+        decode=vectors._decode_vector,
+    )
+    requested: list[list[str]] = []
+
+    async def fake_request(texts):
+        requested.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(vectors, "get_embedding_cache", lambda: cache)
+    monkeypatch.setattr(vectors, "_request_embeddings", fake_request)
+
+    first = await vectors.generate_embeddings_batch(
+        ["Hello  there", "Hello there", "Goodbye"]
+    )
+    second = await vectors.generate_embedding("  Hello there ")
+
+    assert requested == [["Hello there", "Goodbye"]]
+    assert first[0] == first[1] == second
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_local_provider_is_deterministic_and_normalized():
+    """Test local embeddings are reproducible unit vectors that keep similar texts close."""
+    texts = [
+        "I want to move my appointment to Tuesday",
+        "Can I move my appointment to Tuesday please",
+        "What are your opening hours on weekends",
+    ]
+
+    first = np.array(await LocalEmbeddingProvider(n_features=2**16).embed(texts))
+    second = np.array(await LocalEmbeddingProvider(n_features=2**16).embed(texts))
+
+    assert first.shape == (3, 1536)
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0, atol=1e-5)
+    assert first[0] @ first[1] > first[0] @ first[2] + 0.3
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_return_none_instead_of_zero_vectors(monkeypatch):
+    """Test texts of a failed batch come back as None while other batches still embed."""
+    async def flaky_batch(texts):
+        if "boom" in texts:
+            return None
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(vectors, "generate_embeddings_batch", flaky_batch)
+
+    result = await vectors.embed_texts(["ok", "boom", "fine"], max_batch_items=1)
+
+    assert result == [[2.0, 1.0], None, [4.0, 1.0]]
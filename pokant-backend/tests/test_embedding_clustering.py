@@ -0,0 +1,99 @@
+"""
+Test embedding-based failure clustering without a database.
+"""
+
+import uuid
+
+import numpy as np
+
+from app.services.embedding_clustering import (
+    EmbeddingChunk,
+    EmbeddingClusterer,
+    choose_cluster_count,
+    normalize,
+)
+
+
+def _blobs(centers: int, per_center: int, dims: int = 64, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    means = rng.normal(size=(centers, dims)) * 5
+    points = np.concatenate([m + rng.normal(size=(per_center, dims)) for m in means])
+    return normalize(points.astype(np.float32))
+
+
+def test_cluster_count_is_picked_by_silhouette():
+    """Test well separated groups get their own clusters."""
+    model = choose_cluster_count(_blobs(4, 100), max_clusters=8)
+
+    assert model.n_clusters == 4
+
+
+def test_streamed_clusters_match_pattern_dict_shape(monkeypatch):
+    """Test chunked sampling, refinement and assignment produce save_patterns dicts."""
+    vectors = _blobs(3, 400)
+    labels = ["bot_confusion"] * 400 + ["other"] * 400 + ["complex_scheduling"] * 400
+    call_ids = [uuid.uuid4() for _ in vectors]
+
+    clusterer = EmbeddingClusterer(db=None, chunk_size=250, sample_size=300, max_clusters=6)
+
+    def fake_chunks(customer_uuid, unassigned_only=False):
+        for start in range(0, len(vectors), clusterer.chunk_size):
+            end = start + clusterer.chunk_size
+            yield EmbeddingChunk(
+                attribute_ids=call_ids[start:end],
+                call_created_at=[None] * len(call_ids[start:end]),
+                call_ids=call_ids[start:end],
+                pattern_ids=[None] * len(call_ids[start:end]),
+                failure_patterns=labels[start:end],
+                accent_strength=np.full(len(vectors[start:end]), 2.0),
+                correction_attempts=np.ones(len(vectors[start:end])),
+                vectors=vectors[start:end],
+            )
+
+    monkeypatch.setattr(clusterer, "_iter_chunks", fake_chunks)
+    monkeypatch.setattr(
+        clusterer,
+        "_example_transcripts",
+        lambda customer_uuid, ids: {i: f"Customer: reschedule order {i.hex[:4]}" for i in ids},
+    )
+
+    patterns = clusterer.identify_patterns(str(uuid.uuid4()))
+
+    assert len(patterns) == 3
+    assert sorted(p["failure_pattern"] for p in patterns) == sorted(set(labels))
+    assert sum(p["frequency"] for p in patterns) == len(vectors)
+    for p in patterns:
+        assert p["frequency"] == 400
+        assert len(p["call_ids"]) == 10
+        assert p["avg_accent_strength"] == 2.0
+        assert p["example_transcript"].startswith("Customer:")
+        assert p["cluster_key"].startswith("cluster:")
+        assert len(p["centroid"]) == vectors.shape[1]
+
+
+def test_reservoir_sample_is_uniform_across_chunks(monkeypatch):
+    """Test the chunked reservoir sample draws evenly from early and late chunks."""
+    # Row i is the vector [i, 1], so the sample tells which rows it kept
+    rows = np.stack([np.arange(10000), np.ones(10000)], axis=1).astype(np.float32)
+    clusterer = EmbeddingClusterer(db=None, chunk_size=1000, sample_size=2000)
+
+    def fake_chunks(customer_uuid, unassigned_only=False):
+        for start in range(0, len(rows), clusterer.chunk_size):
+            chunk = rows[start:start + clusterer.chunk_size]
+            yield EmbeddingChunk(
+                attribute_ids=[], call_created_at=[], call_ids=[], pattern_ids=[],
+                failure_patterns=[], accent_strength=np.zeros(len(chunk)),
+                correction_attempts=np.zeros(len(chunk)), vectors=chunk,
+            )
+
+    monkeypatch.setattr(clusterer, "_iter_chunks", fake_chunks)
+
+    total, sample = clusterer._sample(uuid.uuid4())
+    kept = sample[:, 0].astype(int)
+
+    assert total == 10000
+    assert len(kept) == 2000
+    assert len(set(kept)) == 2000
+    per_chunk = np.bincount(kept // 1000, minlength=10)
+    # 200 expected per chunk; the first chunk (which filled the reservoir) is no favourite
+    assert per_chunk.min() > 140 and per_chunk.max() < 260
@@ -0,0 +1,36 @@
+"""
+Test MinHash/LSH near-duplicate grouping of transcripts.
+"""
+
+from app.services.near_duplicates import NearDuplicateIndex, lsh_bands
+
+SCRIPT = """Bot: Hi, thanks for calling Bright Smile Dental, how can I help you today?
+Customer: Hi, I need to move my cleaning appointment to Tuesday at 3pm please.
+Bot: Sure, I can help with that. Can I get your name?
+Customer: It's Maria Lopez.
+Bot: Thanks. I see your appointment on Monday. Let me check availability for Tuesday.
+Customer: No, I said Tuesday, not Thursday.
+Bot: I'm sorry, I can only book appointments for Thursday. Would you like to speak to someone?
+Customer: Yes please, transfer me."""
+
+
+def test_near_identical_transcripts_share_a_representative():
+    """Test small edits collapse onto the first transcript and different calls don't."""
+    index = NearDuplicateIndex(threshold=0.8)
+    items = [
+        ("a", SCRIPT),
+        ("b", SCRIPT.replace("Maria Lopez", "John Smith").replace("3pm", "4pm")),
+        ("c", "Bot: Hello, how can I help?\nCustomer: I want a refund, my order arrived broken."),
+        ("d", SCRIPT + "\nBot: Transferring you now."),
+    ]
+
+    assert index.assign(items) == ["a", "a", "c", "a"]
+    assert len(index) == 2
+
+
+def test_lsh_bands_stay_below_threshold():
+    """Test the banding's S-curve threshold doesn't exceed the requested one."""
+    for threshold in (0.5, 0.8, 0.9):
+        bands, rows = lsh_bands(128, threshold)
+        assert bands * rows == 128
+        assert (1 / bands) ** (1 / rows) <= threshold
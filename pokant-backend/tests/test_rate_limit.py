@@ -0,0 +1,134 @@
+"""
+Test rate limiting, retries and concurrent batch analysis.
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from app.services.claude_analysis import ClaudeAnalyzer
+from app.utils.cache import TieredCache
+from app.utils.rate_limit import TokenBucket, retry_with_backoff
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+def _memory_only_analyzer() -> ClaudeAnalyzer:
+    analyzer = ClaudeAnalyzer(api_key="test")
+    analyzer.cache = TieredCache(
+        namespace="analysis-test",
+        memory_entries=100,
+        persistent_entries=0,
+        redis_url=None,
+        encode=lambda v: v,
+        decode=lambda v: v,
+    )
+    return analyzer
+
+
+def test_token_bucket_reports_wait_when_empty():
+    """Test bucket allows a full burst, then asks the caller to wait."""
+    bucket = TokenBucket(rate_per_minute=60)
+
+    assert bucket.try_acquire(60) == 0.0
+    wait = bucket.try_acquire(1)
+    assert 0.5 < wait <= 1.0
+
+
+@pytest.mark.asyncio
+async def test_retry_with_backoff_retries_rate_limits():
+    """Test 429s are retried and non-retryable errors are raised."""
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise FakeRateLimitError("rate limited")
+        return "ok"
+
+    assert await retry_with_backoff(flaky, base_delay=0.001) == "ok"
+    assert attempts == 3
+
+    async def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await retry_with_backoff(broken, base_delay=0.001)
+
+
+@pytest.mark.asyncio
+async def test_batch_analyze_is_bounded_and_ordered():
+    """Test batch_analyze caps in-flight requests and keeps input order."""
+    analyzer = _memory_only_analyzer()
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_analyze(transcript: str, outcome: str) -> dict:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        in_flight -= 1
+        return {"transcript": transcript}
+
+    analyzer._request_analysis = fake_analyze
+
+    transcripts = [(f"call-{i}", f"transcript {i}", "failed") for i in range(30)]
+    results = await analyzer.batch_analyze(transcripts, concurrency=4)
+
+    assert [r["call_id"] for r in results] == [t[0] for t in transcripts]
+    assert [r["transcript"] for r in results] == [t[1] for t in transcripts]
+    assert max_in_flight <= 4
+
+
+@pytest.mark.asyncio
+async def test_batch_analyze_serves_repeats_from_cache():
+    """Test identical transcripts are analyzed once and re-runs hit the cache."""
+    analyzer = _memory_only_analyzer()
+    requests = 0
+
+    async def fake_analyze(transcript: str, outcome: str) -> dict:
+        nonlocal requests
+        requests += 1
+        return {"failure_pattern": "other", "transcript": transcript}
+
+    analyzer._request_analysis = fake_analyze
+
+    transcripts = [
+        ("call-1", "Bot: Hi", "failed"),
+        ("call-2", "Bot: Hi", "failed"),
+        ("call-3", "Bot: Bye", "failed"),
+    ]
+    first = await analyzer.batch_analyze(transcripts)
+    second = await analyzer.batch_analyze(transcripts)
+
+    assert requests == 2
+    assert [r["call_id"] for r in second] == ["call-1", "call-2", "call-3"]
+    assert first == second
+
+
+@pytest.mark.asyncio
+async def test_batch_analyze_leaves_out_failed_requests():
+    """Test failed requests are omitted and not cached, so a re-run retries them."""
+    analyzer = _memory_only_analyzer()
+    attempts = 0
+
+    async def flaky_analyze(transcript: str, outcome: str) -> dict:
+        nonlocal attempts
+        attempts += 1
+        if "timeout" in transcript and attempts <= 2:
+            raise TimeoutError("request timed out")
+        return {"failure_pattern": "other"}
+
+    analyzer._request_analysis = flaky_analyze
+
+    transcripts = [("call-1", "Bot: Hi", "failed"), ("call-2", "Bot: timeout", "failed")]
+    first = await analyzer.batch_analyze(transcripts, concurrency=1)
+    second = await analyzer.batch_analyze(transcripts, concurrency=1)
+
+    assert [r["call_id"] for r in first] == ["call-1"]
+    assert [r["call_id"] for r in second] == ["call-1", "call-2"]
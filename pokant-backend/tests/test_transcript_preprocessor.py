@@ -0,0 +1,89 @@
+"""
+Test transcript normalization, token-budget trimming and local call counts.
+"""
+
+from app.services.transcript_metrics import extract_call_counts
+from app.services.transcript_preprocessor import parse_turns, prepare_transcript, select_turns
+
+
+def test_normalizes_speakers_and_drops_noise():
+    """Test speaker labels are normalized and tool/noise lines dropped."""
+    raw = (
+        "[00:01] AI: Hello, how can I help?\n"
+        "System: tool call lookup_slots\n"
+        '{"slots": []}\n'
+        "User: um I need an appointment at 3:30\n"
+        "User: um I need an appointment at 3:30\n"
+        "Customer:\n"
+        "AI: Sure."
+    )
+
+    turns = parse_turns(raw, strip_fillers=True)
+
+    assert turns == [
+        ("Bot", "Hello, how can I help?"),
+        ("Customer", "I need an appointment at 3:30"),
+        ("Bot", "Sure."),
+    ]
+
+
+def test_trims_to_budget_keeping_failure_turns():
+    """Test trimming keeps the opening, failure and closing turns within budget."""
+    filler = "\n".join(
+        f"User: just chatting about item {i} for a while\nAI: noted item {i}"
+        for i in range(100)
+    )
+    raw = (
+        "AI: Thanks for calling.\n"
+        + filler
+        + "\nUser: No, that's not what I said\n"
+        + "AI: Sorry, could you repeat that?\n"
+        + "User: forget it\n"
+        + "AI: Goodbye"
+    )
+
+    prepared = prepare_transcript(raw, max_tokens=120)
+
+    assert prepared.tokens <= 120
+    assert prepared.tokens_saved > 1000
+    assert prepared.text.startswith("Bot: Thanks for calling.")
+    assert "Customer: No, that's not what I said" in prepared.text
+    assert "[... turns omitted ...]" in prepared.text
+    assert prepared.text.endswith("Bot: Goodbye")
+
+
+def test_tiny_budget_keeps_only_an_ellipsis_of_the_last_turn():
+    """Test a 1-2 token budget never keeps the whole oversized final turn."""
+    turns = [("Bot", "Hello"), ("Customer", "word " * 200)]
+
+    for max_tokens in (11, 12):  # 10 tokens are reserved for omission markers
+        selected = select_turns(turns, max_tokens)
+
+        assert selected == [None, ("Customer", "...")]
+
+    prepared = prepare_transcript("AI: Hello\nUser: " + "word " * 200, max_tokens=12)
+    assert prepared.tokens <= 12
+
+
+def test_extracts_countable_attributes_locally():
+    """Test countable attributes are extracted without an LLM call."""
+    raw = (
+        "AI: Hi, how can I help you today?\n"
+        "User: Um, I- I need to, uh, move my appointment to...\n"
+        "AI: Sure, which day works for you?\n"
+        "User: Thursday at 3\n"
+        "AI: Did you mean Thursday at 3pm?\n"
+        "User: No, I said Tuesday\n"
+        "AI: Sorry, could you repeat that?\n"
+        "User: Tuesday. I was going to-\n"
+        "AI: Got it, Tuesday at 3."
+    )
+
+    # Trailing off ("to...") is neither a disfluency nor an interruption; "to-" is cut off
+    assert extract_call_counts(raw) == {
+        "disfluency_count": 3,
+        "clarification_requests": 2,
+        "bot_interruptions": 1,
+        "customer_interruptions": 0,
+        "correction_attempts": 1,
+    }
@@ -0,0 +1,94 @@
+"""
+Test Vapi call pagination against a mocked HTTP transport.
+"""
+
+import httpx
+import pytest
+
+from app.services import vapi
+from app.services.vapi import VapiClient
+
+
+def _fake_vapi(calls: list[dict], requests: list[dict]) -> httpx.MockTransport:
+    """Serve GET /call like Vapi: newest first, createdAtGt/createdAtLe filters, limit."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = dict(request.url.params)
+        requests.append(params)
+        page = [
+            c for c in calls
+            if ("createdAtGt" not in params or c["createdAt"] > params["createdAtGt"])
+            and ("createdAtLe" not in params or c["createdAt"] <= params["createdAtLe"])
+        ]
+        page.sort(key=lambda c: (c["createdAt"], c["id"]), reverse=True)
+        return httpx.Response(200, json=page[:int(params["limit"])])
+
+    return httpx.MockTransport(handler)
+
+
+def _call(call_id: str, millis: int) -> dict:
+    return {"id": call_id, "createdAt": f"2024-05-01T12:00:00.{millis:03d}Z"}
+
+
+async def _walk(client: VapiClient, **kwargs) -> list[list[str]]:
+    return [
+        [c["id"] for c in page]
+        async for page in client.iter_call_pages(**kwargs)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pages_dedupe_calls_on_the_cursor_boundary():
+    """Test calls sharing the cursor timestamp are yielded once across pages."""
+    calls = [
+        _call("a", 5), _call("b", 4), _call("c", 4), _call("d", 3), _call("e", 2),
+    ]
+    requests = []
+    client = VapiClient(api_key="test", transport=_fake_vapi(calls, requests))
+
+    pages = await _walk(client, page_size=2)
+
+    assert [cid for page in pages for cid in page] == ["a", "c", "b", "d", "e"]
+    assert requests[1]["createdAtLe"] == "2024-05-01T12:00:00.004Z"
+
+
+@pytest.mark.asyncio
+async def test_pages_stop_at_max_calls():
+    """Test the walk stops once max_calls calls were yielded."""
+    calls = [_call(f"call-{i}", i) for i in range(10)]
+    requests = []
+    client = VapiClient(api_key="test", transport=_fake_vapi(calls, requests))
+
+    pages = await _walk(client, page_size=3, max_calls=5)
+
+    assert [len(page) for page in pages] == [3, 2]
+    assert len(requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_more_calls_than_a_page_on_one_timestamp_dont_end_the_walk():
+    """Test a run of same-timestamp calls longer than a page doesn't drop older calls."""
+    calls = [_call(f"same-{i}", 7) for i in range(5)] + [_call("older-1", 6), _call("older-2", 1)]
+    requests = []
+    client = VapiClient(api_key="test", transport=_fake_vapi(calls, requests))
+
+    pages = await _walk(client, page_size=2)
+    ids = [cid for page in pages for cid in page]
+
+    assert sorted(ids) == sorted(c["id"] for c in calls)
+    assert len(ids) == len(set(ids))
+
+
+@pytest.mark.asyncio
+async def test_walk_steps_past_a_timestamp_beyond_the_page_cap(monkeypatch):
+    """Test the walk skips past a timestamp shared by more calls than Vapi serves."""
+    monkeypatch.setattr(vapi, "MAX_PAGE_SIZE", 3)
+    calls = [_call(f"same-{i}", 7) for i in range(5)] + [_call("older-1", 6), _call("older-2", 1)]
+    requests = []
+    client = VapiClient(api_key="test", transport=_fake_vapi(calls, requests))
+
+    pages = await _walk(client, page_size=2)
+    ids = [cid for page in pages for cid in page]
+
+    assert ids[-2:] == ["older-1", "older-2"]
+    assert len(ids) == len(set(ids))
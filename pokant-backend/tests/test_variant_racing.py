@@ -0,0 +1,83 @@
+"""
+Test confidence-interval racing in offline variant testing.
+"""
+
+import pytest
+
+from app.services.variant_tester import VariantTester, wilson_interval
+
+
+def test_wilson_interval_brackets_the_observed_rate():
+    """Test the interval contains the observed rate and narrows with more trials."""
+    lower, upper = wilson_interval(10, 20)
+    wide = upper - lower
+    assert lower < 0.5 < upper
+
+    lower, upper = wilson_interval(100, 200)
+    assert upper - lower < wide
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+
+@pytest.mark.asyncio
+async def test_racing_stops_simulating_hopeless_variants():
+    """Test a clearly worse variant is dropped early and the best one sees every case."""
+    tester = VariantTester.__new__(VariantTester)
+    tester.max_concurrency = 4
+    tester.mode = "racing"
+    tester.confidence = 0.95
+    tester.round_size = 10
+    tester.min_cases = 20
+    tester.batch_token_budget = 0
+    tester.batch_max_cases = 1
+
+    async def simulate(original_transcript, original_outcome, new_prompt, context):
+        # "good" succeeds on 9 of 10 cases, "bad" on 1 of 10
+        hit = context["index"] % 10 != 0
+        return hit if new_prompt == "good" else not hit
+
+    async def edge_cases(pattern_id, limit=100):
+        return [{"transcript": "", "index": i} for i in range(60)]
+
+    tester._simulate_call = simulate
+    tester._get_edge_cases = edge_cases
+
+    good, bad = await tester.test_variants(
+        "pattern",
+        [{"letter": "A", "prompt_text": "good"}, {"letter": "B", "prompt_text": "bad"}],
+    )
+
+    assert good["tested_against"] == 60 and not good["eliminated"] and good["recommended"]
+    assert bad["tested_against"] == 20 and bad["eliminated"]
+    assert bad["ci_upper"] < good["ci_lower"]
+
+
+def test_batched_verdicts_fall_back_per_case():
+    """Test parsed verdicts are kept and missing or garbled ones come back as None."""
+    tester = VariantTester.__new__(VariantTester)
+    content = """```json
+[{"case": 1, "verdict": "yes", "reason": "handles it"},
+ {"case": 3, "verdict": "No", "reason": "still confusing"},
+ {"case": 4, "verdict": "maybe"}]
+```"""
+
+    assert tester.parse_batch_verdicts(content, 4) == [True, None, False, None]
+    assert tester.parse_batch_verdicts("not json", 2) == [None, None]
+
+
+def test_case_batches_respect_token_budget():
+    """Test cases are packed up to the token budget and the per-request cap."""
+    tester = VariantTester.__new__(VariantTester)
+    tester.batch_token_budget = 2000
+    tester.batch_max_cases = 4
+    case = {
+        "transcript": "x" * 1600,  # ~400 tokens
+        "accent_strength": 2,
+        "correction_attempts": 1,
+        "emotional_markers": [],
+        "context_type": "scheduling",
+    }
+
+    batches = tester._case_batches([{"prompt_text": "Be clear."}], [case] * 7)
+
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert sum(batches, []) == list(range(7))